@@ -0,0 +1,6 @@
+"""
+Benchmarks against local stand-ins for Supabase and OpenAI.
+
+Run them from backend-fastapi, e.g. `python -m benchmarks.list_round_trips`.
+They need no credentials or network access.
+"""
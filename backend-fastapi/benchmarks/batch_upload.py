@@ -0,0 +1,109 @@
+"""
+Time and round trips of POST /api/bonsais/{id}/images/batch against single uploads.
+
+First sends one batch covering each special case (a new photo, one already
+stored for another bonsai, one already on this bonsai, a repeat within the
+batch and a file over the size limit) and prints each result, and compares
+both paths while storage is down. Then uploads N photos one request at a
+time and as one batch.
+
+    python -m benchmarks.batch_upload [photos] [stub latency in seconds]
+"""
+import asyncio
+import io
+import os
+import random
+import sys
+import time
+
+import httpx
+from PIL import Image
+
+from benchmarks import harness, stub_supabase
+
+PORT = 54606
+
+user_id, headers = harness.start(PORT, latency=float(sys.argv[2]) if len(sys.argv) > 2 else 0.02)
+os.environ.update(MAX_UPLOAD_BYTES=str(2 * 1024 * 1024), MAX_UPLOAD_FILES="30")
+
+from main import app  # noqa: E402
+
+
+def photo(seed: int) -> bytes:
+    # Noise, so the JPEG is about as large as a phone photo of the same size; the same seed gives the same file
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (480, 360), random.Random(seed).randbytes(480 * 360 * 3)).save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+async def main(n: int):
+    bonsai = harness.seed_bonsai(user_id, n_images=0)
+    other = harness.seed_bonsai(user_id, n_images=0, title="Maple")
+    url = f"/api/bonsais/{bonsai['id']}/images"
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        async def single(file_name: str, content: bytes, bonsai_id: str = bonsai["id"]) -> httpx.Response:
+            response = await client.post(
+                f"/api/bonsais/{bonsai_id}/images",
+                files={"file": (file_name, content, "image/jpeg")},
+                headers=headers
+            )
+            assert response.status_code == 200, response.text
+            return response
+
+        async def batch(files) -> list:
+            response = await client.post(
+                f"{url}/batch",
+                files=[("files", (file_name, content, "image/jpeg")) for file_name, content in files],
+                headers=headers
+            )
+            assert response.status_code == 200, response.text
+            return response.json()["results"]
+
+        await single("shared.jpg", photo(1), other["id"])
+        await single("existing.jpg", photo(2))
+
+        results = await batch([
+            ("new.jpg", photo(0)),
+            ("shared.jpg", photo(1)),
+            ("existing.jpg", photo(2)),
+            ("new-again.jpg", photo(0)),
+            ("huge.jpg", photo(3) + os.urandom(3 * 1024 * 1024))
+        ])
+        for result in results:
+            image = result.get("image") or {}
+            print(f"  {result['index']} {result['file_name']:14s} {result['status']}  "
+                  f"{image.get('id') or result.get('error')}")
+
+        # Storage is down: the photo is saved with a placeholder, as a single upload is
+        stub_supabase.STATE["fail_storage"] = True
+        single_image = (await single("offline.jpg", photo(4))).json()
+        results = await batch([("offline.jpg", photo(5))])
+        stub_supabase.STATE["fail_storage"] = False
+        print(f"  storage down: single {single_image['image_url'][:28]}...  "
+              f"batch {results[0]['status']} {(results[0].get('image') or {}).get('image_url', '')[:28]}...")
+
+        photos = [photo(100 + i) for i in range(2 * n)]
+
+        harness.reset(PORT)
+        start = time.perf_counter()
+        for i, content in enumerate(photos[:n]):
+            await single(f"single-{i}.jpg", content)
+        elapsed = time.perf_counter() - start
+        stats = harness.stats(PORT)
+        print(f"{n} photos of {len(photos[0]) // 1024} KB, one request each: "
+              f"{elapsed:6.2f}s  {stats['requests']:3d} round trips  {stats['by_kind']}")
+
+        harness.reset(PORT)
+        start = time.perf_counter()
+        results = await batch([(f"batch-{i}.jpg", content) for i, content in enumerate(photos[n:])])
+        elapsed = time.perf_counter() - start
+        assert all(result["status"] == 201 for result in results), results
+        stats = harness.stats(PORT)
+        print(f"{n} photos of {len(photos[0]) // 1024} KB, one batch request: "
+              f"{elapsed:6.2f}s  {stats['requests']:3d} round trips  {stats['by_kind']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 15))
@@ -0,0 +1,101 @@
+"""
+Time and round trips of POST /api/bonsais/bulk against the same work as single requests.
+
+First runs a mixed bulk request (including another user's bonsai and a
+missing one) and prints each result, then creates, updates and deletes N
+bonsais one request at a time and as one bulk request each.
+
+    python -m benchmarks.bulk [operations] [stub latency in seconds]
+"""
+import asyncio
+import sys
+import time
+import uuid
+
+import httpx
+
+from benchmarks import harness, stub_supabase
+
+PORT = 54605
+
+user_id, headers = harness.start(PORT, latency=float(sys.argv[2]) if len(sys.argv) > 2 else 0.002)
+
+from main import app  # noqa: E402
+
+
+async def timed(label: str, n: int, run) -> None:
+    harness.reset(PORT)
+    start = time.perf_counter()
+    await run()
+    elapsed = time.perf_counter() - start
+    stats = harness.stats(PORT)
+    print(f"{label:32s} {elapsed:6.2f}s  {n / elapsed:7.0f} ops/s  {stats['requests']:4d} round trips  {stats['by_kind']}")
+
+
+async def main(n: int):
+    other = harness.seed_bonsai(str(uuid.uuid4()), n_images=0, title="Not mine")
+    first, second, third = (harness.seed_bonsai(user_id, n_images=n_images) for n_images in (1, 0, 0))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        async def bulk(operations):
+            response = await client.post("/api/bonsais/bulk", json={"operations": operations}, headers=headers)
+            assert response.status_code == 200, response.text
+            return response.json()["results"]
+
+        results = await bulk([
+            {"op": "create", "title": "New one"},
+            {"op": "update", "id": first["id"], "title": "Renamed"},
+            {"op": "delete", "id": second["id"]},
+            {"op": "update", "id": other["id"], "title": "Taken over"},
+            {"op": "delete", "id": str(uuid.uuid4())},
+            {"op": "update", "id": third["id"], "title": "Twice"},
+            {"op": "delete", "id": third["id"]}
+        ])
+        for result in results:
+            bonsai = result["bonsai"] or {}
+            print(f"  {result['index']} {result['op']:6s} {result['status']}  "
+                  f"{bonsai.get('title') or result['error'] or ''}  {len(bonsai.get('images') or [])} images")
+        print(f"  another user's bonsai is unchanged: {other['title'] == 'Not mine'}")
+
+        ids = []
+
+        async def single_creates():
+            for i in range(n):
+                response = await client.post("/api/bonsais/", json={"title": f"Single {i}"}, headers=headers)
+                ids.append(response.json()["id"])
+
+        async def single_updates():
+            for bonsai_id in ids:
+                await client.put(f"/api/bonsais/{bonsai_id}", json={"title": "Single renamed"}, headers=headers)
+
+        async def single_deletes():
+            for bonsai_id in ids:
+                await client.delete(f"/api/bonsais/{bonsai_id}", headers=headers)
+
+        await timed(f"{n} single creates", n, single_creates)
+        await timed(f"{n} single updates", n, single_updates)
+        await timed(f"{n} single deletes", n, single_deletes)
+
+        async def bulk_create():
+            results = await bulk([{"op": "create", "title": f"Bulk {i}"} for i in range(n)])
+            assert all(result["status"] == 201 for result in results)
+            ids[:] = [result["bonsai"]["id"] for result in results]
+
+        async def bulk_update():
+            results = await bulk([{"op": "update", "id": bonsai_id, "title": "Bulk renamed"} for bonsai_id in ids])
+            assert all(result["status"] == 200 for result in results)
+
+        async def bulk_delete():
+            results = await bulk([{"op": "delete", "id": bonsai_id} for bonsai_id in ids])
+            assert all(result["status"] == 204 for result in results)
+
+        await timed(f"1 bulk request of {n} creates", n, bulk_create)
+        await timed(f"1 bulk request of {n} updates", n, bulk_update)
+        await timed(f"1 bulk request of {n} deletes", n, bulk_delete)
+
+        assert not [row for row in stub_supabase.STATE["tables"]["bonsais"] if row["id"] in ids]
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
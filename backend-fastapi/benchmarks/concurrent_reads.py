@@ -0,0 +1,51 @@
+"""
+Throughput of parallel GET /api/bonsais/{id} with latency injected at the stub.
+
+Supabase calls run on a thread pool, so requests overlap instead of queueing
+behind each other on the event loop: with 50 ms per stub request, throughput
+should grow with concurrency up to the pool size (SUPABASE_MAX_WORKERS).
+
+    python -m benchmarks.concurrent_reads [requests]
+"""
+import asyncio
+import sys
+import time
+
+import httpx
+
+from benchmarks import harness
+
+PORT = 54602
+LATENCY = 0.05
+
+user_id, headers = harness.start(PORT, latency=LATENCY)
+
+from main import app  # noqa: E402
+from services.supabase_service import supabase_max_workers  # noqa: E402
+
+
+async def main(n: int):
+    # One bonsai per request, so the read cache can't answer for the stub
+    bonsais = [harness.seed_bonsai(user_id) for _ in range(n)]
+    print(f"{LATENCY * 1000:.0f} ms per request at the stub, {supabase_max_workers} Supabase threads")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for concurrency in (1, 10, n):
+            batch = bonsais[:concurrency]
+            for bonsai in batch:
+                # Drop the bonsai from the cache so every request reaches the stub
+                await client.put(f"/api/bonsais/{bonsai['id']}", json={"title": bonsai["title"]}, headers=headers)
+
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(
+                client.get(f"/api/bonsais/{bonsai['id']}", headers=headers) for bonsai in batch
+            ))
+            elapsed = time.perf_counter() - start
+
+            assert all(response.status_code == 200 for response in responses), responses[0].text
+            print(f"{concurrency:4d} parallel GET /api/bonsais/{{id}}: {elapsed:6.2f}s  {concurrency / elapsed:7.1f} req/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
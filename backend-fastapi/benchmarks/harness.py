@@ -0,0 +1,111 @@
+"""
+Shared setup for the benchmarks and stub-backed test scripts.
+
+start() runs the Supabase stub and points the backend's environment at it,
+so it must be called before importing main or anything under services.
+"""
+import io
+import os
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, Tuple
+
+import httpx
+from jose import jwt
+from PIL import Image
+
+from benchmarks import stub_supabase
+
+JWT_SECRET = "benchmark-jwt-secret"
+
+# A service-role key is only checked for its shape by supabase-py
+SERVICE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.stub"
+
+
+def start(port: int, latency: float = 0.0, local_jwt: bool = True) -> Tuple[str, Dict[str, str]]:
+    """
+    Start the Supabase stub and configure the backend to use it.
+
+    Args:
+        port: The local port for the stub
+        latency: Seconds the stub adds to every request
+        local_jwt: Verify tokens locally with a JWT secret, rather than through GoTrue
+
+    Returns:
+        A user ID and the headers that authenticate requests as that user
+    """
+    stub_supabase.serve(port, latency=latency)
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{port}"
+    os.environ["SUPABASE_KEY"] = SERVICE_KEY
+    if local_jwt:
+        os.environ["SUPABASE_JWT_SECRET"] = JWT_SECRET
+    else:
+        os.environ.pop("SUPABASE_JWT_SECRET", None)
+    # Jobs go to a throwaway backlog, not the working directory's
+    os.environ.setdefault("JOB_DB_PATH", os.path.join(tempfile.gettempdir(), f"bonsaiway-bench-{uuid.uuid4().hex}.sqlite3"))
+
+    user_id = str(uuid.uuid4())
+    token = jwt.encode(
+        {"sub": user_id, "aud": "authenticated", "exp": int(time.time()) + 3600},
+        JWT_SECRET,
+        algorithm="HS256"
+    )
+    stub_supabase.STATE["users"][token] = user_id
+    return user_id, {"Authorization": f"Bearer {token}"}
+
+
+def _photo() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (60, 110, 40)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def seed_bonsai(user_id: str, n_images: int = 2, title: str = "Juniper") -> Dict[str, Any]:
+    """
+    Add a bonsai with images and one insight straight to the stub's tables.
+
+    Returns:
+        The bonsai row
+    """
+    tables = stub_supabase.STATE["tables"]
+    bonsai = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "title": title,
+        "description": None,
+        "created_at": stub_supabase.now(),
+        "updated_at": stub_supabase.now()
+    }
+    tables["bonsais"].append(bonsai)
+
+    for i in range(n_images):
+        path = f"{user_id}/{bonsai['id']}/{i}.jpg"
+        stub_supabase.STATE["objects"][f"bonsai-images/{path}"] = _photo()
+        tables["bonsai_images"].append({
+            "id": str(uuid.uuid4()),
+            "bonsai_id": bonsai["id"],
+            "image_url": f"{os.environ['SUPABASE_URL']}/storage/v1/object/public/bonsai-images/{path}",
+            "storage_path": path,
+            "created_at": stub_supabase.now(),
+            "updated_at": stub_supabase.now()
+        })
+
+    tables["ai_insights"].append({
+        "id": str(uuid.uuid4()),
+        "bonsai_id": bonsai["id"],
+        "user_question": "When should I water?",
+        "ai_response": "When the soil surface is dry.",
+        "created_at": stub_supabase.now()
+    })
+    return bonsai
+
+
+def stats(port: int) -> Dict[str, Any]:
+    """The stub's request counts since the last reset: total and by kind."""
+    return httpx.get(f"http://127.0.0.1:{port}/__stats").json()
+
+
+def reset(port: int) -> None:
+    """Zero the stub's request counts."""
+    httpx.post(f"http://127.0.0.1:{port}/__reset", json={})
@@ -0,0 +1,44 @@
+"""
+Round trips and latency of SupabaseService.get_bonsais as a collection grows.
+
+The list embeds each bonsai's images, so it should cost one PostgREST round
+trip whatever the number of trees.
+
+    python -m benchmarks.list_round_trips
+"""
+import asyncio
+import time
+import uuid
+
+from benchmarks import harness
+
+PORT = 54601
+LATENCY = 0.002
+
+harness.start(PORT, latency=LATENCY)
+
+from services.supabase_service import SupabaseService  # noqa: E402
+
+
+async def main():
+    service = SupabaseService()
+    print(f"{LATENCY * 1000:.0f} ms per request at the stub, 2 images per tree")
+
+    for n in (10, 100, 300):
+        # A fresh user each time, so nothing is served from the read cache
+        user_id = str(uuid.uuid4())
+        for _ in range(n):
+            harness.seed_bonsai(user_id)
+
+        harness.reset(PORT)
+        start = time.perf_counter()
+        bonsais = await service.get_bonsais(user_id)
+        elapsed = time.perf_counter() - start
+
+        assert len(bonsais) == n and all(len(bonsai["images"]) == 2 for bonsai in bonsais)
+        round_trips = harness.stats(PORT)["requests"]
+        print(f"trees={n:4d}  round_trips={round_trips:4d}  latency={elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,162 @@
+"""
+Local stand-in for the OpenAI chat completion and embedding endpoints.
+
+Completions take an artificial delay, optionally stream as SSE, and can be
+made to fail, so tests can exercise timeouts, retries and concurrency limits
+without an API key. It is for local measurements only.
+"""
+import hashlib
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+STATE: Dict[str, Any] = {
+    # Seconds a completion takes; streamed completions spread it over their chunks
+    "delay": 1.0,
+    # Reply text, or a callable taking the request body and returning it
+    "reply": None,
+    # Number of upcoming completions answered with 503
+    "fail": 0,
+    # Every request body received, in order
+    "requests": [],
+    "in_flight": 0,
+    "max_in_flight": 0,
+    "lock": threading.Lock()
+}
+
+DEFAULT_REPLY = " ".join(["Water when the soil surface is dry."] * 5)
+
+
+def _embedding(text: str, dimensions: int = 64):
+    # Bag-of-words hashed into a small vector, so similar questions get similar embeddings
+    vector = [0.0] * dimensions
+    for word in set(str(text).lower().replace("?", "").split()):
+        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dimensions] += 1.0
+    return vector
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _send_json(self, code: int, body: Any) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunk(self, data: str) -> None:
+        payload = f"data: {data}\n\n".encode()
+        self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        with STATE["lock"]:
+            STATE["requests"].append(body)
+            STATE["in_flight"] += 1
+            STATE["max_in_flight"] = max(STATE["max_in_flight"], STATE["in_flight"])
+            fail = STATE["fail"] > 0 and not self.path.endswith("/embeddings")
+            if fail:
+                STATE["fail"] -= 1
+
+        try:
+            if self.path.endswith("/embeddings"):
+                self._embeddings(body)
+            elif fail:
+                time.sleep(0.05)
+                self._send_json(503, {"error": {"message": "The server is overloaded", "type": "server_error"}})
+            else:
+                self._completion(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up, e.g. on a timeout
+            pass
+        finally:
+            with STATE["lock"]:
+                STATE["in_flight"] -= 1
+
+    def _embeddings(self, body: Dict[str, Any]) -> None:
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        self._send_json(200, {
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": i, "embedding": _embedding(text)}
+                for i, text in enumerate(inputs)
+            ],
+            "model": body.get("model"),
+            "usage": {"prompt_tokens": 5, "total_tokens": 5}
+        })
+
+    def _completion(self, body: Dict[str, Any]) -> None:
+        reply = STATE["reply"] or DEFAULT_REPLY
+        if callable(reply):
+            reply = reply(body)
+        words = reply.split(" ")
+        usage = {"prompt_tokens": 50, "completion_tokens": len(words), "total_tokens": 50 + len(words)}
+
+        if not body.get("stream"):
+            time.sleep(STATE["delay"])
+            return self._send_json(200, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(delta: Dict[str, Any], finish_reason=None, **extra) -> str:
+            return json.dumps({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra
+            })
+
+        for i, word in enumerate(words):
+            time.sleep(STATE["delay"] / len(words))
+            self._send_chunk(chunk({"content": word if i == 0 else " " + word}))
+        self._send_chunk(chunk({}, "stop", usage=usage))
+        self._send_chunk("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def serve(port: int, delay: float = 1.0) -> ThreadingHTTPServer:
+    """
+    Start the stub on a background thread.
+
+    Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+    Args:
+        port: The local port to listen on
+        delay: Seconds each completion takes
+
+    Returns:
+        The running server
+    """
+    STATE["delay"] = delay
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,455 @@
+"""
+In-memory stand-in for Supabase's PostgREST, Storage and GoTrue APIs.
+
+It implements the subset of each API the backend uses, well enough to run
+the real SupabaseService against it, and counts every request by kind so
+benchmarks can report round trips. It is for local measurements only.
+"""
+import datetime
+import json
+import re
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlparse
+
+STATE: Dict[str, Any] = {
+    "tables": {
+        "bonsais": [],
+        "bonsai_images": [],
+        "ai_insights": [],
+        "care_schedules": [],
+        "insight_summaries": []
+    },
+    # Storage objects by "<bucket>/<path>"
+    "objects": {},
+    # User IDs by access token, for GoTrue's /user
+    "users": {},
+    "requests": 0,
+    "by_kind": {},
+    # Seconds added to every counted request, to stand in for network latency
+    "latency": 0.0,
+    # Answer storage uploads with 500
+    "fail_storage": False,
+    "lock": threading.Lock()
+}
+
+# Postgres functions callable through /rest/v1/rpc/<name>, taking the JSON body
+RPCS: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+
+# Foreign keys pointing at a parent table, for embedded selects
+FOREIGN_KEYS = {"bonsais": "bonsai_id"}
+
+# Tables whose rows have an updated_at column maintained by a trigger
+VERSIONED_TABLES = ("bonsais", "bonsai_images")
+
+# Query parameters that aren't row filters
+NON_FILTERS = ("select", "order", "limit", "offset", "on_conflict", "columns")
+
+
+def now() -> str:
+    """The current time as PostgREST formats timestamptz values."""
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def _split_top(text: str, sep: str = ",") -> List[str]:
+    # Split on sep outside parentheses and quotes
+    parts, depth, current, quoted = [], 0, "", False
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        if not quoted and ch == "(":
+            depth += 1
+        if not quoted and ch == ")":
+            depth -= 1
+        if ch == sep and depth == 0 and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += ch
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _parse_select(select: str):
+    columns, embeds = [], []
+    for part in _split_top(select or "*"):
+        part = part.strip()
+        match = re.match(r"^(?:(\w+):)?(\w+)(!inner)?\((.*)\)$", part)
+        if match:
+            embeds.append({
+                "alias": match.group(1) or match.group(2),
+                "table": match.group(2),
+                "inner": bool(match.group(3)),
+                "select": match.group(4)
+            })
+        else:
+            columns.append(part)
+    return columns, embeds
+
+
+def _match(row: Dict[str, Any], column: str, op: str, value: str) -> bool:
+    actual = row.get(column)
+    if op == "eq":
+        return actual is not None and str(actual) == value.strip('"')
+    if op == "neq":
+        return str(actual) != value.strip('"')
+    if op == "in":
+        return str(actual) in [item.strip('"') for item in _split_top(value.strip("()"))]
+    if op in ("lt", "gt", "lte", "gte"):
+        if actual is None:
+            return False
+        a, b = str(actual), value.strip('"')
+        return {"lt": a < b, "gt": a > b, "lte": a <= b, "gte": a >= b}[op]
+    if op == "is":
+        return actual is None if value == "null" else False
+    raise ValueError(f"Unsupported operator: {op}")
+
+
+def _match_logic(row: Dict[str, Any], expr: str) -> bool:
+    # expr is e.g. "or(a.lt.x,and(b.eq.y,c.lt.z))"
+    match = re.match(r"^(and|or)\((.*)\)$", expr.strip())
+    if match:
+        results = [_match_logic(row, part) for part in _split_top(match.group(2))]
+        return all(results) if match.group(1) == "and" else any(results)
+    column, op, value = expr.strip().split(".", 2)
+    return _match(row, column, op, value)
+
+
+def _matches_filters(row: Dict[str, Any], params: Dict[str, List[str]]) -> bool:
+    for key, values in params.items():
+        if key in NON_FILTERS or "." in key:
+            continue
+        for value in values:
+            if key in ("or", "and"):
+                if not _match_logic(row, key + value):
+                    return False
+                continue
+            op, operand = value.split(".", 1)
+            if not _match(row, key, op, operand):
+                return False
+    return True
+
+
+def _project(row: Dict[str, Any], columns: List[str]) -> Dict[str, Any]:
+    if "*" in columns:
+        return dict(row)
+    return {column: row.get(column) for column in columns}
+
+
+def _sort(rows: List[Dict[str, Any]], order: str) -> None:
+    for key in reversed(order.split(",")):
+        column, *modifiers = key.split(".")
+        rows.sort(key=lambda row: str(row.get(column)), reverse="desc" in modifiers)
+
+
+def select(table: str, params: Dict[str, List[str]], rows: Optional[List[Dict[str, Any]]] = None):
+    """Run a PostgREST read on a table, or on given rows of it."""
+    rows = [row for row in (STATE["tables"][table] if rows is None else rows) if _matches_filters(row, params)]
+    columns, embeds = _parse_select(params.get("select", ["*"])[0])
+
+    # Filters on embedded resources, e.g. bonsais.user_id=eq.<id>
+    embed_filters: Dict[str, List[Any]] = {}
+    for key, values in params.items():
+        if "." in key and not key.endswith((".order", ".limit")):
+            alias, column = key.split(".", 1)
+            embed_filters.setdefault(alias, []).extend((column, value) for value in values)
+
+    out = []
+    for row in rows:
+        result = _project(row, columns)
+        keep = True
+        for embed in embeds:
+            embedded = embed["table"]
+            embedded_columns, _ = _parse_select(embed["select"])
+            if embedded in FOREIGN_KEYS and FOREIGN_KEYS[embedded] in row:
+                # Many-to-one: the parent row
+                parents = [p for p in STATE["tables"][embedded] if p["id"] == row[FOREIGN_KEYS[embedded]]]
+                for column, value in embed_filters.get(embed["alias"], []):
+                    op, operand = value.split(".", 1)
+                    parents = [p for p in parents if _match(p, column, op, operand)]
+                if embed["inner"] and not parents:
+                    keep = False
+                result[embed["alias"]] = _project(parents[0], embedded_columns) if parents else None
+            else:
+                # One-to-many: the child rows, ordered and limited by <alias>.order and <alias>.limit
+                foreign_key = FOREIGN_KEYS.get(table, table.rstrip("s") + "_id")
+                children = [c for c in STATE["tables"][embedded] if c.get(foreign_key) == row["id"]]
+                order = params.get(f"{embed['alias']}.order")
+                if order:
+                    _sort(children, order[0])
+                limit = params.get(f"{embed['alias']}.limit")
+                if limit:
+                    children = children[:int(limit[0])]
+                result[embed["alias"]] = [_project(child, embedded_columns) for child in children]
+        if keep:
+            out.append(result)
+
+    if "order" in params:
+        _sort(out, params["order"][0])
+    if "offset" in params:
+        out = out[int(params["offset"][0]):]
+    if "limit" in params:
+        out = out[:int(params["limit"][0])]
+    return out
+
+
+def _insert(table: str, rows: List[Dict[str, Any]], params: Dict[str, List[str]], prefer: str):
+    conflict_keys = params.get("on_conflict", ["id"])[0].split(",")
+    out = []
+    for row in rows:
+        row = dict(row)
+        existing = [
+            other for other in STATE["tables"][table]
+            if all(other.get(key) is not None and str(other.get(key)) == str(row.get(key)) for key in conflict_keys)
+        ]
+        if existing and "resolution=ignore-duplicates" in prefer:
+            continue
+        if existing and "resolution=merge-duplicates" in prefer:
+            existing[0].update(row)
+            if table in VERSIONED_TABLES:
+                existing[0]["updated_at"] = now()
+            out.append(existing[0])
+            continue
+        row.setdefault("id", str(uuid.uuid4()))
+        row.setdefault("created_at", now())
+        if table in VERSIONED_TABLES:
+            row.setdefault("updated_at", row["created_at"])
+        if table == "bonsais":
+            row.setdefault("description", None)
+        STATE["tables"][table].append(row)
+        out.append(row)
+    return out
+
+
+def _delete(table: str, params: Dict[str, List[str]]):
+    rows = [row for row in STATE["tables"][table] if _matches_filters(row, params)]
+    removed = {id(row) for row in rows}
+    STATE["tables"][table] = [row for row in STATE["tables"][table] if id(row) not in removed]
+    if table == "bonsais":
+        # ON DELETE CASCADE
+        bonsai_ids = {row["id"] for row in rows}
+        for child in ("bonsai_images", "ai_insights"):
+            STATE["tables"][child] = [row for row in STATE["tables"][child] if row.get("bonsai_id") not in bonsai_ids]
+    return rows
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _send(self, code: int, body: Any = None, content_type: str = "application/json") -> None:
+        data = body if isinstance(body, bytes) else b"" if body is None else json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _count(self, kind: str) -> None:
+        with STATE["lock"]:
+            STATE["requests"] += 1
+            STATE["by_kind"][kind] = STATE["by_kind"].get(kind, 0) + 1
+        if STATE["latency"]:
+            time.sleep(STATE["latency"])
+
+    def _route(self, method: str) -> None:
+        url = urlparse(self.path)
+        params: Dict[str, List[str]] = {}
+        for key, value in parse_qsl(url.query, keep_blank_values=True):
+            params.setdefault(key, []).append(value)
+        path = url.path
+        body = self._read_body()
+
+        if path == "/__stats":
+            return self._send(200, {
+                "requests": STATE["requests"],
+                "by_kind": STATE["by_kind"],
+                "objects": len(STATE["objects"])
+            })
+        if path == "/__reset":
+            options = json.loads(body or b"{}")
+            with STATE["lock"]:
+                STATE["requests"] = 0
+                STATE["by_kind"] = {}
+                if "latency" in options:
+                    STATE["latency"] = options["latency"]
+            return self._send(200, {})
+
+        if path.startswith("/auth/v1/user"):
+            return self._user()
+        if path.startswith("/storage/v1/object/"):
+            return self._storage(method, path[len("/storage/v1/object/"):], body)
+        if path.startswith("/rest/v1/rpc/"):
+            return self._rpc(path.rsplit("/", 1)[-1], body)
+        if path.startswith("/rest/v1/"):
+            return self._table(method, path[len("/rest/v1/"):], params, body)
+        self._send(404, {"message": f"Not found: {path}"})
+
+    def _user(self) -> None:
+        self._count("auth")
+        token = (self.headers.get("Authorization") or "").split(" ")[-1]
+        user_id = STATE["users"].get(token)
+        if not user_id:
+            return self._send(401, {"msg": "invalid JWT"})
+        self._send(200, {
+            "id": user_id,
+            "aud": "authenticated",
+            "role": "authenticated",
+            "app_metadata": {},
+            "user_metadata": {},
+            "created_at": now()
+        })
+
+    def _storage(self, method: str, key: str, body: bytes) -> None:
+        if method == "POST" and not key.startswith("public"):
+            self._count("storage_upload")
+            if STATE["fail_storage"]:
+                return self._send(500, {"statusCode": "500", "error": "internal", "message": "storage unavailable"})
+            if key in STATE["objects"] and self.headers.get("x-upsert") != "true":
+                return self._send(400, {"statusCode": "409", "error": "Duplicate", "message": "The resource already exists"})
+            content_type = self.headers.get("Content-Type", "")
+            if "multipart/form-data" in content_type:
+                boundary = content_type.split("boundary=", 1)[1].encode()
+                for part in body.split(b"--" + boundary):
+                    head, _, content = part.partition(b"\r\n\r\n")
+                    if b'name="file"' in head:
+                        body = content[:-2]
+            STATE["objects"][key] = body
+            return self._send(200, {"Key": key})
+
+        if method == "DELETE":
+            self._count("storage_remove")
+            removed = []
+            for prefix in json.loads(body or b"{}").get("prefixes", []):
+                if STATE["objects"].pop(f"{key}/{prefix}", None) is not None:
+                    removed.append({"name": prefix})
+            return self._send(200, removed)
+
+        if method == "GET":
+            self._count("storage_get")
+            for visibility in ("authenticated/", "public/"):
+                key = key.removeprefix(visibility)
+            data = STATE["objects"].get(key)
+            if data is None:
+                return self._send(400, {"statusCode": "404", "error": "not_found", "message": "Object not found"})
+            return self._send(200, data, "application/octet-stream")
+
+        self._send(405, {"message": "Method not allowed"})
+
+    def _rpc(self, name: str, body: bytes) -> None:
+        self._count("rpc")
+        handler = RPCS.get(name)
+        if handler is None:
+            return self._send(404, {"message": f"Function {name} not found"})
+        try:
+            with STATE["lock"]:
+                result = handler(json.loads(body or b"{}"))
+        except Exception as e:
+            return self._send(400, {"message": str(e), "code": "P0001"})
+        self._send(200, result)
+
+    def _table(self, method: str, table: str, params: Dict[str, List[str]], body: bytes) -> None:
+        self._count(f"{method} {table}")
+        if table not in STATE["tables"]:
+            return self._send(404, {"message": f"Relation {table} does not exist"})
+
+        if method in ("GET", "HEAD"):
+            return self._send(200, select(table, params))
+
+        returning = {"select": params["select"]} if params.get("select") else None
+        with STATE["lock"]:
+            if method == "POST":
+                payload = json.loads(body)
+                rows = _insert(table, payload if isinstance(payload, list) else [payload], params,
+                               self.headers.get("Prefer", ""))
+                code = 201
+            elif method == "PATCH":
+                changes = json.loads(body)
+                rows = [row for row in STATE["tables"][table] if _matches_filters(row, params)]
+                for row in rows:
+                    row.update(changes)
+                    if table in VERSIONED_TABLES:
+                        row["updated_at"] = now()
+                code = 200
+            elif method == "DELETE":
+                rows = _delete(table, params)
+                code = 200
+            else:
+                return self._send(405, {"message": "Method not allowed"})
+
+        if "return=minimal" in self.headers.get("Prefer", ""):
+            return self._send(code)
+        self._send(code, select(table, returning, rows) if returning else rows)
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_HEAD(self):
+        self._route("HEAD")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PATCH(self):
+        self._route("PATCH")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+
+def _create_bonsai_with_image(args: Dict[str, Any]) -> Dict[str, Any]:
+    # Mirrors create_bonsai_with_image in schema.sql
+    shared_variants = next((
+        image["variants"] for image in STATE["tables"]["bonsai_images"]
+        if image.get("storage_path") == args["p_storage_path"] and image.get("variants")
+    ), None)
+    bonsai = _insert("bonsais", [{
+        "id": args["p_id"],
+        "user_id": args["p_user_id"],
+        "title": args["p_title"],
+        "description": args["p_description"]
+    }], {}, "")[0]
+    image = _insert("bonsai_images", [{
+        "bonsai_id": args["p_id"],
+        "image_url": args["p_image_url"],
+        "variants": shared_variants,
+        "content_hash": args["p_content_hash"],
+        "storage_path": args["p_storage_path"]
+    }], {}, "")[0]
+    return {**bonsai, "images": [image]}
+
+
+RPCS["create_bonsai_with_image"] = _create_bonsai_with_image
+
+
+def serve(port: int = 54321, latency: float = 0.0) -> ThreadingHTTPServer:
+    """
+    Start the stub on a background thread.
+
+    Args:
+        port: The local port to listen on
+        latency: Seconds added to every API request
+
+    Returns:
+        The running server
+    """
+    STATE["latency"] = latency
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,91 @@
+"""
+Peak memory of the API server while it receives concurrent large uploads.
+
+Uploads are spooled to disk in chunks and streamed to storage, so the
+server's peak RSS should stay well below files x size. The server runs as
+its own uvicorn process so its memory is measured alone.
+
+    python -m benchmarks.upload_memory [files] [megabytes]
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from PIL import Image
+
+from benchmarks import harness
+
+STUB_PORT = 54604
+API_PORT = 8604
+
+
+def memory_mb(pid: int) -> dict:
+    # Current and peak resident set size
+    with open(f"/proc/{pid}/status") as status:
+        return {
+            line.split(":")[0]: int(line.split()[1]) // 1024
+            for line in status if line.startswith(("VmRSS", "VmHWM"))
+        }
+
+
+async def upload(client: httpx.AsyncClient, path: str, bonsai_id: str, headers: dict) -> int:
+    with open(path, "rb") as file:
+        response = await client.post(
+            f"http://127.0.0.1:{API_PORT}/api/bonsais/{bonsai_id}/images",
+            files={"file": ("photo.jpg", file, "image/jpeg")},
+            headers=headers,
+            timeout=300
+        )
+    return response.status_code
+
+
+async def main(n: int, megabytes: int):
+    user_id, headers = harness.start(STUB_PORT)
+    bonsai = harness.seed_bonsai(user_id, n_images=0)
+
+    env = dict(os.environ, MAX_UPLOAD_BYTES=str((megabytes + 1) * 1024 * 1024))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(API_PORT), "--log-level", "warning"],
+        env=env,
+        # Its own process group, so stopping it also stops its worker processes
+        start_new_session=True
+    )
+
+    with tempfile.NamedTemporaryFile(suffix=".jpg") as photo:
+        # A small JPEG padded with random bytes: decoders ignore data after the
+        # image, so it is a valid photo of the right size that doesn't compress
+        Image.new("RGB", (640, 480), (60, 110, 40)).save(photo, "JPEG")
+        photo.write(os.urandom(megabytes * 1024 * 1024))
+        photo.flush()
+
+        try:
+            async with httpx.AsyncClient() as client:
+                for _ in range(50):
+                    try:
+                        await client.get(f"http://127.0.0.1:{API_PORT}/health")
+                        break
+                    except httpx.TransportError:
+                        await asyncio.sleep(0.2)
+
+                print(f"idle server: {memory_mb(server.pid)}")
+                start = time.perf_counter()
+                codes = await asyncio.gather(*(upload(client, photo.name, bonsai["id"], headers) for _ in range(n)))
+                elapsed = time.perf_counter() - start
+
+            print(f"{n} concurrent {megabytes} MB uploads: {codes.count(200)}/{n} ok in {elapsed:.1f}s")
+            print(f"after uploads: {memory_mb(server.pid)}  ({n * megabytes} MB uploaded)")
+        finally:
+            os.killpg(server.pid, signal.SIGTERM)
+            server.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 8,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    ))
@@ -0,0 +1,78 @@
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Optional
+from fastapi import Request, Response, status
+
+# Bonsai data only changes through the user's own writes, which must show up at
+# once: browsers may keep a copy but revalidate it on every use, and shared
+# caches must not store it at all
+PRIVATE_REVALIDATE = "private, no-cache"
+
+
+def row_version(row: Dict[str, Any]) -> List[Any]:
+    """A row's identity and version: its id and updated_at."""
+    return [row.get("id"), row.get("updated_at")]
+
+
+def bonsai_versions(bonsai: Dict[str, Any]) -> List[Any]:
+    """The versions of a bonsai row and the images embedded in it."""
+    images = sorted((row_version(image) for image in bonsai.get("images") or []), key=str)
+    return [row_version({key: value for key, value in bonsai.items() if key != "images"}), images]
+
+
+def make_etag(request: Request, versions: Iterable[Any]) -> str:
+    """
+    A strong ETag for a response, from the versions of the rows in it.
+
+    The request's path and query are included, as they select the rows and
+    fields the response is made of.
+    """
+    digest = hashlib.sha256()
+    digest.update(str(request.url.path).encode())
+    digest.update(b"?" + str(request.url.query).encode())
+    digest.update(json.dumps(list(versions), default=str).encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in (candidate.removeprefix("W/") for candidate in candidates)
+
+
+def conditional(
+    request: Request,
+    response: Response,
+    etag: str,
+    cache_control: str = PRIVATE_REVALIDATE
+) -> Optional[Response]:
+    """
+    Tag a response, and answer 304 Not Modified if the client already has it.
+
+    Handlers return the result if it isn't None, so an unchanged response is
+    never validated or serialised:
+
+        return conditional(request, response, etag) or data
+
+    Args:
+        request: The request, for its If-None-Match header
+        response: The handler's response, which gets the ETag and Cache-Control
+        etag: The response's ETag, from make_etag
+        cache_control: The route's Cache-Control header
+
+    Returns:
+        An empty 304 response, or None if the full response should be sent
+    """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        # Responses differ per user, who is identified by the Authorization header
+        "Vary": "Authorization"
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,85 @@
+import hmac
+import os
+from typing import Annotated, Any, Dict, Optional
+from fastapi import Depends, Header, HTTPException, Request, status
+from pydantic import UUID4
+from services import SupabaseService
+from services.metrics import current_endpoint, current_user
+from services.rate_limit import rate_limiter
+
+# Shared service instance for all routers
+supabase_service = SupabaseService()
+
+# Bearer token for the operational endpoints (/stats); without one they are disabled
+admin_token = os.environ.get("ADMIN_TOKEN")
+
+# Helper function to get authorization header
+async def get_authorization(authorization: Optional[str] = Header(None)) -> str:
+    if not authorization:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated"
+        )
+    return authorization
+
+async def get_current_user(request: Request, authorization: str = Depends(get_authorization)) -> str:
+    """
+    Resolve the authenticated user's ID.
+
+    FastAPI caches dependencies per request, so this runs once no matter how
+    many handlers and sub-dependencies ask for it. Model calls made while
+    handling the request are attributed to the user and the route.
+    """
+    user_id = await supabase_service.get_user_id(authorization)
+
+    route = request.scope.get("route")
+    current_user.set(user_id)
+    current_endpoint.set(f"{request.method} {route.path if route else request.url.path}")
+    return user_id
+
+CurrentUser = Annotated[str, Depends(get_current_user)]
+
+async def get_owned_bonsai(bonsai_id: UUID4, user_id: CurrentUser) -> Dict[str, Any]:
+    """
+    Load the bonsai from the path, raising 404 unless it belongs to the current user.
+
+    Handlers pass the loaded bonsai down to SupabaseService so the row is not
+    fetched again to re-check ownership.
+    """
+    return await supabase_service.get_bonsai(str(bonsai_id), user_id)
+
+OwnedBonsai = Annotated[Dict[str, Any], Depends(get_owned_bonsai)]
+
+async def enforce_ai_limits(user_id: CurrentUser) -> None:
+    """
+    Reject the request with 429 if the user is over their AI rate limit or daily quota.
+
+    Use as a route dependency so it runs before anything else, and a rejected
+    request costs no model call. Handlers that can sometimes answer without a
+    model call (an idempotent replay) await it themselves once they know they
+    need one.
+    """
+    await rate_limiter.check(user_id)
+
+AiRateLimit = Depends(enforce_ai_limits)
+
+async def require_admin(authorization: Optional[str] = Header(None)) -> None:
+    """
+    Reject the request with 403 unless it carries the admin token as a bearer token.
+
+    The operational endpoints expose counters about every user, so they are
+    closed when ADMIN_TOKEN isn't set.
+    """
+    if not admin_token:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them"
+        )
+
+    if not authorization or not hmac.compare_digest(authorization.encode(), f"Bearer {admin_token}".encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized"
+        )
+
+AdminOnly = Depends(require_admin)
@@ -1,13 +1,42 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 print('Starting backend server (main.py)')
-from routers import bonsai, ai_care
+from routers import bonsai, ai_care, jobs
+from routers.ai_care import conversation
+from services.supabase_service import token_verifier
+from services.job_queue import job_queue
+from services.image_processing import shutdown_process_pool
+from services.openai_service import http_client as openai_http_client
+from services.insight_cache import insight_cache
+from services.metrics import model_metrics
+from services.rate_limit import rate_limiter
+from services.read_cache import read_cache
+from services.resilience import resilient_caller
+from services.vision import http_client as vision_http_client, vision_images
+from middleware import UploadSizeLimitMiddleware
+from dependencies import AdminOnly
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="BonsaiWay API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Run background jobs for as long as the server is up
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    shutdown_process_pool()
+    await openai_http_client.aclose()
+    await vision_http_client.aclose()
+
+app = FastAPI(title="BonsaiWay API", lifespan=lifespan)
+
+# Reject oversized uploads before their bodies are read (added before CORS so
+# the 413 still carries CORS headers)
+app.add_middleware(UploadSizeLimitMiddleware)
 
 # Configure CORS
 app.add_middleware(
@@ -21,6 +50,7 @@ app.add_middleware(
 # Include routers
 app.include_router(bonsai.router, prefix="/api/bonsais")
 app.include_router(ai_care.router, prefix="/api/bonsais")
+app.include_router(jobs.router, prefix="/api/jobs")
 
 @app.get("/")
 async def root():
@@ -30,6 +60,25 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/stats", dependencies=[AdminOnly])
+async def stats():
+    return {
+        "auth": token_verifier.stats(),
+        "jobs": job_queue.stats(),
+        "insight_cache": insight_cache.stats(),
+        "conversation": conversation.stats(),
+        "vision": vision_images.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "resilience": resilient_caller.stats(),
+        "read_cache": read_cache.stats(),
+        "model_usage": model_metrics.stats()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[AdminOnly])
+async def metrics():
+    # Prometheus text format: model calls, tokens and latency per endpoint
+    return PlainTextResponse(model_metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
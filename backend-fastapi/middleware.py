@@ -0,0 +1,54 @@
+from fastapi import status
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from services.uploads import max_upload_bytes, max_upload_files
+
+# Allowance for multipart boundaries and form fields on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Multi-file uploads are allowed up to max_upload_files files
+BATCH_UPLOAD_PATH_SUFFIX = "/images/batch"
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject multipart requests whose declared Content-Length is over the upload
+    limit before the body is read at all.
+
+    Requests without a Content-Length are still capped per file while spooling.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_body_bytes: int = max_upload_bytes + MULTIPART_OVERHEAD_BYTES,
+        max_batch_body_bytes: int = max_upload_files * (max_upload_bytes + MULTIPART_OVERHEAD_BYTES)
+    ):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.max_batch_body_bytes = max_batch_body_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            headers = dict(scope["headers"])
+            content_type = headers.get(b"content-type", b"")
+            content_length = headers.get(b"content-length", b"")
+            batch = scope["path"].endswith(BATCH_UPLOAD_PATH_SUFFIX)
+            max_body_bytes = self.max_batch_body_bytes if batch else self.max_body_bytes
+
+            if (
+                content_type.startswith(b"multipart/form-data")
+                and content_length.isdigit()
+                and int(content_length) > max_body_bytes
+            ):
+                limit = f"{max_upload_bytes // (1024 * 1024)} MB"
+                if batch:
+                    limit = f"{max_upload_files} files of {limit}"
+                response = JSONResponse(
+                    {"detail": f"File too large (maximum is {limit})"},
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+                )
+                await response(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
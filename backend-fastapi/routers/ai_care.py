@@ -1,19 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
-from typing import List, Optional
+import asyncio
+import json
+from fastapi import APIRouter, Header, HTTPException, status, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
 from pydantic import BaseModel, UUID4
-from datetime import datetime
-from services import SupabaseService, OpenAIService
+from datetime import datetime, timezone
+from services import OpenAIService
+from services.broadcast import Broadcast
+from services.openai_service import care_schedule_batch_size, care_schedule_parallelism
+from services.conversation import (
+    ConversationBuilder,
+    ConversationHistory,
+    conversation_recent_turns,
+    conversation_token_budget
+)
+from services.job_queue import JobFailed, job_queue
+from conditional import conditional, make_etag
+from dependencies import supabase_service, enforce_ai_limits, AiRateLimit, CurrentUser, OwnedBonsai
 
 # Initialize services
-supabase_service = SupabaseService()
 try:
     openai_service = OpenAIService()
     openai_available = True
 except ValueError:
     openai_available = False
 
+conversation = ConversationBuilder(
+    supabase_service,
+    token_budget=conversation_token_budget,
+    recent_turns=conversation_recent_turns
+)
+
 router = APIRouter(tags=["ai_care"])
 
+# Streamed insights are produced by tasks that outlive their request, so they are
+# saved even if the client disconnects; holding them here keeps them alive
+_insight_producers: Set[asyncio.Task] = set()
+
+# Events of the insights being streamed with an Idempotency-Key, so a retry of a
+# request still in progress follows it instead of starting another
+_insight_streams: Dict[Tuple[str, str, str, Optional[str]], Broadcast[str]] = {}
+
 # Pydantic models
 class AiInsightBase(BaseModel):
     user_question: str
@@ -30,56 +57,364 @@ class AiInsight(AiInsightBase):
     class Config:
         orm_mode = True
 
-# Helper function to get authorization header
-async def get_authorization(authorization: Optional[str] = Header(None)) -> str:
-    if not authorization:
+@router.get("/{bonsai_id}/insights", response_model=List[AiInsight])
+async def get_bonsai_insights(bonsai_id: UUID4, request: Request, response: Response, user_id: CurrentUser):
+    insights = await supabase_service.get_bonsai_insights(str(bonsai_id), user_id)
+    # Insights are only ever added and deleted, never edited, so their IDs version the list
+    etag = make_etag(request, [insight["id"] for insight in insights])
+    return conditional(request, response, etag) or insights
+
+class QueuedJob(BaseModel):
+    job_id: str
+    status: str
+
+class CareSchedule(BaseModel):
+    id: UUID4
+    bonsai_id: UUID4
+    care_schedule: str
+    updated_at: datetime
+
+    class Config:
+        orm_mode = True
+
+async def generate_insight_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Background job: answer a question about a bonsai and save the insight."""
+    try:
+        bonsai = await supabase_service.get_bonsai(payload["bonsai_id"], payload["user_id"])
+    except HTTPException as e:
+        if e.status_code == status.HTTP_404_NOT_FOUND:
+            raise JobFailed("Bonsai not found")
+        raise
+    
+    image_urls = [img["image_url"] for img in bonsai.get("images", [])]
+    history = await _conversation_history(payload["bonsai_id"], payload["user_id"])
+    ai_response = await openai_service.generate_bonsai_insight(payload["question"], bonsai, image_urls, history)
+    
+    return await supabase_service.create_bonsai_insight(
+        payload["bonsai_id"],
+        payload["user_id"],
+        payload["question"],
+        ai_response,
+        bonsai=bonsai,
+        idempotency_key=payload.get("idempotency_key")
+    )
+
+async def summarize_conversation_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Background job: fold a bonsai's older insights into its conversation summary."""
+    folded = await conversation.summarize(
+        payload["bonsai_id"],
+        openai_service.summarize_conversation,
+        keep=payload["keep"]
+    )
+    return {"summarized": folded}
+
+def _check_idempotent_question(insight: Dict[str, Any], question: str) -> None:
+    """Reject a reused Idempotency-Key whose saved insight answered a different question."""
+    if insight.get("user_question") != question:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated"
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different question"
         )
-    return authorization
 
-@router.get("/{bonsai_id}/insights", response_model=List[AiInsight])
-async def get_bonsai_insights(bonsai_id: UUID4, authorization: str = Header(None)):
-    auth = await get_authorization(authorization)
-    user_id = await supabase_service.get_user_id(auth)
-    return await supabase_service.get_bonsai_insights(str(bonsai_id), user_id)
+async def _conversation_history(bonsai_id: str, user_id: str) -> ConversationHistory:
+    """Load the earlier conversation about a bonsai, queueing a summary update when one is due."""
+    history = await conversation.build(bonsai_id)
+    
+    # The summary is updated after this answer, so the request doesn't wait for it.
+    # Half the recent turns are folded in at once, so it's updated every few questions
+    if history.needs_summary and conversation.claim_summary(bonsai_id):
+        # Queued for the user, so the summary's model calls count towards their quota
+        await job_queue.enqueue(
+            "conversation.summarize",
+            {
+                "bonsai_id": bonsai_id,
+                "user_id": user_id,
+                "keep": min(len(history.turns), conversation.recent_turns // 2)
+            },
+            user_id=user_id
+        )
+    return history
+
+async def generate_care_schedules_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Background job: generate care schedules for a user's bonsais whose details changed."""
+    bonsais = await supabase_service.get_care_schedule_fingerprints(payload["user_id"])
+    
+    def forced(bonsai: Dict[str, Any]) -> bool:
+        # A forced run regenerates the schedules written before it was requested, so a
+        # retry skips those an earlier attempt of this job already wrote
+        if not payload.get("force"):
+            return False
+        if not payload.get("forced_at") or not bonsai["schedule_updated_at"]:
+            return True
+        written_at = datetime.fromisoformat(bonsai["schedule_updated_at"].replace("Z", "+00:00"))
+        return written_at < datetime.fromisoformat(payload["forced_at"])
+    
+    for bonsai in bonsais:
+        bonsai["fingerprint"] = openai_service.care_schedule_fingerprint(bonsai)
+    stale = [
+        bonsai for bonsai in bonsais
+        if bonsai["fingerprint"] != bonsai["schedule_fingerprint"] or forced(bonsai)
+    ]
+    
+    progress = {"total": len(stale), "done": 0, "failed": 0, "skipped": len(bonsais) - len(stale)}
+    await job_queue.report_progress(progress)
+    
+    slots = asyncio.Semaphore(care_schedule_parallelism)
+    
+    async def generate(batch: List[Dict[str, Any]]) -> None:
+        async with slots:
+            try:
+                schedules = await openai_service.generate_care_schedules(batch)
+                
+                # Bonsais left out of a batched answer are asked for one at a time
+                for bonsai in batch:
+                    if str(bonsai["id"]) not in schedules and len(batch) > 1:
+                        schedules.update(await openai_service.generate_care_schedules([bonsai]))
+                
+                rows = [
+                    {
+                        "bonsai_id": bonsai["id"],
+                        "care_schedule": schedules[str(bonsai["id"])],
+                        "fingerprint": bonsai["fingerprint"]
+                    }
+                    for bonsai in batch if str(bonsai["id"]) in schedules
+                ]
+                if rows:
+                    await supabase_service.save_care_schedules(rows)
+                
+                progress["done"] += len(rows)
+                progress["failed"] += len(batch) - len(rows)
+            except HTTPException as e:
+                print(f"Error generating care schedules: {e.detail}")
+                progress["failed"] += len(batch)
+            
+            await job_queue.report_progress(progress)
+    
+    batches = [stale[i:i + care_schedule_batch_size] for i in range(0, len(stale), care_schedule_batch_size)]
+    await asyncio.gather(*(generate(batch) for batch in batches))
+    
+    # Retrying only regenerates the failures, since saved schedules now match their
+    # fingerprints and, on a forced run, were written after it was requested
+    if progress["failed"]:
+        raise RuntimeError(f"{progress['failed']} of {progress['total']} care schedules failed")
+    
+    return {"generated": progress["done"], "skipped": progress["skipped"]}
+
+if openai_available:
+    job_queue.register("insight.generate", generate_insight_job)
+    job_queue.register("care_schedules.generate", generate_care_schedules_job)
+    job_queue.register("conversation.summarize", summarize_conversation_job)
 
-@router.post("/{bonsai_id}/insights", response_model=AiInsight)
-async def create_bonsai_insight(bonsai_id: UUID4, insight: AiInsightCreate, authorization: str = Header(None)):
+def _sse(event: str, data: Any) -> str:
+    """Format a Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def _produce_insight(
+    events: Broadcast[str],
+    bonsai_id: str,
+    user_id: str,
+    question: str,
+    bonsai: Dict[str, Any],
+    image_urls: List[str],
+    idempotency_key: Optional[str] = None
+) -> None:
+    """Publish the model's output as it arrives, then save the insight once."""
+    parts = []
+    try:
+        history = await _conversation_history(bonsai_id, user_id)
+        async for text in openai_service.stream_bonsai_insight(question, bonsai, image_urls, history):
+            parts.append(text)
+            events.publish(_sse("token", {"text": text}))
+        
+        # Only a complete answer is saved
+        insight = await supabase_service.create_bonsai_insight(
+            bonsai_id,
+            user_id,
+            question,
+            "".join(parts),
+            bonsai=bonsai,
+            idempotency_key=idempotency_key
+        )
+        if idempotency_key:
+            _check_idempotent_question(insight, question)
+        events.publish(_sse("done", insight))
+    except HTTPException as e:
+        events.publish(_sse("error", {"detail": e.detail}))
+    except Exception as e:
+        print(f"Error streaming insight: {str(e)}")
+        events.publish(_sse("error", {"detail": f"Error generating AI insight: {str(e)}"}))
+    finally:
+        events.close()
+
+def _event_stream(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _replay_insight(insight: Dict[str, Any]) -> StreamingResponse:
+    """Stream an already saved insight, for a retried streaming request."""
+    async def replay() -> AsyncIterator[str]:
+        yield _sse("token", {"text": insight["ai_response"]})
+        yield _sse("done", insight)
+    
+    return _event_stream(replay())
+
+def _stream_insight(
+    bonsai_id: str,
+    user_id: str,
+    question: str,
+    bonsai: Dict[str, Any],
+    image_urls: List[str],
+    idempotency_key: Optional[str] = None
+) -> StreamingResponse:
+    """Start producing an insight, or join the one in progress, and stream its events to the client."""
+    # Without a key every request saves its own insight, though the model call is still shared
+    key = (user_id, bonsai_id, question, idempotency_key)
+    events = _insight_streams.get(key) if idempotency_key else None
+    
+    if events is None:
+        events = Broadcast()
+        producer = asyncio.create_task(
+            _produce_insight(events, bonsai_id, user_id, question, bonsai, image_urls, idempotency_key)
+        )
+        _insight_producers.add(producer)
+        producer.add_done_callback(_insight_producers.discard)
+        if idempotency_key:
+            _insight_streams[key] = events
+            producer.add_done_callback(lambda _: _insight_streams.pop(key, None))
+    
+    async def forward() -> AsyncIterator[str]:
+        # Cancelled when the client disconnects; the producer carries on regardless
+        async for event in events.subscribe():
+            yield event
+    
+    return _event_stream(forward())
+
+@router.post(
+    "/{bonsai_id}/insights",
+    response_model=AiInsight,
+    responses={
+        status.HTTP_200_OK: {
+            "content": {"text/event-stream": {}},
+            "description": "The insight, or with stream=true \"token\" events followed by a \"done\" event carrying the saved insight"
+        },
+        status.HTTP_202_ACCEPTED: {"model": QueuedJob, "description": "Insight queued (background=true)"}
+    }
+)
+async def create_bonsai_insight(
+    bonsai_id: UUID4,
+    insight: AiInsightCreate,
+    bonsai: OwnedBonsai,
+    user_id: CurrentUser,
+    background: bool = Query(False, description="Answer in a background job and return its ID"),
+    stream: bool = Query(False, description="Stream the answer as Server-Sent Events"),
+    idempotency_key: Optional[str] = Header(
+        None,
+        max_length=255,
+        description="Retries with the same key return the insight saved by the first request"
+    )
+):
     if not openai_available:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="OpenAI API key not configured"
         )
-        
-    auth = await get_authorization(authorization)
-    user_id = await supabase_service.get_user_id(auth)
     
-    # Get bonsai data
-    bonsai = await supabase_service.get_bonsai(str(bonsai_id), user_id)
+    if idempotency_key:
+        saved = await supabase_service.get_insight_by_idempotency_key(str(bonsai_id), idempotency_key)
+        if saved:
+            _check_idempotent_question(saved, insight.user_question)
+            return _replay_insight(saved) if stream else saved
+    
+    # Charged only after the replay check, so a client retrying a finished
+    # request isn't throttled for it
+    await enforce_ai_limits(user_id)
+    
+    if background:
+        # The answer is saved as an insight when the job finishes; poll GET /api/jobs/{job_id}
+        job_id = await job_queue.enqueue(
+            "insight.generate",
+            {
+                "bonsai_id": str(bonsai_id),
+                "user_id": user_id,
+                "question": insight.user_question,
+                "idempotency_key": idempotency_key
+            },
+            user_id=user_id
+        )
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"job_id": job_id, "status": "queued"}
+        )
     
     # Get image URLs
     image_urls = [img["image_url"] for img in bonsai.get("images", [])]
     
-    # Generate AI response
+    if stream:
+        return _stream_insight(str(bonsai_id), user_id, insight.user_question, bonsai, image_urls, idempotency_key)
+    
+    # Generate AI response, following on from the earlier questions about this bonsai
+    history = await _conversation_history(str(bonsai_id), user_id)
     ai_response = await openai_service.generate_bonsai_insight(
         insight.user_question,
         bonsai,
-        image_urls
+        image_urls,
+        history
     )
     
     # Save insight to database
-    return await supabase_service.create_bonsai_insight(
+    saved = await supabase_service.create_bonsai_insight(
         str(bonsai_id),
         user_id,
         insight.user_question,
-        ai_response
+        ai_response,
+        bonsai=bonsai,
+        idempotency_key=idempotency_key
+    )
+    
+    # A concurrent request with the same key may have saved its insight first
+    if idempotency_key:
+        _check_idempotent_question(saved, insight.user_question)
+    return saved
+
+@router.post(
+    "/care-schedules",
+    response_model=QueuedJob,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[AiRateLimit]
+)
+async def generate_care_schedules(
+    user_id: CurrentUser,
+    force: bool = Query(False, description="Regenerate schedules for bonsais that haven't changed too")
+):
+    if not openai_available:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="OpenAI API key not configured"
+        )
+    
+    # Poll GET /api/jobs/{job_id} for progress
+    job_id = await job_queue.enqueue(
+        "care_schedules.generate",
+        {
+            "user_id": user_id,
+            "force": force,
+            "forced_at": datetime.now(timezone.utc).isoformat() if force else None
+        },
+        user_id=user_id
     )
+    return {"job_id": job_id, "status": "queued"}
+
+@router.get("/{bonsai_id}/care-schedule", response_model=CareSchedule)
+async def get_care_schedule(bonsai_id: UUID4, user_id: CurrentUser):
+    return await supabase_service.get_care_schedule(str(bonsai_id), user_id)
 
 @router.delete("/{bonsai_id}/insights/{insight_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_bonsai_insight(bonsai_id: UUID4, insight_id: UUID4, authorization: str = Header(None)):
-    auth = await get_authorization(authorization)
-    user_id = await supabase_service.get_user_id(auth)
+async def delete_bonsai_insight(bonsai_id: UUID4, insight_id: UUID4, user_id: CurrentUser):
     await supabase_service.delete_bonsai_insight(str(bonsai_id), str(insight_id), user_id)
+    
+    # The summary may include the deleted insight; it is rebuilt from the remaining ones
+    await conversation.reset(str(bonsai_id))
     return None
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Header
-from typing import List, Optional
-from pydantic import BaseModel, UUID4
+from contextlib import AsyncExitStack
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request, Response
+from typing import Annotated, Dict, List, Literal, Optional, Union
+from pydantic import BaseModel, Field, UUID4
 from datetime import datetime
-from services import SupabaseService
-
-# Initialize services
-supabase_service = SupabaseService()
+from conditional import bonsai_versions, conditional, make_etag
+from dependencies import supabase_service, CurrentUser, OwnedBonsai
+from services.supabase_service import bulk_max_operations
+from services.uploads import max_upload_files, spool_upload
 
 router = APIRouter(tags=["bonsais"])
 
@@ -22,6 +23,8 @@ class BonsaiImage(BaseModel):
     bonsai_id: UUID4
     image_url: str
     created_at: datetime
+    # Resized copies of the original, e.g. variants["thumb"]["webp"]
+    variants: Optional[Dict[str, Dict[str, str]]] = None
 
 class Bonsai(BonsaiBase):
     id: UUID4
@@ -32,25 +35,80 @@ class Bonsai(BonsaiBase):
     class Config:
         orm_mode = True
 
-# Helper function to get authorization header
-async def get_authorization(authorization: Optional[str] = Header(None)) -> str:
-    if not authorization:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated"
-        )
-    return authorization
+class BonsaiListItem(BaseModel):
+    """A bonsai in a paged list; fields left out by projection are omitted."""
+    id: UUID4
+    user_id: Optional[UUID4] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+    created_at: datetime
+    images: Optional[List[BonsaiImage]] = None
+
+class BonsaiPage(BaseModel):
+    items: List[BonsaiListItem]
+    next_cursor: Optional[str] = None
 
-@router.get("/", response_model=List[Bonsai])
-async def get_bonsais(authorization: str = Header(None)):
-    auth = await get_authorization(authorization)
-    user_id = await supabase_service.get_user_id(auth)
-    return await supabase_service.get_bonsais(user_id)
+class BulkCreate(BonsaiBase):
+    op: Literal["create"]
+
+class BulkUpdate(BonsaiBase):
+    op: Literal["update"]
+    id: UUID4
+
+class BulkDelete(BaseModel):
+    op: Literal["delete"]
+    id: UUID4
+
+BulkOperation = Annotated[Union[BulkCreate, BulkUpdate, BulkDelete], Field(discriminator="op")]
+
+class BulkRequest(BaseModel):
+    operations: List[BulkOperation] = Field(..., min_length=1, max_length=bulk_max_operations)
+
+class BulkResult(BaseModel):
+    """The outcome of one operation: its HTTP status, and the bonsai or an error."""
+    index: int
+    op: str
+    status: int
+    bonsai: Optional[Bonsai] = None
+    error: Optional[str] = None
+
+class BulkResponse(BaseModel):
+    results: List[BulkResult]
+
+class ImageUploadResult(BaseModel):
+    """The outcome of one file: its HTTP status, and the image or an error."""
+    index: int
+    file_name: str
+    status: int
+    image: Optional[BonsaiImage] = None
+    error: Optional[str] = None
+
+class ImageUploadResponse(BaseModel):
+    results: List[ImageUploadResult]
+
+@router.get("/", response_model=Union[BonsaiPage, List[Bonsai]], response_model_exclude_unset=True)
+async def get_bonsais(
+    request: Request,
+    response: Response,
+    user_id: CurrentUser,
+    paged: bool = Query(False, description="Set to true for one page with a next_cursor instead of every bonsai"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated bonsai fields to return"),
+    images: Literal["none", "first", "all"] = "all"
+):
+    if not paged:
+        bonsais = await supabase_service.get_bonsais(user_id)
+        etag = make_etag(request, [bonsai_versions(bonsai) for bonsai in bonsais])
+        return conditional(request, response, etag) or bonsais
+    
+    field_list = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    page = await supabase_service.get_bonsais_page(user_id, limit, cursor, field_list, images)
+    etag = make_etag(request, [page["next_cursor"]] + [bonsai_versions(bonsai) for bonsai in page["items"]])
+    return conditional(request, response, etag) or page
 
 @router.post("/", response_model=Bonsai)
-async def create_bonsai(bonsai: BonsaiCreate, authorization: str = Header(None)):
-    auth = await get_authorization(authorization)
-    user_id = await supabase_service.get_user_id(auth)
+async def create_bonsai(bonsai: BonsaiCreate, user_id: CurrentUser):
     # Ensure user_id is a valid UUID string
     import uuid
     try:
@@ -68,17 +126,19 @@ async def create_bonsai(bonsai: BonsaiCreate, authorization: str = Header(None))
     
     return await supabase_service.create_bonsai(user_id, bonsai_data)
 
+@router.post("/bulk", response_model=BulkResponse)
+async def bulk_bonsais(request: BulkRequest, user_id: CurrentUser):
+    # One request and a few multi-row statements instead of a request per bonsai;
+    # each operation gets its own result, so one failure doesn't undo the rest
+    operations = [operation.model_dump() for operation in request.operations]
+    return {"results": await supabase_service.bulk_bonsais(user_id, operations)}
+
 @router.get("/{bonsai_id}", response_model=Bonsai)
-async def get_bonsai(bonsai_id: UUID4, authorization: str = Header(None)):
-    auth = await get_authorization(authorization)
-    user_id = await supabase_service.get_user_id(auth)
-    return await supabase_service.get_bonsai(str(bonsai_id), user_id)
+async def get_bonsai(request: Request, response: Response, bonsai: OwnedBonsai):
+    return conditional(request, response, make_etag(request, bonsai_versions(bonsai))) or bonsai
 
 @router.put("/{bonsai_id}", response_model=Bonsai)
-async def update_bonsai(bonsai_id: UUID4, bonsai: BonsaiBase, authorization: str = Header(None)):
-    auth = await get_authorization(authorization)
-    user_id = await supabase_service.get_user_id(auth)
-    
+async def update_bonsai(bonsai_id: UUID4, bonsai: BonsaiBase, user_id: CurrentUser):
     bonsai_data = {
         "title": bonsai.title,
         "description": bonsai.description
@@ -87,42 +147,63 @@ async def update_bonsai(bonsai_id: UUID4, bonsai: BonsaiBase, authorization: str
     return await supabase_service.update_bonsai(str(bonsai_id), user_id, bonsai_data)
 
 @router.delete("/{bonsai_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_bonsai(bonsai_id: UUID4, authorization: str = Header(None)):
-    auth = await get_authorization(authorization)
-    user_id = await supabase_service.get_user_id(auth)
+async def delete_bonsai(bonsai_id: UUID4, user_id: CurrentUser):
     await supabase_service.delete_bonsai(str(bonsai_id), user_id)
     return None
 
 @router.post("/{bonsai_id}/images", response_model=BonsaiImage)
 async def upload_bonsai_image(
     bonsai_id: UUID4,
-    file: UploadFile = File(...),
-    authorization: str = Header(None)
+    user_id: CurrentUser,
+    file: UploadFile = File(...)
 ):
-    auth = await get_authorization(authorization)
-    user_id = await supabase_service.get_user_id(auth)
+    # Spool to disk in chunks and stream to storage rather than reading it all into memory
+    async with spool_upload(file) as upload:
+        return await supabase_service.upload_bonsai_image(str(bonsai_id), user_id, upload)
+
+@router.post("/{bonsai_id}/images/batch", response_model=ImageUploadResponse)
+async def upload_bonsai_images(
+    bonsai_id: UUID4,
+    user_id: CurrentUser,
+    files: List[UploadFile] = File(...)
+):
+    if len(files) > max_upload_files:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Too many files (maximum is {max_upload_files})"
+        )
     
-    # Read file content
-    file_content = await file.read()
+    results = []
+    async with AsyncExitStack() as stack:
+        # A file over the size limit is rejected on its own; the others are still saved
+        spooled = {}
+        for index, file in enumerate(files):
+            try:
+                spooled[index] = await stack.enter_async_context(spool_upload(file))
+            except HTTPException as e:
+                results.append({
+                    "index": index,
+                    "file_name": file.filename or "upload",
+                    "status": e.status_code,
+                    "error": e.detail
+                })
+        
+        if spooled:
+            saved = await supabase_service.upload_bonsai_images(str(bonsai_id), user_id, list(spooled.values()))
+            for index, result in zip(spooled, saved):
+                results.append({**result, "index": index})
     
-    return await supabase_service.upload_bonsai_image(
-        str(bonsai_id),
-        user_id,
-        file_content,
-        file.filename
-    )
+    return {"results": sorted(results, key=lambda result: result["index"])}
 
 @router.post("/with-image", response_model=Bonsai)
 async def create_bonsai_with_image(
+    user_id: CurrentUser,
     file: UploadFile = File(...),
     title: str = Form("New Bonsai"),  # Default title if not provided
-    description: Optional[str] = Form(None),
-    authorization: str = Header(None)
+    description: Optional[str] = Form(None)
 ):
     print('HIT /api/bonsais/with-image endpoint')
     try:
-        auth = await get_authorization(authorization)
-        user_id = await supabase_service.get_user_id(auth)
         # Ensure user_id is a valid UUID string
         import uuid
         try:
@@ -133,27 +214,17 @@ async def create_bonsai_with_image(
                 detail="Invalid user_id: not a valid UUID."
             )
         
-        # Read file content first
-        file_content = await file.read()
-        
-        # Create the bonsai
         bonsai_data = {
             "title": title,
             "description": description
         }
         
-        bonsai = await supabase_service.create_bonsai(user_id, bonsai_data)
-        
-        # Then upload the image for this bonsai
-        await supabase_service.upload_bonsai_image(
-            str(bonsai.id),
-            user_id,
-            file_content,
-            file.filename
-        )
-        
-        # Return the bonsai with the image
-        return await supabase_service.get_bonsai(str(bonsai.id), user_id)
+        # Spool the file first, so an oversized upload is rejected before creating anything;
+        # the bonsai, its image and the stored object are then created together or not at all
+        async with spool_upload(file) as upload:
+            return await supabase_service.create_bonsai_with_image(user_id, bonsai_data, upload)
+    except HTTPException:
+        raise
     except Exception as e:
         # Log the error for debugging
         print(f"Error in create_bonsai_with_image: {str(e)}")
@@ -163,8 +234,6 @@ async def create_bonsai_with_image(
         )
 
 @router.delete("/{bonsai_id}/images/{image_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_bonsai_image(bonsai_id: UUID4, image_id: UUID4, authorization: str = Header(None)):
-    auth = await get_authorization(authorization)
-    user_id = await supabase_service.get_user_id(auth)
+async def delete_bonsai_image(bonsai_id: UUID4, image_id: UUID4, user_id: CurrentUser):
     await supabase_service.delete_bonsai_image(str(bonsai_id), str(image_id), user_id)
     return None
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, HTTPException, status
+from typing import Any, Optional
+from pydantic import BaseModel, UUID4
+from datetime import datetime
+from services.job_queue import job_queue
+from dependencies import CurrentUser
+
+router = APIRouter(tags=["jobs"])
+
+# Pydantic models
+class Job(BaseModel):
+    id: UUID4
+    name: str
+    status: str  # queued, running, succeeded or failed
+    attempts: int
+    result: Optional[Any] = None
+    progress: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+@router.get("/{job_id}", response_model=Job)
+async def get_job(job_id: UUID4, user_id: CurrentUser):
+    job = await job_queue.get_job(str(job_id), user_id)
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    
+    return job
@@ -7,7 +7,8 @@ CREATE TABLE IF NOT EXISTS bonsais (
     user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE,
     title VARCHAR(255) NOT NULL,
     description TEXT,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Create bonsai_images table
@@ -15,7 +16,11 @@ CREATE TABLE IF NOT EXISTS bonsai_images (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     bonsai_id UUID REFERENCES bonsais(id) ON DELETE CASCADE,
     image_url VARCHAR(512) NOT NULL,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    variants JSONB,
+    content_hash VARCHAR(64),
+    storage_path VARCHAR(512),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Create ai_insights table
@@ -24,13 +29,100 @@ CREATE TABLE IF NOT EXISTS ai_insights (
     bonsai_id UUID REFERENCES bonsais(id) ON DELETE CASCADE,
     user_question TEXT NOT NULL,
     ai_response TEXT NOT NULL,
+    idempotency_key VARCHAR(255),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Create care_schedules table (the latest generated schedule for each bonsai)
+CREATE TABLE IF NOT EXISTS care_schedules (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    bonsai_id UUID UNIQUE REFERENCES bonsais(id) ON DELETE CASCADE,
+    care_schedule TEXT NOT NULL,
+    -- Hash of the inputs the schedule was generated from; unchanged bonsais are skipped
+    fingerprint VARCHAR(64) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create insight_summaries table (rolling summary of each bonsai's older insights)
+CREATE TABLE IF NOT EXISTS insight_summaries (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    bonsai_id UUID UNIQUE REFERENCES bonsais(id) ON DELETE CASCADE,
+    summary TEXT NOT NULL,
+    -- Creation time of the newest insight in the summary; later ones are sent verbatim
+    summarized_until TIMESTAMP WITH TIME ZONE NOT NULL,
+    insight_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Index for keyset pagination of a user's bonsais (newest first)
+CREATE INDEX IF NOT EXISTS bonsais_user_created_id_idx
+    ON bonsais (user_id, created_at DESC, id DESC);
+
+-- Index for reading a bonsai's most recent insights as conversation history
+CREATE INDEX IF NOT EXISTS ai_insights_bonsai_created_idx
+    ON ai_insights (bonsai_id, created_at DESC);
+
+-- Keep updated_at current, so ETags change whenever a bonsai or image does
+CREATE OR REPLACE FUNCTION set_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bonsais_set_updated_at ON bonsais;
+CREATE TRIGGER bonsais_set_updated_at
+    BEFORE UPDATE ON bonsais
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS bonsai_images_set_updated_at ON bonsai_images;
+CREATE TRIGGER bonsai_images_set_updated_at
+    BEFORE UPDATE ON bonsai_images
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+-- Create a bonsai and its first image in one transaction (POST /api/bonsais/with-image).
+-- An image whose object is already stored for another image shares its variants
+CREATE OR REPLACE FUNCTION create_bonsai_with_image(
+    p_id UUID,
+    p_user_id UUID,
+    p_title VARCHAR,
+    p_description TEXT,
+    p_image_url VARCHAR,
+    p_content_hash VARCHAR,
+    p_storage_path VARCHAR
+)
+RETURNS JSONB AS $$
+DECLARE
+    new_bonsai bonsais;
+    new_image bonsai_images;
+    shared_variants JSONB;
+BEGIN
+    SELECT variants INTO shared_variants
+        FROM bonsai_images
+        WHERE storage_path = p_storage_path AND variants IS NOT NULL
+        LIMIT 1;
+
+    INSERT INTO bonsais (id, user_id, title, description)
+        VALUES (p_id, p_user_id, p_title, p_description)
+        RETURNING * INTO new_bonsai;
+
+    INSERT INTO bonsai_images (bonsai_id, image_url, variants, content_hash, storage_path)
+        VALUES (p_id, p_image_url, shared_variants, p_content_hash, p_storage_path)
+        RETURNING * INTO new_image;
+
+    RETURN to_jsonb(new_bonsai) || jsonb_build_object('images', jsonb_build_array(to_jsonb(new_image)));
+END;
+$$ LANGUAGE plpgsql;
+
 -- Set up Row Level Security (RLS) policies
 ALTER TABLE bonsais ENABLE ROW LEVEL SECURITY;
 ALTER TABLE bonsai_images ENABLE ROW LEVEL SECURITY;
 ALTER TABLE ai_insights ENABLE ROW LEVEL SECURITY;
+ALTER TABLE care_schedules ENABLE ROW LEVEL SECURITY;
+ALTER TABLE insight_summaries ENABLE ROW LEVEL SECURITY;
 
 -- Create policies for bonsais table
 CREATE POLICY "Users can view their own bonsais" 
@@ -98,3 +190,79 @@ CREATE POLICY "Users can delete insights for their bonsais"
         WHERE bonsais.id = ai_insights.bonsai_id 
         AND bonsais.user_id = auth.uid()
     ));
+
+-- Create policies for care_schedules table
+CREATE POLICY "Users can view care schedules for their bonsais" 
+    ON care_schedules FOR SELECT 
+    USING (EXISTS (
+        SELECT 1 FROM bonsais 
+        WHERE bonsais.id = care_schedules.bonsai_id 
+        AND bonsais.user_id = auth.uid()
+    ));
+
+CREATE POLICY "Users can insert care schedules for their bonsais" 
+    ON care_schedules FOR INSERT 
+    WITH CHECK (EXISTS (
+        SELECT 1 FROM bonsais 
+        WHERE bonsais.id = care_schedules.bonsai_id 
+        AND bonsais.user_id = auth.uid()
+    ));
+
+CREATE POLICY "Users can update care schedules for their bonsais" 
+    ON care_schedules FOR UPDATE 
+    USING (EXISTS (
+        SELECT 1 FROM bonsais 
+        WHERE bonsais.id = care_schedules.bonsai_id 
+        AND bonsais.user_id = auth.uid()
+    ));
+
+-- Create policies for insight_summaries table
+CREATE POLICY "Users can view insight summaries for their bonsais" 
+    ON insight_summaries FOR SELECT 
+    USING (EXISTS (
+        SELECT 1 FROM bonsais 
+        WHERE bonsais.id = insight_summaries.bonsai_id 
+        AND bonsais.user_id = auth.uid()
+    ));
+
+CREATE POLICY "Users can insert insight summaries for their bonsais" 
+    ON insight_summaries FOR INSERT 
+    WITH CHECK (EXISTS (
+        SELECT 1 FROM bonsais 
+        WHERE bonsais.id = insight_summaries.bonsai_id 
+        AND bonsais.user_id = auth.uid()
+    ));
+
+CREATE POLICY "Users can update insight summaries for their bonsais" 
+    ON insight_summaries FOR UPDATE 
+    USING (EXISTS (
+        SELECT 1 FROM bonsais 
+        WHERE bonsais.id = insight_summaries.bonsai_id 
+        AND bonsais.user_id = auth.uid()
+    ));
+
+CREATE POLICY "Users can delete insight summaries for their bonsais" 
+    ON insight_summaries FOR DELETE 
+    USING (EXISTS (
+        SELECT 1 FROM bonsais 
+        WHERE bonsais.id = insight_summaries.bonsai_id 
+        AND bonsais.user_id = auth.uid()
+    ));
+
+-- Upgrades for databases created from an earlier version of this file
+ALTER TABLE bonsai_images ADD COLUMN IF NOT EXISTS variants JSONB;
+ALTER TABLE bonsai_images ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+ALTER TABLE bonsai_images ADD COLUMN IF NOT EXISTS storage_path VARCHAR(512);
+ALTER TABLE ai_insights ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(255);
+ALTER TABLE bonsais ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE bonsai_images ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP;
+
+-- Indexes on columns added by the upgrades above
+
+-- Images are content-addressed; rows sharing a storage_path reference the same object
+CREATE INDEX IF NOT EXISTS bonsai_images_storage_path_idx
+    ON bonsai_images (storage_path);
+
+-- A retried insight request with the same Idempotency-Key returns the saved insight
+CREATE UNIQUE INDEX IF NOT EXISTS ai_insights_bonsai_idempotency_key_idx
+    ON ai_insights (bonsai_id, idempotency_key);
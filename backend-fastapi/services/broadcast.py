@@ -0,0 +1,67 @@
+import asyncio
+from typing import AsyncIterator, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Broadcast(Generic[T]):
+    """
+    A sequence of items from one producer, delivered to any number of subscribers.
+
+    Subscribers that join late first get every item published so far, so each
+    sees the whole sequence, followed by the producer's error if it failed.
+    """
+
+    def __init__(self):
+        self.items: List[T] = []
+        self.closed = False
+        self.error: Optional[Exception] = None
+        self.subscribers = 0
+
+        # Replaced after every change, so waiters wake up once per change
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, item: T) -> None:
+        """Add an item, waking every subscriber."""
+        if self.closed:
+            raise RuntimeError("Broadcast is closed")
+        self.items.append(item)
+        self._notify()
+
+    def close(self, error: Optional[Exception] = None) -> None:
+        """
+        End the sequence. Closing again has no effect.
+
+        Args:
+            error: Raised to subscribers once they have every item, if the producer failed
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.error = error
+        self._notify()
+
+    async def subscribe(self) -> AsyncIterator[T]:
+        """
+        Iterate over the items from the first, waiting for new ones until the sequence ends.
+
+        Raises:
+            Exception: The producer's error, after the items published before it
+        """
+        self.subscribers += 1
+        index = 0
+        while True:
+            changed = self._changed
+            if index < len(self.items):
+                index += 1
+                yield self.items[index - 1]
+            elif self.closed:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                await changed.wait()
@@ -0,0 +1,271 @@
+import os
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; without it tokens are estimated from length
+    tiktoken = None
+
+# Load environment variables
+load_dotenv()
+
+# Tokens of earlier conversation (summary plus recent turns) sent with each question
+conversation_token_budget = int(os.environ.get("CONVERSATION_TOKEN_BUDGET", "1500"))
+
+# Most recent questions and answers sent verbatim; older ones are only summarised
+conversation_recent_turns = int(os.environ.get("CONVERSATION_RECENT_TURNS", "6"))
+
+# Older insights folded into the summary per model call
+SUMMARY_CHUNK_SIZE = 20
+
+# A question and its answer
+Turn = Tuple[str, str]
+
+# Takes the previous summary (or None) and the turns to add, returns the new summary
+Summarizer = Callable[[Optional[str], List[Turn]], Awaitable[str]]
+
+# Loaded on first use, since it may download its data and shouldn't delay startup
+_encoding = None
+_encoding_failed = tiktoken is None
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            print(f"Error loading tiktoken encoding, estimating token counts: {str(e)}")
+            _encoding_failed = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens in text, or estimate them at four characters each without tiktoken."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        try:
+            return len(encoding.encode(text))
+        except Exception:
+            pass
+    return (len(text) + 3) // 4
+
+
+@dataclass
+class ConversationHistory:
+    """Earlier questions and answers about a bonsai, trimmed to fit the prompt."""
+    summary: Optional[str] = None
+    turns: List[Turn] = field(default_factory=list)
+    tokens: int = 0
+    # Insights older than the turns that are not in the summary yet
+    needs_summary: bool = False
+
+    def messages(self) -> List[Dict[str, str]]:
+        """Chat messages replaying the conversation, to go before the new question."""
+        messages = []
+        if self.summary:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of your earlier conversation with the user about this bonsai: {self.summary}"
+            })
+        for question, answer in self.turns:
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": answer})
+        return messages
+
+    def transcript(self) -> str:
+        """The history as text, so answers are only cached for the same conversation."""
+        lines = [f"Summary: {self.summary}"] if self.summary else []
+        for question, answer in self.turns:
+            lines.append(f"Q: {question}\nA: {answer}")
+        return "\n".join(lines)
+
+
+class ConversationBuilder:
+    """
+    Builds the conversation history sent with each question about a bonsai.
+
+    The most recent insights are sent verbatim; older ones are folded into a
+    rolling summary stored in insight_summaries. The summary is only ever
+    extended with the insights added since it was last updated, in a
+    background job, so building a prompt never waits on the model and the
+    prompt stays the same size however long the history grows.
+    """
+
+    def __init__(
+        self,
+        supabase_service: Any,
+        token_budget: int = 1500,
+        recent_turns: int = 6,
+        cache_size: int = 1000
+    ):
+        """
+        Initialize the builder.
+
+        Args:
+            supabase_service: The SupabaseService insights and summaries are read from
+            token_budget: Maximum tokens of history per prompt
+            recent_turns: Maximum questions and answers sent verbatim
+            cache_size: Number of bonsais whose summary is kept in memory
+        """
+        self.supabase_service = supabase_service
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.cache_size = cache_size
+
+        # Summaries by bonsai ID; a bonsai without one maps to None
+        self._summaries: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+        # Per-bonsai locks, with the number of callers holding or waiting for each
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._lock_users: Dict[str, int] = {}
+        self._summarizing: Set[str] = set()
+
+        self.summaries_written = 0
+        self.turns_trimmed = 0
+
+    async def _summary(self, bonsai_id: str, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        if not refresh and bonsai_id in self._summaries:
+            self._summaries.move_to_end(bonsai_id)
+            return self._summaries[bonsai_id]
+
+        summary = await self.supabase_service.get_insight_summary(bonsai_id)
+        self._remember(bonsai_id, summary)
+        return summary
+
+    def _remember(self, bonsai_id: str, summary: Optional[Dict[str, Any]]) -> None:
+        self._summaries[bonsai_id] = summary
+        self._summaries.move_to_end(bonsai_id)
+        while len(self._summaries) > self.cache_size:
+            self._summaries.popitem(last=False)
+
+    async def build(self, bonsai_id: str) -> ConversationHistory:
+        """
+        Build the history for a new question about a bonsai.
+
+        Costs one small query (two the first time a bonsai is seen), whatever the
+        number of insights.
+
+        Args:
+            bonsai_id: The bonsai's ID
+
+        Returns:
+            The summary and recent turns that fit the token budget
+        """
+        summary = await self._summary(bonsai_id)
+        recent = await self.supabase_service.get_insight_history(
+            bonsai_id,
+            after=summary["summarized_until"] if summary else None,
+            limit=self.recent_turns + 1
+        )
+
+        history = ConversationHistory(needs_summary=len(recent) > self.recent_turns)
+
+        if summary:
+            tokens = count_tokens(summary["summary"])
+            if tokens <= self.token_budget:
+                history.summary = summary["summary"]
+                history.tokens = tokens
+
+        # Newest first, until the budget runs out
+        for insight in recent[:self.recent_turns]:
+            tokens = count_tokens(insight["user_question"]) + count_tokens(insight["ai_response"])
+            if history.tokens + tokens > self.token_budget:
+                # Turns that don't fit are summarised instead
+                self.turns_trimmed += 1
+                history.needs_summary = True
+                break
+            history.turns.insert(0, (insight["user_question"], insight["ai_response"]))
+            history.tokens += tokens
+
+        return history
+
+    def claim_summary(self, bonsai_id: str) -> bool:
+        """
+        Mark a bonsai's summary as being updated.
+
+        Returns:
+            False if an update is already under way, so it isn't queued twice
+        """
+        if bonsai_id in self._summarizing:
+            return False
+        self._summarizing.add(bonsai_id)
+        return True
+
+    async def summarize(self, bonsai_id: str, summarizer: Summarizer, keep: int) -> int:
+        """
+        Fold the insights not yet in a bonsai's summary into it, except the newest ones.
+
+        Args:
+            bonsai_id: The bonsai's ID
+            summarizer: Produces the new summary from the previous one and the turns to add
+            keep: Number of newest insights left out, as they are still sent verbatim
+
+        Returns:
+            Number of insights added to the summary
+        """
+        lock = self._locks.setdefault(bonsai_id, asyncio.Lock())
+        self._lock_users[bonsai_id] = self._lock_users.get(bonsai_id, 0) + 1
+        try:
+            async with lock:
+                summary = await self._summary(bonsai_id, refresh=True)
+                pending = await self.supabase_service.get_insight_history(
+                    bonsai_id,
+                    after=summary["summarized_until"] if summary else None,
+                    newest_first=False
+                )
+                fold = pending[:max(0, len(pending) - keep)]
+
+                for start in range(0, len(fold), SUMMARY_CHUNK_SIZE):
+                    chunk = fold[start:start + SUMMARY_CHUNK_SIZE]
+                    text = await summarizer(
+                        summary["summary"] if summary else None,
+                        [(insight["user_question"], insight["ai_response"]) for insight in chunk]
+                    )
+                    summary = await self.supabase_service.save_insight_summary(
+                        bonsai_id,
+                        text,
+                        chunk[-1]["created_at"],
+                        (summary["insight_count"] if summary else 0) + len(chunk)
+                    )
+                    self._remember(bonsai_id, summary)
+                    self.summaries_written += 1
+
+                return len(fold)
+        finally:
+            self._summarizing.discard(bonsai_id)
+            # Dropped only once nobody is waiting for it, or a new caller would get
+            # a fresh lock and summarize alongside a waiter on this one
+            self._lock_users[bonsai_id] -= 1
+            if not self._lock_users[bonsai_id]:
+                del self._lock_users[bonsai_id]
+                del self._locks[bonsai_id]
+
+    async def reset(self, bonsai_id: str) -> None:
+        """
+        Drop a bonsai's summary after an insight is deleted, so it is rebuilt without it.
+
+        Args:
+            bonsai_id: The bonsai's ID
+        """
+        await self.supabase_service.delete_insight_summary(bonsai_id)
+        self._remember(bonsai_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get history counters.
+
+        Returns:
+            Dictionary with the number of cached summaries, summary updates and trimmed turns
+        """
+        return {
+            "cached_summaries": len(self._summaries),
+            "summaries_written": self.summaries_written,
+            "turns_trimmed": self.turns_trimmed,
+            "token_budget": self.token_budget,
+            # Until the first count, whether the encoding can be loaded isn't known yet
+            "exact_token_counts": not _encoding_failed
+        }
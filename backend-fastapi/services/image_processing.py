@@ -0,0 +1,153 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it only originals are stored
+    Image = None
+    ImageOps = None
+
+# Load environment variables
+load_dotenv()
+
+# Longest edge, in pixels, of each derivative generated for an uploaded image
+VARIANT_SIZES = {
+    "thumb": 200,
+    "medium": 800,
+    "full": 2048
+}
+
+# Encodings produced for every variant: format name, file extension, MIME type, save options
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "webp", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True})
+}
+
+# Whether variants can be generated at all
+variants_enabled = Image is not None
+
+image_workers = int(os.environ.get("IMAGE_WORKERS", "2"))
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def render_variants(path: str) -> Dict[str, Dict[str, bytes]]:
+    """
+    Decode an image and encode every derivative. Runs in a worker process.
+
+    Orientation is normalised from the EXIF tag, and the encoded variants carry
+    no EXIF metadata (including GPS).
+
+    Args:
+        path: Path to the original image on disk
+
+    Returns:
+        Encoded bytes keyed by variant name, then by format
+    """
+    with Image.open(path) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGB")
+
+    variants: Dict[str, Dict[str, bytes]] = {}
+    for name, size in VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+        variants[name] = {}
+        for key, (format_name, _, _, options) in VARIANT_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, format_name, **options)
+            variants[name][key] = buffer.getvalue()
+
+    return variants
+
+
+def render_model_image(data: bytes, size: int) -> bytes:
+    """
+    Downsize an image for a vision model. Runs in a worker process.
+
+    Args:
+        data: The encoded image
+        size: Longest edge of the result, in pixels
+
+    Returns:
+        JPEG bytes without EXIF metadata
+    """
+    with Image.open(BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGB")
+
+    image.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+    buffer = BytesIO()
+    image.save(buffer, "JPEG", quality=85, optimize=True)
+    return buffer.getvalue()
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+
+    if _process_pool is None:
+        # Spawned rather than forked: a forked worker would inherit the server's
+        # listening socket, threads and signal handlers, and outlive a shutdown
+        _process_pool = ProcessPoolExecutor(
+            max_workers=image_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    """Stop the worker processes, letting running work finish; they are started again when next needed."""
+    global _process_pool
+
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
+
+
+async def generate_variants(path: str) -> Optional[Dict[str, Dict[str, bytes]]]:
+    """
+    Generate image derivatives in the process pool, off the event loop.
+
+    Args:
+        path: Path to the original image on disk
+
+    Returns:
+        Encoded variants, or None if Pillow is unavailable or the file isn't a decodable image
+    """
+    if Image is None:
+        return None
+
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_process_pool(), render_variants, path)
+    except Exception as e:
+        print(f"Image processing error: {str(e)}")
+        return None
+
+
+async def resize_for_model(data: bytes, size: int) -> Optional[bytes]:
+    """
+    Downsize an image for a vision model in the process pool, off the event loop.
+
+    Args:
+        data: The encoded image
+        size: Longest edge of the result, in pixels
+
+    Returns:
+        JPEG bytes, or None if Pillow is unavailable or the data isn't a decodable image
+    """
+    if Image is None:
+        return None
+
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_process_pool(), render_model_image, data, size)
+    except Exception as e:
+        print(f"Image processing error: {str(e)}")
+        return None
@@ -0,0 +1,267 @@
+import os
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+@dataclass
+class CachedInsight:
+    """A cached answer and what it took to generate."""
+    answer: str
+    context_key: str
+    expires_at: float
+    latency: float
+    embedding: Optional[List[float]] = None
+    bonsai_ids: Set[str] = field(default_factory=set)
+
+
+def _normalise(text: str) -> str:
+    """Lowercase and collapse whitespace, so trivially different prompts share a key."""
+    return " ".join(text.lower().split())
+
+
+def _normalise_question(question: str) -> str:
+    return _normalise(question).rstrip("?!. ")
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class InsightCache:
+    """
+    Cache of AI answers keyed on the prompt context and the question.
+
+    The exact tier matches the normalised context and question. The optional
+    semantic tier matches questions whose embeddings are similar, but only
+    among answers generated for the same context, so an answer is never reused
+    for a different tree. Entries expire after a TTL and the least recently
+    used are evicted first.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 24 * 3600.0,
+        max_entries: int = 1000,
+        embedding_model: Optional[str] = None,
+        similarity_threshold: float = 0.92
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl: Seconds an answer is reused for
+            max_entries: Maximum number of cached answers
+            embedding_model: OpenAI embedding model for the semantic tier; None disables it
+            similarity_threshold: Minimum cosine similarity for a semantic match
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embedding_model = embedding_model
+        self.similarity_threshold = similarity_threshold
+
+        self._entries: "OrderedDict[str, CachedInsight]" = OrderedDict()
+        # Vector index: entry keys with embeddings, grouped by context
+        self._by_context: Dict[str, Set[str]] = {}
+        self._by_bonsai: Dict[str, Set[str]] = {}
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.latency_saved = 0.0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return bool(self.embedding_model)
+
+    @staticmethod
+    def context_key(context: str) -> str:
+        """Key for a prompt context, shared by every question asked about it."""
+        return _digest(_normalise(context))
+
+    @staticmethod
+    def entry_key(context: str, question: str) -> str:
+        """Exact-tier key for a question asked in a context."""
+        return _digest(_normalise(context) + "\n" + _normalise_question(question))
+
+    def _live(self, key: str) -> Optional[CachedInsight]:
+        entry = self._entries.get(key)
+        if entry and entry.expires_at <= time.time():
+            self._remove(key)
+            return None
+        return entry
+
+    def _hit(self, key: str, entry: CachedInsight, bonsai_id: Optional[str]) -> str:
+        self._entries.move_to_end(key)
+        self.latency_saved += entry.latency
+        if bonsai_id:
+            # The answer now also depends on this bonsai staying unchanged
+            entry.bonsai_ids.add(bonsai_id)
+            self._by_bonsai.setdefault(bonsai_id, set()).add(key)
+        return entry.answer
+
+    def get(self, context: str, question: str, bonsai_id: Optional[str] = None) -> Optional[str]:
+        """
+        Look up an answer in the exact tier.
+
+        Args:
+            context: The prompt context built for the bonsai
+            question: The user's question
+            bonsai_id: The bonsai the question is about
+
+        Returns:
+            The cached answer, or None
+        """
+        key = self.entry_key(context, question)
+        entry = self._live(key)
+
+        if entry is None:
+            return None
+
+        self.exact_hits += 1
+        return self._hit(key, entry, bonsai_id)
+
+    def get_similar(self, context: str, embedding: List[float], bonsai_id: Optional[str] = None) -> Optional[str]:
+        """
+        Look up the answer to the most similar question asked in the same context.
+
+        Args:
+            context: The prompt context built for the bonsai
+            embedding: Embedding of the user's question
+            bonsai_id: The bonsai the question is about
+
+        Returns:
+            The cached answer, or None if no question is similar enough
+        """
+        best_key, best_score = None, self.similarity_threshold
+
+        for key in list(self._by_context.get(self.context_key(context), ())):
+            entry = self._live(key)
+            if entry is None or entry.embedding is None:
+                continue
+            score = _cosine(embedding, entry.embedding)
+            if score >= best_score:
+                best_key, best_score = key, score
+
+        if best_key is None:
+            return None
+
+        self.semantic_hits += 1
+        return self._hit(best_key, self._entries[best_key], bonsai_id)
+
+    def record_miss(self) -> None:
+        """Count a question that had to be answered by the model."""
+        self.misses += 1
+
+    def put(
+        self,
+        context: str,
+        question: str,
+        answer: str,
+        latency: float,
+        bonsai_id: Optional[str] = None,
+        embedding: Optional[List[float]] = None
+    ) -> None:
+        """
+        Cache a generated answer.
+
+        Args:
+            context: The prompt context built for the bonsai
+            question: The user's question
+            answer: The generated answer
+            latency: Seconds it took to generate
+            bonsai_id: The bonsai the question is about
+            embedding: Embedding of the question, for the semantic tier
+        """
+        key = self.entry_key(context, question)
+        self._remove(key)
+
+        entry = CachedInsight(
+            answer=answer,
+            context_key=self.context_key(context),
+            expires_at=time.time() + self.ttl,
+            latency=latency,
+            embedding=embedding
+        )
+        self._entries[key] = entry
+
+        if embedding is not None:
+            self._by_context.setdefault(entry.context_key, set()).add(key)
+        if bonsai_id:
+            entry.bonsai_ids.add(bonsai_id)
+            self._by_bonsai.setdefault(bonsai_id, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        keys = self._by_context.get(entry.context_key)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_context[entry.context_key]
+
+        for bonsai_id in entry.bonsai_ids:
+            keys = self._by_bonsai.get(bonsai_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_bonsai[bonsai_id]
+
+    def invalidate_bonsai(self, bonsai_id: str) -> None:
+        """
+        Drop every answer used for a bonsai, after its title, description or images change.
+
+        Args:
+            bonsai_id: The bonsai's ID
+        """
+        keys = self._by_bonsai.pop(bonsai_id, set())
+        for key in keys:
+            self._remove(key)
+        self.invalidations += len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Dictionary with hit/miss counts per tier, hit rate and model time saved
+        """
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "latency_saved_seconds": round(self.latency_saved, 3),
+            "semantic_enabled": self.semantic_enabled
+        }
+
+
+insight_cache = InsightCache(
+    ttl=float(os.environ.get("INSIGHT_CACHE_TTL", str(24 * 3600))),
+    max_entries=int(os.environ.get("INSIGHT_CACHE_SIZE", "1000")),
+    embedding_model=os.environ.get("INSIGHT_CACHE_EMBEDDING_MODEL") or None,
+    similarity_threshold=float(os.environ.get("INSIGHT_CACHE_SIMILARITY", "0.92"))
+)
@@ -0,0 +1,442 @@
+import os
+import asyncio
+import json
+import random
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from dotenv import load_dotenv
+from .metrics import current_endpoint, current_user
+
+# Load environment variables
+load_dotenv()
+
+# A handler receives the job's payload and returns a JSON-serialisable result
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+# ID of the job the current task is running, for progress reports
+_current_job: ContextVar[Optional[str]] = ContextVar("current_job", default=None)
+
+
+class JobFailed(Exception):
+    """Raised by a handler to fail its job without retrying it."""
+
+
+JOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    user_id TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_at REAL NOT NULL,
+    result TEXT,
+    progress TEXT,
+    error TEXT,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_run_at_idx ON jobs (status, run_at);
+"""
+
+
+class JobQueue:
+    """
+    In-process background jobs, persisted to SQLite so they survive restarts.
+
+    Jobs are run by a pool of asyncio workers reading from a bounded queue.
+    Failed jobs are retried with exponential backoff. Delivery is at least once:
+    a job interrupted by a restart runs again, so handlers must be idempotent.
+
+    Several processes may share the backlog. A running job is leased to the
+    process running it, which renews the lease while it runs; a job whose lease
+    expired (its process died) is queued again by whichever process notices.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "jobs.sqlite3",
+        workers: int = 4,
+        queue_size: int = 1000,
+        max_attempts: int = 5,
+        retry_base: float = 2.0,
+        retry_max: float = 300.0,
+        poll_interval: float = 1.0,
+        retention: float = 7 * 24 * 3600.0,
+        lease_timeout: float = 60.0
+    ):
+        """
+        Initialize the job queue.
+
+        Args:
+            db_path: Path of the SQLite database holding the backlog
+            workers: Number of jobs run concurrently
+            queue_size: Maximum number of jobs waiting in memory; the rest wait in SQLite
+            max_attempts: Attempts before a job is marked failed
+            retry_base: Delay in seconds before the first retry, doubled for each one after
+            retry_max: Longest delay between retries, in seconds
+            poll_interval: Seconds between scans of SQLite for due jobs
+            retention: Seconds finished jobs are kept for status lookups
+            lease_timeout: Seconds a running job stays claimed after its process last renewed the lease
+        """
+        self.db_path = db_path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.lease_timeout = lease_timeout
+
+        # Identifies this process's leases among the processes sharing the backlog
+        self._owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+
+        self._handlers: Dict[str, JobHandler] = {}
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=queue_size)
+        self._pending: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+        self._running = False
+        self._wakeup = asyncio.Event()
+
+        # SQLite is only touched from this single thread, so writes never contend
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs-db")
+        self._db: Optional[sqlite3.Connection] = None
+
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.recovered = 0
+
+    def register(self, name: str, handler: JobHandler) -> None:
+        """
+        Register the coroutine function that runs jobs with the given name.
+
+        Args:
+            name: The job name passed to enqueue
+            handler: Async callable taking the job's payload
+        """
+        self._handlers[name] = handler
+
+    async def _db_call(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(JOB_SCHEMA)
+
+            # Backlogs created before progress reporting and leases
+            columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            if "progress" not in columns:
+                self._db.execute("ALTER TABLE jobs ADD COLUMN progress TEXT")
+            if "lease_owner" not in columns:
+                self._db.execute("ALTER TABLE jobs ADD COLUMN lease_owner TEXT")
+                self._db.execute("ALTER TABLE jobs ADD COLUMN lease_expires_at REAL")
+        return self._db
+
+    def _sql(self, statement: str, *params: Any) -> List[sqlite3.Row]:
+        return self._connect().execute(statement, params).fetchall()
+
+    async def enqueue(self, name: str, payload: Dict[str, Any], user_id: Optional[str] = None) -> str:
+        """
+        Persist a job and hand it to the workers.
+
+        Args:
+            name: Name of a registered handler
+            payload: JSON-serialisable arguments for the handler
+            user_id: The user the job belongs to, who may look up its status
+
+        Returns:
+            The job's ID
+        """
+        job_id = str(uuid.uuid4())
+        now = time.time()
+
+        await self._db_call(
+            self._sql,
+            "INSERT INTO jobs (id, name, user_id, payload, status, run_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+            job_id, name, user_id, json.dumps(payload), now, now, now
+        )
+
+        # If the queue is full the job waits in SQLite until the poller picks it up
+        self._dispatch(job_id)
+        return job_id
+
+    def _dispatch(self, job_id: str) -> bool:
+        if not self._running or job_id in self._pending:
+            return False
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            return False
+        self._pending.add(job_id)
+        return True
+
+    async def get_job(self, job_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get a job's status.
+
+        Args:
+            job_id: The job's ID
+            user_id: If given, only a job belonging to this user is returned
+
+        Returns:
+            The job, or None if it doesn't exist or belongs to another user
+        """
+        rows = await self._db_call(self._sql, "SELECT * FROM jobs WHERE id = ?", job_id)
+        if not rows or (user_id is not None and rows[0]["user_id"] != user_id):
+            return None
+
+        row = rows[0]
+        return {
+            "id": row["id"],
+            "name": row["name"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "progress": json.loads(row["progress"]) if row["progress"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+
+    async def report_progress(self, progress: Dict[str, Any]) -> None:
+        """
+        Record progress for the job being run, shown by status lookups.
+
+        Does nothing when called outside a job.
+
+        Args:
+            progress: JSON-serialisable progress, e.g. {"done": 3, "total": 10}
+        """
+        job_id = _current_job.get()
+        if job_id is None:
+            return
+
+        await self._db_call(
+            self._sql,
+            "UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?",
+            json.dumps(progress), time.time(), job_id
+        )
+
+    async def start(self) -> None:
+        """Start the workers and requeue jobs left over from a process that stopped."""
+        if self._running:
+            return
+
+        await self._recover_expired()
+
+        self._running = True
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._poller()))
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Stop the workers, giving running jobs a grace period to finish.
+
+        Jobs still running after the grace period are cancelled and run again on the next start.
+
+        Args:
+            timeout: Seconds to wait for running jobs
+        """
+        if not self._running:
+            return
+
+        self._running = False
+        self._wakeup.set()
+
+        # Drop queued jobs from memory; they are still queued in SQLite
+        while not self._queue.empty():
+            self._pending.discard(self._queue.get_nowait())
+            self._queue.task_done()
+
+        _, still_running = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in still_running:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._pending.clear()
+
+        # Jobs cancelled above can run again at once, without waiting for their leases to expire
+        await self._db_call(
+            self._sql,
+            "UPDATE jobs SET status = 'queued', lease_owner = NULL, updated_at = ? "
+            "WHERE status = 'running' AND lease_owner = ?",
+            time.time(), self._owner
+        )
+
+    async def _recover_expired(self) -> None:
+        """Requeue running jobs whose lease expired, because the process running them stopped."""
+        recovered = await self._db_call(
+            self._sql,
+            "UPDATE jobs SET status = 'queued', lease_owner = NULL, updated_at = ? "
+            "WHERE status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?) RETURNING id",
+            time.time(), time.time()
+        )
+        if recovered:
+            self.recovered += len(recovered)
+            print(f"Requeued {len(recovered)} job(s) whose process stopped while running them")
+
+    async def _renew_leases(self) -> None:
+        """Extend the leases of the jobs this process is running."""
+        await self._db_call(
+            self._sql,
+            "UPDATE jobs SET lease_expires_at = ? WHERE status = 'running' AND lease_owner = ?",
+            time.time() + self.lease_timeout, self._owner
+        )
+
+    async def _poller(self) -> None:
+        """
+        Feed the queue with jobs waiting in SQLite: retries that are due and overflow.
+
+        Also renews this process's leases and recovers jobs whose leases expired.
+        """
+        last_cleanup = 0.0
+        last_lease_check = time.time()
+
+        while self._running:
+            try:
+                # Renewed well before expiry, so a slow poll can't let a lease lapse
+                if time.time() - last_lease_check > self.lease_timeout / 3:
+                    last_lease_check = time.time()
+                    await self._renew_leases()
+                    await self._recover_expired()
+
+                room = self._queue.maxsize - self._queue.qsize()
+                if room > 0:
+                    rows = await self._db_call(
+                        self._sql,
+                        "SELECT id FROM jobs WHERE status = 'queued' AND run_at <= ? ORDER BY run_at LIMIT ?",
+                        time.time(), room + len(self._pending)
+                    )
+                    for row in rows:
+                        if row["id"] not in self._pending and not self._dispatch(row["id"]):
+                            break
+
+                if time.time() - last_cleanup > 3600:
+                    last_cleanup = time.time()
+                    await self._db_call(
+                        self._sql,
+                        "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?",
+                        time.time() - self.retention
+                    )
+            except Exception as e:
+                print(f"Job poller error: {str(e)}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _worker(self) -> None:
+        while self._running:
+            try:
+                job_id = await asyncio.wait_for(self._queue.get(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                continue
+
+            try:
+                await self._run_job(job_id)
+            except Exception as e:
+                print(f"Job {job_id} error: {str(e)}")
+            finally:
+                self._pending.discard(job_id)
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str) -> None:
+        # Claim the job; it may already have been run through another path or process
+        claimed = await self._db_call(
+            self._sql,
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, "
+            "lease_expires_at = ?, updated_at = ? "
+            "WHERE id = ? AND status = 'queued' RETURNING name, user_id, payload, attempts",
+            self._owner, time.time() + self.lease_timeout, time.time(), job_id
+        )
+        if not claimed:
+            return
+
+        name, payload, attempts = claimed[0]["name"], json.loads(claimed[0]["payload"]), claimed[0]["attempts"]
+        handler = self._handlers.get(name)
+
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job '{name}'")
+            # Model calls made by the job are attributed to its user and name
+            tokens = (
+                _current_job.set(job_id),
+                current_user.set(claimed[0]["user_id"]),
+                current_endpoint.set(f"job {name}")
+            )
+            try:
+                result = await handler(payload)
+            finally:
+                for var, token in zip((_current_job, current_user, current_endpoint), tokens):
+                    var.reset(token)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+
+            if handler is not None and not isinstance(e, JobFailed) and attempts < self.max_attempts:
+                delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+                delay += random.uniform(0, delay / 4)
+                self.retried += 1
+                print(f"Job {name} {job_id} failed (attempt {attempts}), retrying in {delay:.1f}s: {error}")
+                await self._db_call(
+                    self._sql,
+                    "UPDATE jobs SET status = 'queued', run_at = ?, error = ?, updated_at = ? WHERE id = ?",
+                    time.time() + delay, error, time.time(), job_id
+                )
+            else:
+                self.failed += 1
+                print(f"Job {name} {job_id} failed: {error}")
+                await self._db_call(
+                    self._sql,
+                    "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                    error, time.time(), job_id
+                )
+            return
+
+        self.succeeded += 1
+        await self._db_call(
+            self._sql,
+            "UPDATE jobs SET status = 'succeeded', result = ?, error = NULL, updated_at = ? WHERE id = ?",
+            json.dumps(result, default=str), time.time(), job_id
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get queue counters.
+
+        Returns:
+            Dictionary with the in-memory queue depth and job outcome counts
+        """
+        return {
+            "queued_in_memory": self._queue.qsize(),
+            "workers": self.workers,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "recovered": self.recovered
+        }
+
+
+job_queue = JobQueue(
+    db_path=os.environ.get("JOB_DB_PATH", "jobs.sqlite3"),
+    workers=int(os.environ.get("JOB_WORKERS", "4")),
+    queue_size=int(os.environ.get("JOB_QUEUE_SIZE", "1000")),
+    max_attempts=int(os.environ.get("JOB_MAX_ATTEMPTS", "5")),
+    lease_timeout=float(os.environ.get("JOB_LEASE_TIMEOUT", "60"))
+)
@@ -0,0 +1,270 @@
+import os
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Who and what a model call is made for: set per request by the auth dependency,
+# and per job by the job queue
+current_user: ContextVar[Optional[str]] = ContextVar("metrics_user", default=None)
+current_endpoint: ContextVar[str] = ContextVar("metrics_endpoint", default="other")
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PROMPT_TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+
+@dataclass
+class ModelCall:
+    """One model call, or one answer served from the insight cache instead."""
+    model: str
+    operation: str
+    user: Optional[str] = None
+    endpoint: str = "other"
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    seconds: float = 0.0
+    # "exact" or "semantic" when the insight cache answered instead of the model
+    cache: Optional[str] = None
+    error: Optional[str] = None
+
+    def usage(self, usage: Any) -> None:
+        """Take the token counts from an API response's usage, if it has one."""
+        if usage is not None:
+            self.prompt_tokens = usage.prompt_tokens or 0
+            self.completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+@dataclass
+class _Totals:
+    calls: int = 0
+    cache_hits: int = 0
+    errors: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def add(self, call: ModelCall) -> None:
+        self.calls += 1
+        self.cache_hits += call.cache is not None
+        self.errors += call.error is not None
+        self.prompt_tokens += call.prompt_tokens
+        self.completion_tokens += call.completion_tokens
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: Any) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class ModelMetrics:
+    """
+    Token and latency accounting for model calls.
+
+    Every call is aggregated per model, operation and endpoint, and per user.
+    The aggregates are exported in the Prometheus text format by /metrics; the
+    per-user totals are only reported by stats(), for /stats.
+    """
+
+    def __init__(self, max_users: int = 10000):
+        """
+        Initialize the metrics.
+
+        Args:
+            max_users: Number of users whose totals are kept; the least recently active are dropped
+        """
+        self.max_users = max_users
+
+        # Keyed by (model, operation, endpoint)
+        self._totals: Dict[Tuple[str, str, str], _Totals] = {}
+        self._latency: Dict[Tuple[str, str, str], _Histogram] = {}
+        self._prompt_tokens: Dict[Tuple[str, str, str], _Histogram] = {}
+        self._errors: Dict[Tuple[str, str, str, str], int] = {}
+        self._users: "OrderedDict[str, _Totals]" = OrderedDict()
+        self._listeners: List[Callable[[ModelCall], None]] = []
+
+    def subscribe(self, listener: Callable[[ModelCall], None]) -> None:
+        """
+        Call a function with every recorded call, e.g. to count usage against a quota.
+
+        Args:
+            listener: Called with each call once it is recorded; must not block
+        """
+        self._listeners.append(listener)
+
+    def record(self, call: ModelCall) -> None:
+        """
+        Add a call to the aggregates.
+
+        Args:
+            call: The finished call
+        """
+        key = (call.model, call.operation, call.endpoint)
+        self._totals.setdefault(key, _Totals()).add(call)
+
+        if call.cache is None:
+            self._latency.setdefault(key, _Histogram(LATENCY_BUCKETS)).observe(call.seconds)
+            if call.error is None:
+                self._prompt_tokens.setdefault(key, _Histogram(PROMPT_TOKEN_BUCKETS)).observe(call.prompt_tokens)
+
+        if call.error is not None:
+            error_key = key + (call.error,)
+            self._errors[error_key] = self._errors.get(error_key, 0) + 1
+
+        if call.user:
+            totals = self._users.pop(call.user, None) or _Totals()
+            totals.add(call)
+            self._users[call.user] = totals
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+        for listener in self._listeners:
+            try:
+                listener(call)
+            except Exception as e:
+                print(f"Metrics listener error: {str(e)}")
+
+    @contextmanager
+    def track(self, model: str, operation: str) -> Iterator[ModelCall]:
+        """
+        Time a model call and record it, attributed to the current user and endpoint.
+
+        The caller reports the response's token usage with call.usage().
+
+        Args:
+            model: The model called
+            operation: What the call does, e.g. "chat" or "embedding"
+
+        Yields:
+            The call's record
+        """
+        call = ModelCall(model=model, operation=operation, user=current_user.get(), endpoint=current_endpoint.get())
+        started = time.perf_counter()
+        try:
+            yield call
+        except BaseException as e:
+            call.error = type(e).__name__
+            raise
+        finally:
+            call.seconds = time.perf_counter() - started
+            self.record(call)
+
+    def record_cache_hit(self, model: str, tier: str) -> None:
+        """
+        Record an insight answered from the cache, which cost no tokens.
+
+        Args:
+            model: The model that would have been called
+            tier: The cache tier that answered, "exact" or "semantic"
+        """
+        self.record(ModelCall(
+            model=model,
+            operation="insight",
+            user=current_user.get(),
+            endpoint=current_endpoint.get(),
+            cache=tier
+        ))
+
+    def _histogram_lines(self, name: str, histograms: Dict[Tuple[str, str, str], _Histogram]) -> List[str]:
+        lines = []
+        for (model, operation, endpoint), histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{name}_bucket{_labels(model=model, operation=operation, endpoint=endpoint, le=le)} {cumulative}")
+            labels = _labels(model=model, operation=operation, endpoint=endpoint)
+            lines.append(f"{name}_sum{labels} {histogram.sum}")
+            lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+    def prometheus(self) -> str:
+        """
+        Export the aggregates in the Prometheus text format.
+
+        Returns:
+            The exposition text
+        """
+        lines = [
+            "# HELP bonsaiway_model_calls_total Model calls, including insights answered from the cache",
+            "# TYPE bonsaiway_model_calls_total counter"
+        ]
+        for (model, operation, endpoint), totals in sorted(self._totals.items()):
+            labels = dict(model=model, operation=operation, endpoint=endpoint)
+            lines.append(f"bonsaiway_model_calls_total{_labels(**labels, cached='false')} {totals.calls - totals.cache_hits}")
+            if totals.cache_hits:
+                lines.append(f"bonsaiway_model_calls_total{_labels(**labels, cached='true')} {totals.cache_hits}")
+
+        lines += [
+            "# HELP bonsaiway_model_errors_total Failed model calls by error class",
+            "# TYPE bonsaiway_model_errors_total counter"
+        ]
+        for (model, operation, endpoint, error), count in sorted(self._errors.items()):
+            lines.append(f"bonsaiway_model_errors_total{_labels(model=model, operation=operation, endpoint=endpoint, error=error)} {count}")
+
+        lines += [
+            "# HELP bonsaiway_model_tokens_total Tokens used by model calls",
+            "# TYPE bonsaiway_model_tokens_total counter"
+        ]
+        for (model, operation, endpoint), totals in sorted(self._totals.items()):
+            labels = dict(model=model, operation=operation, endpoint=endpoint)
+            lines.append(f"bonsaiway_model_tokens_total{_labels(**labels, kind='prompt')} {totals.prompt_tokens}")
+            lines.append(f"bonsaiway_model_tokens_total{_labels(**labels, kind='completion')} {totals.completion_tokens}")
+
+        lines += [
+            "# HELP bonsaiway_model_call_seconds Model call latency",
+            "# TYPE bonsaiway_model_call_seconds histogram"
+        ]
+        lines += self._histogram_lines("bonsaiway_model_call_seconds", self._latency)
+
+        lines += [
+            "# HELP bonsaiway_model_prompt_tokens Prompt size of successful model calls",
+            "# TYPE bonsaiway_model_prompt_tokens histogram"
+        ]
+        lines += self._histogram_lines("bonsaiway_model_prompt_tokens", self._prompt_tokens)
+
+        return "\n".join(lines) + "\n"
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the per-user totals.
+
+        Returns:
+            Dictionary with each tracked user's model calls and tokens, most recently active last
+        """
+        return {
+            "tracked_users": len(self._users),
+            "users": {
+                user: {
+                    "calls": totals.calls,
+                    "prompt_tokens": totals.prompt_tokens,
+                    "completion_tokens": totals.completion_tokens
+                }
+                for user, totals in self._users.items()
+            }
+        }
+
+
+model_metrics = ModelMetrics(
+    max_users=int(os.environ.get("METRICS_MAX_USERS", "10000"))
+)
@@ -1,16 +1,71 @@
 import os
-import openai
-from typing import List, Dict, Any, Optional
+import asyncio
+import functools
+import hashlib
+import json
+import time
+import math
+import httpx
+from contextlib import AsyncExitStack
+from openai import AsyncOpenAI
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Any, Optional, Set, Tuple
 from dotenv import load_dotenv
 from fastapi import HTTPException, status
+from .broadcast import Broadcast
+from .conversation import ConversationHistory, Turn
+from .insight_cache import insight_cache
+from .metrics import model_metrics
+from .resilience import CircuitOpenError, DeadlineExceededError, is_retryable, resilient_caller
+from .vision import vision_images
 
 # Load environment variables
 load_dotenv()
 
-# Set OpenAI API key
 openai_api_key = os.environ.get("OPENAI_API_KEY")
-if openai_api_key:
-    openai.api_key = openai_api_key
+
+# Seconds a single model call may take before it is abandoned
+openai_timeout = float(os.environ.get("OPENAI_TIMEOUT", "60"))
+
+# Maximum model calls in flight per worker process; further calls wait for a slot
+openai_max_concurrency = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "8"))
+
+# One pooled HTTP session shared by every call, so connections to the API are reused
+http_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(openai_timeout, connect=5.0),
+    limits=httpx.Limits(
+        max_connections=openai_max_concurrency,
+        max_keepalive_connections=openai_max_concurrency,
+        keepalive_expiry=60.0
+    )
+)
+
+_call_slots = asyncio.Semaphore(openai_max_concurrency)
+
+# Collection care schedules: bonsais per completion, and completions run at a time
+care_schedule_batch_size = int(os.environ.get("CARE_SCHEDULE_BATCH_SIZE", "4"))
+care_schedule_parallelism = int(os.environ.get("CARE_SCHEDULE_PARALLELISM", "3"))
+
+INSIGHT_SYSTEM_PROMPT = "You are a master gardener with specialized skills in making bonsais and the philosophy behind creating bonsais. You are like a 95-year old bonsai master who has been developing 100s of bonsais for the past 40 years. Your bonsais are at the level of a major bondai museum display. You provide helpful, accurate advice about bonsai care, styling, and maintenance. Your responses must be accurate informative, practical, and tailored to the specific bonsai being discussed. With each bonsai, there will be a picture and if the tree name is missing, identify the tree name first."
+
+CARE_SCHEDULE_SYSTEM_PROMPT = "You are a bonsai expert assistant. Create a detailed care schedule for the bonsai, including watering, fertilizing, pruning, and seasonal care."
+
+# Bump when the care schedule prompts change, so stored schedules are regenerated
+CARE_SCHEDULE_PROMPT_VERSION = "1"
+
+# Older insights are summarised by a cheaper model, in at most this many tokens
+conversation_summary_model = os.environ.get("CONVERSATION_SUMMARY_MODEL", "gpt-4o-mini")
+CONVERSATION_SUMMARY_MAX_TOKENS = 400
+
+CONVERSATION_SUMMARY_PROMPT = "You maintain a running summary of a conversation between a bonsai owner and a bonsai expert about one tree. Update the summary with the new questions and answers. Keep the facts about the tree, its problems, the advice given and what the owner said they did; drop pleasantries and repetition. Write at most 250 words."
+
+# Completion parameters for insights, whether streamed or not
+INSIGHT_OPTIONS = {
+    "max_tokens": 1000,
+    "temperature": 0.7,  # Balanced between creativity and accuracy
+    "top_p": 0.9,
+    "frequency_penalty": 0.0,
+    "presence_penalty": 0.6  # Encourage variety in responses
+}
 
 
 class OpenAIService:
@@ -22,12 +77,284 @@ class OpenAIService:
             raise ValueError("OpenAI API key not configured")
         
         self.model = "gpt-4o"  # Default model, can be configured
+        # Retries are made by the resilience layer, which also enforces deadlines and circuit breakers
+        self.client = AsyncOpenAI(api_key=openai_api_key, http_client=http_client, max_retries=0)
+        
+        # Completions in progress, shared by concurrent identical requests
+        self._in_flight: Dict[str, "asyncio.Task[str]"] = {}
+        self._streams_in_flight: Dict[str, Broadcast[str]] = {}
+        self._stream_producers: Set["asyncio.Task[None]"] = set()
+        self.coalesced_calls = 0
+    
+    def _http_error(self, error: Exception, message: str) -> HTTPException:
+        """Map a failed model call to an HTTP error: 504 on timeout, 503 while the provider is down, else 500."""
+        if isinstance(error, HTTPException):
+            return error
+        if isinstance(error, CircuitOpenError):
+            return HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="The AI service is temporarily unavailable, please try again shortly",
+                headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))}
+            )
+        if isinstance(error, (DeadlineExceededError, asyncio.TimeoutError)):
+            return HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail=f"{message}: the AI service took too long to respond"
+            )
+        if is_retryable(error):
+            # Still failing after every retry and the fallback model
+            return HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="The AI service is temporarily unavailable, please try again shortly"
+            )
+        return HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"{message}: {str(error)}"
+        )
+    
+    async def _chat(
+        self,
+        messages: List[Dict[str, Any]],
+        max_tokens: int,
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+        operation: str = "chat",
+        **options: Any
+    ) -> str:
+        """
+        Run a chat completion without blocking the event loop.
+        
+        Each attempt waits for one of the OPENAI_MAX_CONCURRENCY slots before
+        being sent, and is recorded in the model metrics once it finishes.
+        Failures are retried, and may fall back to OPENAI_FALLBACK_MODEL.
+        
+        Args:
+            messages: The chat messages
+            max_tokens: Maximum tokens in the completion
+            model: Model to use, defaults to self.model
+            timeout: Seconds before an attempt is abandoned, defaults to OPENAI_TIMEOUT
+            operation: What the call is for, in the metrics
+            **options: Other completion parameters, e.g. temperature
+            
+        Returns:
+            The completion's text
+        """
+        async def attempt(candidate: str, attempt_timeout: float) -> str:
+            async with _call_slots:
+                with model_metrics.track(candidate, operation) as call:
+                    response = await self.client.chat.completions.create(
+                        model=candidate,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        timeout=attempt_timeout,
+                        **options
+                    )
+                    call.usage(response.usage)
+            
+            return response.choices[0].message.content
+        
+        return await resilient_caller.call(model or self.model, attempt, timeout or openai_timeout)
+    
+    async def _chat_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        max_tokens: int,
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+        operation: str = "chat",
+        **options: Any
+    ) -> AsyncIterator[str]:
+        """
+        Run a chat completion, yielding its text as the model produces it.
+        
+        Each attempt to open the stream waits for one of the OPENAI_MAX_CONCURRENCY
+        slots, and the successful one holds it until the stream ends. Opening the
+        stream is retried and may fall back to OPENAI_FALLBACK_MODEL; once text has
+        been yielded, a failure ends the stream.
+        
+        Args:
+            messages: The chat messages
+            max_tokens: Maximum tokens in the completion
+            model: Model to use, defaults to self.model
+            timeout: Seconds to wait for each chunk, defaults to OPENAI_TIMEOUT
+            operation: What the call is for, in the metrics
+            **options: Other completion parameters, e.g. temperature
+            
+        Yields:
+            Pieces of the completion's text
+        """
+        async def attempt(candidate: str, attempt_timeout: float) -> Tuple[AsyncExitStack, Any, Any]:
+            # The slot and the metrics record stay held until a successful stream ends,
+            # and are let go as soon as an attempt fails, not after its backoff
+            held = AsyncExitStack()
+            await held.enter_async_context(_call_slots)
+            try:
+                call = held.enter_context(model_metrics.track(candidate, operation))
+                stream = await self.client.chat.completions.create(
+                    model=candidate,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    timeout=attempt_timeout,
+                    stream=True,
+                    # The last chunk then carries the token counts
+                    stream_options={"include_usage": True},
+                    **options
+                )
+            except BaseException as e:
+                await held.__aexit__(type(e), e, e.__traceback__)
+                raise
+            return held, call, stream
+        
+        held, call, stream = await resilient_caller.call(model or self.model, attempt, timeout or openai_timeout)
+        
+        async with held:
+            async with stream:
+                async for chunk in stream:
+                    if chunk.usage:
+                        call.usage(chunk.usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+    
+    async def _single_flight(self, key: str, call: Callable[[], Awaitable[str]]) -> str:
+        """
+        Run a call once for every concurrent caller with the same key.
+        
+        The call runs in its own task, so one caller going away doesn't cancel
+        it for the others.
+        
+        Args:
+            key: Identifies identical calls
+            call: Starts the call
+            
+        Returns:
+            The call's result
+        """
+        flight = self._in_flight.get(key)
+        
+        if flight is None:
+            flight = asyncio.ensure_future(call())
+            self._in_flight[key] = flight
+            flight.add_done_callback(functools.partial(self._land, key))
+        else:
+            self.coalesced_calls += 1
+        
+        return await asyncio.shield(flight)
+    
+    def _land(self, key: str, flight: "asyncio.Task[str]") -> None:
+        if self._in_flight.get(key) is flight:
+            del self._in_flight[key]
+        # Mark the error as retrieved even if every caller went away
+        if not flight.cancelled():
+            flight.exception()
+    
+    async def _embed(self, text: str) -> Optional[List[float]]:
+        """Embed text for the insight cache's semantic tier, or return None on failure."""
+        try:
+            async def attempt(candidate: str, attempt_timeout: float) -> List[float]:
+                async with _call_slots:
+                    with model_metrics.track(candidate, "embedding") as call:
+                        response = await self.client.embeddings.create(
+                            model=candidate,
+                            input=text,
+                            timeout=attempt_timeout
+                        )
+                        call.usage(response.usage)
+                return response.data[0].embedding
+            
+            # A cache lookup isn't worth waiting long for, or answering with another model's vectors
+            return await resilient_caller.call(
+                insight_cache.embedding_model,
+                attempt,
+                timeout=10.0,
+                deadline=10.0,
+                fallback=False
+            )
+        except Exception as e:
+            print(f"Embedding error: {str(e)}")
+            return None
+    
+    async def _cached_insight(
+        self,
+        context: str,
+        question: str,
+        bonsai_id: Optional[str]
+    ) -> Tuple[Optional[str], Optional[List[float]]]:
+        """
+        Look up a question in the insight cache, exact match first, then by similarity.
+        
+        Args:
+            context: The prompt context built for the bonsai
+            question: The user's question
+            bonsai_id: The bonsai the question is about
+            
+        Returns:
+            The cached answer (None on a miss) and the question's embedding, if one was computed
+        """
+        answer = insight_cache.get(context, question, bonsai_id)
+        if answer is not None:
+            model_metrics.record_cache_hit(self.model, "exact")
+            return answer, None
+        
+        embedding = None
+        if insight_cache.semantic_enabled:
+            embedding = await self._embed(question)
+            if embedding is not None:
+                answer = insight_cache.get_similar(context, embedding, bonsai_id)
+                if answer is not None:
+                    model_metrics.record_cache_hit(self.model, "semantic")
+                    return answer, embedding
+        
+        insight_cache.record_miss()
+        return None, embedding
+    
+    def _insight_messages(
+        self,
+        question: str,
+        context: str,
+        history: Optional[ConversationHistory] = None,
+        attachments: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Build the chat messages for a bonsai care question, after the earlier conversation."""
+        content: Any = f"{context}\nUser question: {question}"
+        if attachments:
+            content = [
+                {
+                    "type": "text",
+                    "text": f"{context}The {len(attachments)} most recent photos of this bonsai are attached.\nUser question: {question}"
+                },
+                *attachments
+            ]
+        
+        return [
+            {
+                "role": "system", 
+                "content": INSIGHT_SYSTEM_PROMPT
+            },
+            *(history.messages() if history else []),
+            {
+                "role": "user", 
+                "content": content
+            }
+        ]
+    
+    def _cache_context(
+        self,
+        context: str,
+        history: Optional[ConversationHistory],
+        images: List[Dict[str, Any]]
+    ) -> str:
+        """The context answers are cached under: the same question in another conversation, or about other photos, is a miss."""
+        transcript = history.transcript() if history else ""
+        if images:
+            context += "Photos: " + ",".join(str(image.get("id") or image["image_url"]) for image in images) + "\n"
+        return f"{context}\n{transcript}" if transcript else context
     
     async def generate_bonsai_insight(
         self, 
         question: str, 
         bonsai_data: Dict[str, Any], 
-        image_urls: Optional[List[str]] = None
+        image_urls: Optional[List[str]] = None,
+        history: Optional[ConversationHistory] = None
     ) -> str:
         """
         Generate an AI insight for a bonsai care question.
@@ -36,6 +363,7 @@ class OpenAIService:
             question: The user's question about bonsai care
             bonsai_data: Dictionary containing bonsai details (title, description, etc.)
             image_urls: Optional list of image URLs for the bonsai
+            history: Earlier questions and answers about the bonsai
             
         Returns:
             The AI-generated response
@@ -46,41 +374,175 @@ class OpenAIService:
         try:
             # Prepare context for AI
             context = self._build_context(bonsai_data, image_urls)
+            bonsai_id = str(bonsai_data["id"]) if bonsai_data.get("id") else None
+            images = vision_images.select(bonsai_data.get("images") or [])
             
-            # Generate AI response
-            response = openai.ChatCompletion.create(
-                model=self.model,
+            # Double submits and retries that arrive while the first is running share its answer
+            key = f"{bonsai_id}:{insight_cache.entry_key(self._cache_context(context, history, images), question)}"
+            return await self._single_flight(key, lambda: self._answer(question, context, bonsai_id, history, images))
+        except Exception as e:
+            raise self._http_error(e, "Error generating AI insight")
+    
+    async def _answer(
+        self,
+        question: str,
+        context: str,
+        bonsai_id: Optional[str],
+        history: Optional[ConversationHistory],
+        images: List[Dict[str, Any]]
+    ) -> str:
+        """Answer a question from the insight cache, or with a completion that is then cached."""
+        cache_context = self._cache_context(context, history, images)
+        
+        # Near-identical questions about the same tree reuse an earlier answer
+        cached, embedding = await self._cached_insight(cache_context, question, bonsai_id)
+        if cached is not None:
+            return cached
+        
+        # Generate AI response, with the photos downsized for the model
+        started = time.perf_counter()
+        attachments = await vision_images.payloads(images)
+        answer = await self._chat(
+            self._insight_messages(question, context, history, attachments),
+            operation="insight",
+            **INSIGHT_OPTIONS
+        )
+        
+        insight_cache.put(cache_context, question, answer, time.perf_counter() - started, bonsai_id, embedding)
+        return answer
+    
+    async def stream_bonsai_insight(
+        self,
+        question: str,
+        bonsai_data: Dict[str, Any],
+        image_urls: Optional[List[str]] = None,
+        history: Optional[ConversationHistory] = None
+    ) -> AsyncIterator[str]:
+        """
+        Generate an AI insight for a bonsai care question, yielding it as it is written.
+        
+        Args:
+            question: The user's question about bonsai care
+            bonsai_data: Dictionary containing bonsai details (title, description, etc.)
+            image_urls: Optional list of image URLs for the bonsai
+            history: Earlier questions and answers about the bonsai
+            
+        Yields:
+            Pieces of the AI-generated response
+        
+        Raises:
+            HTTPException: If there's an error generating the insight
+        """
+        try:
+            context = self._build_context(bonsai_data, image_urls)
+            bonsai_id = str(bonsai_data["id"]) if bonsai_data.get("id") else None
+            images = vision_images.select(bonsai_data.get("images") or [])
+            
+            # Streams of the same question that arrive while the first is running follow
+            # its completion from the start, instead of each starting their own
+            key = f"{bonsai_id}:{insight_cache.entry_key(self._cache_context(context, history, images), question)}"
+            stream = self._streams_in_flight.get(key)
+            
+            if stream is None:
+                stream = Broadcast()
+                self._streams_in_flight[key] = stream
+                # Runs in its own task, so one caller going away doesn't end it for the others
+                producer = asyncio.ensure_future(
+                    self._stream_answer(key, stream, question, context, bonsai_id, history, images)
+                )
+                self._stream_producers.add(producer)
+                producer.add_done_callback(self._stream_producers.discard)
+            else:
+                self.coalesced_calls += 1
+            
+            async for text in stream.subscribe():
+                yield text
+        except Exception as e:
+            raise self._http_error(e, "Error generating AI insight")
+    
+    async def _stream_answer(
+        self,
+        key: str,
+        stream: Broadcast[str],
+        question: str,
+        context: str,
+        bonsai_id: Optional[str],
+        history: Optional[ConversationHistory],
+        images: List[Dict[str, Any]]
+    ) -> None:
+        """Publish an answer from the insight cache, or a streamed completion that is then cached."""
+        try:
+            cache_context = self._cache_context(context, history, images)
+            
+            cached, embedding = await self._cached_insight(cache_context, question, bonsai_id)
+            if cached is not None:
+                stream.publish(cached)
+                return
+            
+            started = time.perf_counter()
+            attachments = await vision_images.payloads(images)
+            messages = self._insight_messages(question, context, history, attachments)
+            async for text in self._chat_stream(messages, operation="insight", **INSIGHT_OPTIONS):
+                stream.publish(text)
+            
+            # Only a complete answer is cached
+            insight_cache.put(cache_context, question, "".join(stream.items), time.perf_counter() - started, bonsai_id, embedding)
+        except asyncio.CancelledError:
+            stream.close(RuntimeError("The answer was interrupted"))
+            raise
+        except Exception as e:
+            stream.close(e)
+        finally:
+            stream.close()
+            if self._streams_in_flight.get(key) is stream:
+                del self._streams_in_flight[key]
+    
+    async def summarize_conversation(self, summary: Optional[str], turns: List[Turn]) -> str:
+        """
+        Extend the rolling summary of a bonsai's conversation with more questions and answers.
+        
+        Args:
+            summary: The summary so far, or None for the first one
+            turns: The questions and answers to add, oldest first
+            
+        Returns:
+            The updated summary
+            
+        Raises:
+            HTTPException: If there's an error generating the summary
+        """
+        try:
+            transcript = "\n\n".join(f"Owner: {question}\nExpert: {answer}" for question, answer in turns)
+            
+            return await self._chat(
                 messages=[
                     {
-                        "role": "system", 
-                        "content": "You are a master gardener with specialized skills in making bonsais and the philosophy behind creating bonsais. You are like a 95-year old bonsai master who has been developing 100s of bonsais for the past 40 years. Your bonsais are at the level of a major bondai museum display. You provide helpful, accurate advice about bonsai care, styling, and maintenance. Your responses must be accurate informative, practical, and tailored to the specific bonsai being discussed. With each bonsai, there will be a picture and if the tree name is missing, identify the tree name first."
+                        "role": "system",
+                        "content": CONVERSATION_SUMMARY_PROMPT
                     },
                     {
-                        "role": "user", 
-                        "content": f"{context}\nUser question: {question}"
+                        "role": "user",
+                        "content": f"Summary so far: {summary or '(none)'}\n\nNew conversation:\n{transcript}"
                     }
                 ],
-                max_tokens=1000,
-                temperature=0.7,  # Balanced between creativity and accuracy
-                top_p=0.9,
-                frequency_penalty=0.0,
-                presence_penalty=0.6  # Encourage variety in responses
+                max_tokens=CONVERSATION_SUMMARY_MAX_TOKENS,
+                model=conversation_summary_model,
+                operation="conversation_summary",
+                temperature=0.2
             )
-            
-            return response.choices[0].message.content
-            
         except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error generating AI insight: {str(e)}"
-            )
+            raise self._http_error(e, "Error summarizing conversation")
     
-    async def analyze_bonsai_image(self, image_url: str) -> Dict[str, Any]:
+    async def analyze_bonsai_image(self, image_url: str, image: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Analyze a bonsai image and provide insights.
         
+        The image is sent downsized to the model's high-detail resolution rather
+        than at full size.
+        
         Args:
             image_url: URL of the bonsai image to analyze
+            image: The image's bonsai_images row, if known; its variants are downloaded instead of the original
             
         Returns:
             Dictionary with analysis results
@@ -89,9 +551,12 @@ class OpenAIService:
             HTTPException: If there's an error analyzing the image
         """
         try:
+            attachment = await vision_images.payload(image or {"image_url": image_url}, detail="high")
+            if attachment is None:
+                raise ValueError("Image could not be loaded")
+            
             # Generate AI response for image analysis
-            response = openai.ChatCompletion.create(
-                model="gpt-4-vision-preview",  # Vision model for image analysis
+            analysis = await self._chat(
                 messages=[
                     {
                         "role": "system", 
@@ -101,15 +566,14 @@ class OpenAIService:
                         "role": "user", 
                         "content": [
                             {"type": "text", "text": "Please analyze this bonsai image and provide insights:"},
-                            {"type": "image_url", "image_url": {"url": image_url}}
+                            attachment
                         ]
                     }
                 ],
-                max_tokens=1000
+                max_tokens=1000,
+                operation="image_analysis"
             )
             
-            analysis = response.choices[0].message.content
-            
             # Structure the analysis
             return {
                 "analysis": analysis,
@@ -117,10 +581,7 @@ class OpenAIService:
             }
             
         except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error analyzing bonsai image: {str(e)}"
-            )
+            raise self._http_error(e, "Error analyzing bonsai image")
     
     async def generate_care_schedule(self, bonsai_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -140,33 +601,92 @@ class OpenAIService:
             context = self._build_context(bonsai_data)
             
             # Generate AI response
-            response = openai.ChatCompletion.create(
-                model=self.model,
+            schedule = await self._chat(
                 messages=[
                     {
                         "role": "system", 
-                        "content": "You are a bonsai expert assistant. Create a detailed care schedule for the bonsai, including watering, fertilizing, pruning, and seasonal care."
+                        "content": CARE_SCHEDULE_SYSTEM_PROMPT
                     },
                     {
                         "role": "user", 
                         "content": f"{context}\nPlease create a care schedule for this bonsai."
                     }
                 ],
-                max_tokens=1500
+                max_tokens=1500,
+                operation="care_schedule"
             )
             
-            schedule = response.choices[0].message.content
-            
             return {
                 "bonsai_id": bonsai_data.get("id"),
                 "care_schedule": schedule
             }
             
         except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error generating care schedule: {str(e)}"
+            raise self._http_error(e, "Error generating care schedule")
+    
+    async def generate_care_schedules(self, bonsais: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Generate care schedules for several bonsais with a single completion.
+        
+        Args:
+            bonsais: Dictionaries containing bonsai details, each with an "id"
+            
+        Returns:
+            Care schedules keyed by bonsai ID; bonsais the model left out are missing
+            
+        Raises:
+            HTTPException: If there's an error generating the schedules
+        """
+        try:
+            if len(bonsais) == 1:
+                schedule = await self.generate_care_schedule(bonsais[0])
+                return {str(bonsais[0]["id"]): schedule["care_schedule"]}
+            
+            trees = "\n".join(
+                f"Bonsai ID: {bonsai['id']}\n{self._build_context(bonsai)}" for bonsai in bonsais
+            )
+            
+            # The same per-tree budget as single schedules, in one call
+            content = await self._chat(
+                messages=[
+                    {
+                        "role": "system",
+                        "content": CARE_SCHEDULE_SYSTEM_PROMPT + " You will be given several bonsais. Reply with a JSON object mapping each bonsai's ID to its care schedule, as a string."
+                    },
+                    {
+                        "role": "user",
+                        "content": f"{trees}\nPlease create a care schedule for each of these bonsais."
+                    }
+                ],
+                max_tokens=1500 * len(bonsais),
+                timeout=openai_timeout * len(bonsais),
+                operation="care_schedule_batch",
+                response_format={"type": "json_object"}
             )
+            
+            schedules = json.loads(content)
+            return {
+                str(bonsai["id"]): schedules[str(bonsai["id"])]
+                for bonsai in bonsais
+                if isinstance(schedules.get(str(bonsai["id"])), str)
+            }
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise self._http_error(e, "Error generating care schedules")
+    
+    def care_schedule_fingerprint(self, bonsai_data: Dict[str, Any]) -> str:
+        """
+        Fingerprint everything a bonsai's care schedule is generated from.
+        
+        Args:
+            bonsai_data: Dictionary containing bonsai details
+            
+        Returns:
+            A hex digest that changes whenever the schedule should be regenerated
+        """
+        inputs = f"{CARE_SCHEDULE_PROMPT_VERSION}\n{self.model}\n{self._build_context(bonsai_data)}"
+        return hashlib.sha256(inputs.encode()).hexdigest()
     
     def _build_context(
         self, 
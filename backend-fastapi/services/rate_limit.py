@@ -0,0 +1,269 @@
+import os
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Set, Tuple
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from .metrics import ModelCall, model_metrics
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # redis is optional; without it limits are kept per process
+    redis = None
+
+# Load environment variables
+load_dotenv()
+
+
+class RateLimitBackend:
+    """Storage for token buckets and daily usage. Subclasses share it between workers or not."""
+
+    async def take(self, key: str, rate: float, capacity: float) -> float:
+        """
+        Take one token from a bucket.
+
+        Args:
+            key: The bucket's key
+            rate: Tokens added per second
+            capacity: Maximum tokens in the bucket, i.e. the burst size
+
+        Returns:
+            0 if a token was taken, otherwise seconds until one is available
+        """
+        raise NotImplementedError
+
+    async def get_usage(self, key: str) -> int:
+        """Get the usage counted under a key."""
+        raise NotImplementedError
+
+    async def add_usage(self, key: str, amount: int, ttl: int) -> None:
+        """Add to the usage counted under a key, which expires after ttl seconds."""
+        raise NotImplementedError
+
+
+class MemoryBackend(RateLimitBackend):
+    """Limits kept in this process; with several workers each enforces its own share."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # Least recently used first, so the oldest are dropped when over max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float, float, float]]" = OrderedDict()
+        self._usage: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, capacity: float) -> float:
+        now = time.monotonic()
+        tokens, updated, _, _ = self._buckets.get(key, (capacity, now, rate, capacity))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+
+        self._buckets[key] = (tokens, now, rate, capacity)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_keys:
+            self._prune(now)
+        return wait
+
+    def _prune(self, now: float) -> None:
+        # Buckets that have refilled are the same as no bucket
+        full = [
+            key for key, (tokens, updated, rate, capacity) in self._buckets.items()
+            if tokens + (now - updated) * rate >= capacity
+        ]
+        for key in full:
+            del self._buckets[key]
+
+        # With more keys still active than that, the least recently used are forgotten
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+        expired = [key for key, (_, expires_at) in self._usage.items() if expires_at <= time.time()]
+        for key in expired:
+            del self._usage[key]
+
+    async def get_usage(self, key: str) -> int:
+        amount, expires_at = self._usage.get(key, (0, 0.0))
+        return amount if expires_at > time.time() else 0
+
+    async def add_usage(self, key: str, amount: int, ttl: int) -> None:
+        self._usage[key] = (await self.get_usage(key) + amount, time.time() + ttl)
+        self._usage.move_to_end(key)
+        while len(self._usage) > self.max_keys:
+            self._usage.popitem(last=False)
+
+
+# Refill and take from a bucket stored as a hash, atomically
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBackend(RateLimitBackend):
+    """Limits shared by every worker through Redis."""
+
+    def __init__(self, url: str, prefix: str = "bonsaiway:ratelimit:"):
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, rate: float, capacity: float) -> float:
+        wait = await self._take(keys=[self.prefix + key], args=[rate, capacity, time.time()])
+        return float(wait)
+
+    async def get_usage(self, key: str) -> int:
+        return int(await self.client.get(self.prefix + key) or 0)
+
+    async def add_usage(self, key: str, amount: int, ttl: int) -> None:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.incrby(self.prefix + key, amount)
+            pipe.expire(self.prefix + key, ttl)
+            await pipe.execute()
+
+
+class RateLimiter:
+    """
+    Per-user request rate limit and daily token quota for the AI endpoints.
+
+    Requests take a token from the user's bucket, which refills at a steady
+    rate up to a burst size. Tokens used by model calls are counted per user
+    per UTC day, from the model metrics. Both are checked before any model
+    call is made, so rejected requests cost nothing.
+    """
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        requests_per_minute: float = 10.0,
+        burst: int = 5,
+        daily_tokens: int = 200000
+    ):
+        """
+        Initialize the limiter.
+
+        Args:
+            backend: Where buckets and usage are stored
+            requests_per_minute: Sustained AI requests allowed per user; 0 disables the rate limit
+            burst: AI requests a user can make at once after being idle
+            daily_tokens: Model tokens a user can use per UTC day; 0 disables the quota
+        """
+        self.backend = backend
+        self.rate = requests_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.daily_tokens = daily_tokens
+
+        self._pending: Set[asyncio.Task] = set()
+
+        self.rate_limited = 0
+        self.quota_exceeded = 0
+
+        model_metrics.subscribe(self._count_usage)
+
+    @staticmethod
+    def _day() -> Tuple[str, int]:
+        """Today's UTC date and the seconds left in it."""
+        now = datetime.now(timezone.utc)
+        tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return now.strftime("%Y-%m-%d"), math.ceil((tomorrow - now).total_seconds())
+
+    async def check(self, user_id: str) -> None:
+        """
+        Let an AI request through, or reject it.
+
+        Args:
+            user_id: The user making the request
+
+        Raises:
+            HTTPException: 429 with a Retry-After header if the user is over a limit
+        """
+        if self.daily_tokens:
+            day, seconds_left = self._day()
+            if await self.backend.get_usage(f"usage:{user_id}:{day}") >= self.daily_tokens:
+                self.quota_exceeded += 1
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Daily AI usage quota exceeded",
+                    headers={"Retry-After": str(seconds_left)}
+                )
+
+        if self.rate:
+            wait = await self.backend.take(f"bucket:{user_id}", self.rate, self.burst)
+            if wait > 0:
+                self.rate_limited += 1
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many AI requests, please slow down",
+                    headers={"Retry-After": str(math.ceil(wait))}
+                )
+
+    def _count_usage(self, call: ModelCall) -> None:
+        tokens = call.prompt_tokens + call.completion_tokens
+        if not self.daily_tokens or not call.user or not tokens:
+            return
+
+        day, seconds_left = self._day()
+        task = asyncio.ensure_future(self._add_usage(f"usage:{call.user}:{day}", tokens, seconds_left + 3600))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _add_usage(self, key: str, tokens: int, ttl: int) -> None:
+        try:
+            await self.backend.add_usage(key, tokens, ttl)
+        except Exception as e:
+            print(f"Error recording AI usage: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get limiter counters.
+
+        Returns:
+            Dictionary with the limits and the number of rejected requests
+        """
+        return {
+            "backend": type(self.backend).__name__,
+            "requests_per_minute": self.rate * 60,
+            "burst": self.burst,
+            "daily_tokens": self.daily_tokens,
+            "rate_limited": self.rate_limited,
+            "quota_exceeded": self.quota_exceeded
+        }
+
+
+def _create_backend() -> RateLimitBackend:
+    redis_url = os.environ.get("RATE_LIMIT_REDIS_URL")
+    if not redis_url:
+        return MemoryBackend()
+
+    if redis is None:
+        print("RATE_LIMIT_REDIS_URL is set but the redis package is not installed; rate limits are per process")
+        return MemoryBackend()
+
+    return RedisBackend(redis_url)
+
+
+rate_limiter = RateLimiter(
+    _create_backend(),
+    requests_per_minute=float(os.environ.get("AI_RATE_LIMIT_PER_MINUTE", "10")),
+    burst=int(os.environ.get("AI_RATE_LIMIT_BURST", "5")),
+    daily_tokens=int(os.environ.get("AI_DAILY_TOKEN_QUOTA", "200000"))
+)
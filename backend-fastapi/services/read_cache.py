@@ -0,0 +1,292 @@
+import os
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+from dotenv import load_dotenv
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # redis is optional; without it each worker caches on its own
+    redis = None
+
+# Load environment variables
+load_dotenv()
+
+# Returns the value to cache, or None for a row that doesn't exist (which isn't cached)
+Loader = Callable[[], Awaitable[Any]]
+
+
+class CacheBackend:
+    """Storage for cached reads, as JSON text. Subclasses share it between workers or not."""
+
+    async def get(self, key: str) -> Optional[str]:
+        """Get a key's value, or None if it isn't cached or has expired."""
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        """Cache a value under a key for ttl seconds."""
+        raise NotImplementedError
+
+    async def delete(self, *keys: str) -> None:
+        """Drop keys from the cache."""
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """An LRU cache in this process; with several workers each only sees its own writes."""
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCacheBackend(CacheBackend):
+    """A cache shared by every worker through Redis, so a write invalidates it for all of them."""
+
+    def __init__(self, url: str, prefix: str = "bonsaiway:cache:"):
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.client.get(self.prefix + key)
+        return value.decode() if value is not None else None
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self.client.set(self.prefix + key, value, px=int(ttl * 1000))
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.client.delete(*(self.prefix + key for key in keys))
+
+
+class ReadCache:
+    """
+    Read-through cache for bonsai rows, image lists, insight lists and bonsai lists.
+
+    Values are loaded on a miss and cached for a TTL, and every write drops the
+    keys it makes stale. Concurrent misses on a key share one load, and a load
+    that was under way when its key was invalidated is not cached. List keys
+    include a per-user version, so invalidating a user's lists is one write
+    whatever the number of pages and parameter combinations cached.
+
+    Loads are only tracked within this process: with a shared backend, a load
+    that another worker started before the invalidation can still cache the
+    old value, which then lasts until the TTL runs out.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float = 60.0):
+        """
+        Initialize the cache.
+
+        Args:
+            backend: Where cached values are stored
+            ttl: Seconds a value is cached for; bounds staleness from writes made elsewhere
+        """
+        self.backend = backend
+        self.ttl = ttl
+
+        self._loading: Dict[str, "asyncio.Task[Any]"] = {}
+        # Loads in this process whose keys were invalidated while they ran
+        self._stale_loads: Set["asyncio.Task[Any]"] = set()
+
+        # Hits and misses by kind of value, i.e. the key's first segment
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.invalidations = 0
+        self.errors = 0
+
+    @staticmethod
+    def _kind(key: str) -> str:
+        return key.split(":", 1)[0]
+
+    async def get(self, key: str, loader: Loader) -> Any:
+        """
+        Get a value, loading and caching it on a miss.
+
+        A cache that can't be reached is skipped, so reads fall back to the loader.
+
+        Args:
+            key: The value's key, e.g. "bonsai:<id>"
+            loader: Loads the value from the database
+
+        Returns:
+            A copy of the cached or loaded value, which the caller may modify
+        """
+        kind = self._kind(key)
+        try:
+            cached = await self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            print(f"Read cache error: {str(e)}")
+            cached = None
+
+        if cached is not None:
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+            return json.loads(cached)
+
+        self.misses[kind] = self.misses.get(kind, 0) + 1
+
+        loading = self._loading.get(key)
+        if loading is None:
+            loading = asyncio.ensure_future(self._load(key, loader))
+            self._loading[key] = loading
+            loading.add_done_callback(lambda task: self._loaded(key, task))
+
+        value = await asyncio.shield(loading)
+        # Each waiter gets its own copy
+        return json.loads(value) if value is not None else None
+
+    async def _load(self, key: str, loader: Loader) -> Optional[str]:
+        value = await loader()
+        if value is None:
+            return None
+
+        text = json.dumps(value, default=str)
+        if asyncio.current_task() not in self._stale_loads:
+            try:
+                await self.backend.set(key, text, self.ttl)
+            except Exception as e:
+                self.errors += 1
+                print(f"Read cache error: {str(e)}")
+        return text
+
+    def _loaded(self, key: str, task: "asyncio.Task[Any]") -> None:
+        if self._loading.get(key) is task:
+            del self._loading[key]
+        self._stale_loads.discard(task)
+
+    async def invalidate(self, *keys: str) -> None:
+        """
+        Drop keys after a write, so the next read loads them again.
+
+        Args:
+            *keys: The keys the write made stale
+        """
+        self.invalidations += len(keys)
+        for key in keys:
+            # A load under way may have read the old row; it must not be cached
+            loading = self._loading.pop(key, None)
+            if loading is not None:
+                self._stale_loads.add(loading)
+
+        try:
+            await self.backend.delete(*keys)
+        except Exception as e:
+            self.errors += 1
+            print(f"Read cache error: {str(e)}")
+
+    async def list_key(self, user_id: str, *params: Any) -> str:
+        """
+        Get the key for one of a user's bonsai lists.
+
+        Args:
+            user_id: The user's ID
+            *params: The list's parameters, e.g. page size and cursor
+
+        Returns:
+            A key that changes whenever the user's lists are invalidated
+        """
+        version_key = f"list_version:{user_id}"
+        try:
+            version = await self.backend.get(version_key)
+            if version is None:
+                version = uuid.uuid4().hex
+                await self.backend.set(version_key, version, self.ttl * 10)
+        except Exception as e:
+            self.errors += 1
+            print(f"Read cache error: {str(e)}")
+            # A key nothing else uses: the list is loaded and never reused
+            version = uuid.uuid4().hex
+
+        return f"bonsai_list:{user_id}:{version}:" + json.dumps(params, default=str)
+
+    async def invalidate_lists(self, user_id: str) -> None:
+        """
+        Drop every cached bonsai list of a user, after a write to any of their bonsais or images.
+
+        Args:
+            user_id: The user's ID
+        """
+        self.invalidations += 1
+        try:
+            await self.backend.set(f"list_version:{user_id}", uuid.uuid4().hex, self.ttl * 10)
+        except Exception as e:
+            self.errors += 1
+            print(f"Read cache error: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Dictionary with hits, misses and hit rate per kind of value, and invalidations
+        """
+        kinds = {}
+        for kind in sorted(set(self.hits) | set(self.misses)):
+            hits = self.hits.get(kind, 0)
+            misses = self.misses.get(kind, 0)
+            kinds[kind] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0
+            }
+
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend) if isinstance(self.backend, MemoryCacheBackend) else None,
+            "ttl": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "kinds": kinds,
+            "invalidations": self.invalidations,
+            "errors": self.errors
+        }
+
+
+def _create_backend() -> CacheBackend:
+    redis_url = os.environ.get("READ_CACHE_REDIS_URL")
+    max_entries = int(os.environ.get("READ_CACHE_SIZE", "5000"))
+    if not redis_url:
+        return MemoryCacheBackend(max_entries)
+
+    if redis is None:
+        print("READ_CACHE_REDIS_URL is set but the redis package is not installed; reads are cached per process")
+        return MemoryCacheBackend(max_entries)
+
+    return RedisCacheBackend(redis_url)
+
+
+read_cache = ReadCache(
+    _create_backend(),
+    ttl=float(os.environ.get("READ_CACHE_TTL", "60"))
+)
@@ -0,0 +1,275 @@
+import os
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+from dotenv import load_dotenv
+from openai import APIConnectionError, APIStatusError
+
+# Load environment variables
+load_dotenv()
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose circuit breaker is open."""
+
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"Model {model} is unavailable")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a call and its retries run out of time."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed call may succeed if made again: timeouts, connection errors, 408/409/429 and 5xx."""
+    if isinstance(error, (asyncio.TimeoutError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code in (408, 409, 429) or error.status_code >= 500)
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """The delay the provider asked for in a Retry-After header, if any."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class CircuitBreaker:
+    """
+    Fails calls to a model fast while it is down.
+
+    After failure_threshold consecutive retryable failures the circuit opens
+    and calls are rejected without being made. After reset_timeout one trial
+    call is let through: if it succeeds the circuit closes, otherwise it opens
+    again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Initialize the breaker.
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a trial call
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def retry_after(self) -> float:
+        """Seconds until the next trial call is allowed."""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        """Whether a call may be made now; in the half-open state only one trial runs at a time."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        """Close the circuit after a call succeeds."""
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        """Count a retryable failure, opening the circuit at the threshold or when a trial call fails."""
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_running:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    def release(self) -> None:
+        """End a trial call that neither succeeded nor failed in a way that says anything about the model."""
+        self._trial_running = False
+
+
+class ResilientCaller:
+    """
+    Makes model calls with a deadline, retries and circuit breakers, falling back to another model.
+
+    Each attempt gets the time left before the call's deadline. Retryable
+    failures are retried with jittered exponential backoff (or after the
+    provider's Retry-After) while time remains. Each model has its own
+    circuit breaker; when the primary model's circuit is open or its retries
+    are exhausted, the fallback model is tried.
+    """
+
+    def __init__(
+        self,
+        fallback_model: Optional[str] = None,
+        max_attempts: int = 3,
+        retry_base: float = 0.5,
+        retry_max: float = 8.0,
+        deadline: float = 120.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0
+    ):
+        """
+        Initialize the caller.
+
+        Args:
+            fallback_model: Model used when the requested one fails; None disables fallback
+            max_attempts: Attempts per model, including the first
+            retry_base: Delay in seconds before the first retry, doubled for each one after
+            retry_max: Longest delay between retries, in seconds
+            deadline: Default seconds a call may take, including retries and fallback
+            failure_threshold: Consecutive failures that open a model's circuit
+            reset_timeout: Seconds a model's circuit stays open
+        """
+        self.fallback_model = fallback_model
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.deadline = deadline
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+        self.retries = 0
+        self.fallbacks = 0
+        self.rejected = 0
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        """Get a model's circuit breaker."""
+        if model not in self._breakers:
+            self._breakers[model] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self._breakers[model]
+
+    def _models(self, model: str) -> List[str]:
+        if self.fallback_model and self.fallback_model != model:
+            return [model, self.fallback_model]
+        return [model]
+
+    async def call(
+        self,
+        model: str,
+        attempt: Callable[[str, float], Awaitable[T]],
+        timeout: float,
+        deadline: Optional[float] = None,
+        fallback: bool = True
+    ) -> T:
+        """
+        Make a model call.
+
+        Args:
+            model: The model requested
+            attempt: Makes one attempt with the given model and timeout in seconds
+            timeout: Longest a single attempt may take, in seconds
+            deadline: Seconds the whole call may take, defaults to the caller's deadline
+            fallback: Whether the fallback model may be used
+
+        Returns:
+            The first successful attempt's result
+
+        Raises:
+            CircuitOpenError: If every model's circuit is open
+            DeadlineExceededError: If the deadline passed before an attempt succeeded
+            Exception: The last attempt's error, if it wasn't retryable or retries ran out
+        """
+        ends_at = time.monotonic() + max(deadline or self.deadline, timeout)
+        last_error: Optional[BaseException] = None
+        circuit_error: Optional[CircuitOpenError] = None
+
+        models = self._models(model) if fallback else [model]
+
+        for index, candidate in enumerate(models):
+            breaker = self.breaker(candidate)
+            if index > 0:
+                self.fallbacks += 1
+
+            for number in range(1, self.max_attempts + 1):
+                if not breaker.allow():
+                    self.rejected += 1
+                    circuit_error = CircuitOpenError(candidate, breaker.retry_after())
+                    break
+
+                remaining = ends_at - time.monotonic()
+                if remaining <= 0:
+                    breaker.release()
+                    raise DeadlineExceededError("Model call deadline exceeded") from last_error
+
+                try:
+                    result = await asyncio.wait_for(attempt(candidate, min(timeout, remaining)), remaining)
+                except asyncio.CancelledError:
+                    breaker.release()
+                    raise
+                except Exception as e:
+                    last_error = e
+                    if not is_retryable(e):
+                        breaker.release()
+                        raise
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                    return result
+
+                if number < self.max_attempts:
+                    delay = _retry_after(last_error)
+                    if delay is None:
+                        delay = min(self.retry_max, self.retry_base * 2 ** (number - 1))
+                        delay = random.uniform(delay / 2, delay)
+                    if time.monotonic() + delay >= ends_at:
+                        break
+                    self.retries += 1
+                    await asyncio.sleep(delay)
+
+        if last_error is not None:
+            raise last_error
+        raise circuit_error
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get resilience counters.
+
+        Returns:
+            Dictionary with retry, fallback and fail-fast counts, and each model's circuit state
+        """
+        return {
+            "fallback_model": self.fallback_model,
+            "retries": self.retries,
+            "fallbacks": self.fallbacks,
+            "rejected_by_circuit": self.rejected,
+            "circuits": {
+                model: {"state": breaker.state, "times_opened": breaker.times_opened}
+                for model, breaker in self._breakers.items()
+            }
+        }
+
+
+resilient_caller = ResilientCaller(
+    fallback_model=os.environ.get("OPENAI_FALLBACK_MODEL") or None,
+    max_attempts=int(os.environ.get("OPENAI_MAX_ATTEMPTS", "3")),
+    deadline=float(os.environ.get("OPENAI_DEADLINE", "120")),
+    failure_threshold=int(os.environ.get("OPENAI_CIRCUIT_FAILURES", "5")),
+    reset_timeout=float(os.environ.get("OPENAI_CIRCUIT_RESET", "30"))
+)
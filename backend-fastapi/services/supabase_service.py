@@ -1,9 +1,23 @@
 import os
-from typing import Dict, List, Any, Optional, Union
+import asyncio
+import base64
+import functools
+import json
+import tempfile
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Callable, Optional, Union
 from fastapi import HTTPException, status
+from jose import jwt
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import uuid
+from .token_verifier import TokenVerifier
+from .uploads import SpooledUpload
+from .image_processing import VARIANT_FORMATS, generate_variants, variants_enabled
+from .job_queue import JobFailed, job_queue
+from .insight_cache import insight_cache
+from .read_cache import read_cache
 
 # Load environment variables
 load_dotenv()
@@ -17,6 +31,81 @@ if not supabase_url or not supabase_key:
 
 supabase: Client = create_client(supabase_url, supabase_key)
 
+# supabase-py is synchronous, so every call runs on this bounded pool instead of
+# blocking the event loop. Its HTTP clients keep httpx's default pool of 20
+# keep-alive connections (supabase-py has no option to change it), so the pool
+# defaults to 20 threads: with more, connections beyond the 20th would be closed
+# after every call instead of reused.
+supabase_max_workers = int(os.environ.get("SUPABASE_MAX_WORKERS", "20"))
+_executor = ThreadPoolExecutor(max_workers=supabase_max_workers, thread_name_prefix="supabase")
+
+# Local JWT verification, so most requests don't need a GoTrue round trip
+token_verifier = TokenVerifier(
+    jwt_secret=os.environ.get("SUPABASE_JWT_SECRET"),
+    jwks_url=f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json",
+    audience=os.environ.get("SUPABASE_JWT_AUDIENCE", "authenticated"),
+    cache_ttl=float(os.environ.get("AUTH_CACHE_TTL", "300")),
+    cache_size=int(os.environ.get("AUTH_CACHE_SIZE", "10000"))
+)
+
+# Bonsai columns plus their images, embedded through the bonsai_images foreign key
+BONSAI_WITH_IMAGES = "*, images:bonsai_images(*)"
+
+# Columns that can be requested with field projection on paged bonsai lists
+BONSAI_FIELDS = ("id", "user_id", "title", "description", "created_at")
+
+# Maximum operations in one bulk request
+bulk_max_operations = int(os.environ.get("BULK_MAX_OPERATIONS", "500"))
+
+# Updates of a bulk request run at the same time, leaving the rest of the pool to other requests
+bulk_update_concurrency = int(os.environ.get("BULK_UPDATE_CONCURRENCY", "8"))
+
+# IDs per `in` filter, which is sent in the URL, so a large request doesn't exceed URL length limits
+BULK_ID_CHUNK_SIZE = 100
+
+# Files of a multi-file upload streamed to storage at the same time
+upload_concurrency = int(os.environ.get("UPLOAD_CONCURRENCY", "4"))
+
+
+def _storage_path(public_url: str) -> Optional[str]:
+    """Get an object's path in the bonsai-images bucket from its public URL."""
+    marker = "/object/public/bonsai-images/"
+    if marker not in public_url:
+        return None
+    return public_url.split(marker, 1)[1].split("?", 1)[0]
+
+
+def _upload_path(user_id: str, upload: SpooledUpload) -> str:
+    """Get the content-addressed path an upload is stored at, so identical uploads share one object."""
+    file_extension = os.path.splitext(upload.file_name)[1].lower()
+    return f"{user_id}/{upload.sha256}{file_extension}"
+
+
+def _chunks(items: List[Any], size: int = BULK_ID_CHUNK_SIZE) -> List[List[Any]]:
+    """Split a list into consecutive chunks of at most size items."""
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def _encode_cursor(bonsai: Dict[str, Any]) -> str:
+    """Encode the keyset position after a bonsai as an opaque cursor."""
+    position = json.dumps([bonsai["created_at"], bonsai["id"]])
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> List[str]:
+    """
+    Decode a cursor produced by _encode_cursor into [created_at, id].
+
+    Both values go into a PostgREST filter, so they are parsed and written out
+    again rather than passed through; anything else raises ValueError.
+    """
+    padded = cursor + "=" * (-len(cursor) % 4)
+    created_at, bonsai_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(created_at, str) or not isinstance(bonsai_id, str):
+        raise ValueError("Invalid cursor")
+    timestamp = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    return [timestamp.isoformat(), str(uuid.UUID(bonsai_id))]
+
 
 class SupabaseService:
     """Service for interacting with Supabase for BonsaiWay application."""
@@ -24,6 +113,88 @@ class SupabaseService:
     def __init__(self):
         """Initialize the Supabase service."""
         self.client = supabase
+        
+        # Slow storage work runs as background jobs after the response is sent
+        job_queue.register("image.variants", self._generate_variants_job)
+        job_queue.register("storage.remove_image", self._remove_image_job)
+    
+    async def _run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run a blocking supabase-py call on the Supabase thread pool.
+        
+        Args:
+            func: The blocking callable
+            *args: Positional arguments for the callable
+            **kwargs: Keyword arguments for the callable
+            
+        Returns:
+            Whatever the callable returns
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+    
+    async def _execute(self, query: Any) -> Any:
+        """
+        Execute a PostgREST query builder without blocking the event loop.
+        
+        Args:
+            query: A query builder from self.client.table(...)
+            
+        Returns:
+            The PostgREST API response
+        """
+        return await self._run(query.execute)
+    
+    async def _get_bonsai_row(self, bonsai_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a bonsai's row, without its images, through the read cache.
+        
+        Args:
+            bonsai_id: The bonsai's ID
+            
+        Returns:
+            The row, or None if there is no such bonsai
+        """
+        async def load() -> Optional[Dict[str, Any]]:
+            response = await self._execute(self.client.table("bonsais").select("*").eq("id", bonsai_id))
+            return response.data[0] if response.data else None
+        
+        return await read_cache.get(f"bonsai:{bonsai_id}", load)
+    
+    async def _get_bonsai_images(self, bonsai_id: str) -> List[Dict[str, Any]]:
+        """
+        Get a bonsai's images through the read cache.
+        
+        Args:
+            bonsai_id: The bonsai's ID
+            
+        Returns:
+            List of image objects
+        """
+        async def load() -> List[Dict[str, Any]]:
+            response = await self._execute(self.client.table("bonsai_images").select("*").eq("bonsai_id", bonsai_id))
+            return response.data
+        
+        return await read_cache.get(f"images:{bonsai_id}", load)
+    
+    async def _check_bonsai_owner(self, bonsai_id: str, user_id: str) -> None:
+        """
+        Check that a bonsai exists and belongs to the user, from the cached row when there is one.
+        
+        Args:
+            bonsai_id: The bonsai's ID
+            user_id: The user's ID
+            
+        Raises:
+            HTTPException: If the bonsai is not found or doesn't belong to the user
+        """
+        bonsai = await self._get_bonsai_row(bonsai_id)
+        
+        if not bonsai or bonsai["user_id"] != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Bonsai not found"
+            )
     
     async def get_user_id(self, authorization: str = None) -> str:
         """
@@ -53,13 +224,28 @@ class SupabaseService:
                 # Handle raw token format
                 token = authorization
                 
-            # Get user from token
-            response = self.client.auth.get_user(token)
+            user_id = token_verifier.cached_user_id(token)
+            if user_id:
+                return user_id
+            
+            # Verify the token locally, falling back to GoTrue when that isn't possible
+            claims = await self._run(token_verifier.verify, token)
             
-            if not response or not response.user:
-                raise ValueError("Invalid token or user not found")
+            if claims is not None:
+                user_id = claims["sub"]
+                expires_at = claims.get("exp")
+            else:
+                response = await self._run(self.client.auth.get_user, token)
+                
+                if not response or not response.user:
+                    raise ValueError("Invalid token or user not found")
                 
-            return response.user.id
+                token_verifier.remote_verifications += 1
+                user_id = response.user.id
+                expires_at = jwt.get_unverified_claims(token).get("exp")
+            
+            token_verifier.remember(token, user_id, expires_at)
+            return user_id
         except Exception as e:
             print(f"Authentication error: {str(e)}")
             raise HTTPException(
@@ -82,15 +268,106 @@ class SupabaseService:
             HTTPException: If there's an error retrieving bonsais
         """
         try:
-            response = self.client.table("bonsais").select("*").eq("user_id", user_id).execute()
+            async def load() -> List[Dict[str, Any]]:
+                # Embed the images in the same request instead of querying them per bonsai
+                response = await self._execute(self.client.table("bonsais").select(BONSAI_WITH_IMAGES).eq("user_id", user_id))
+                
+                bonsais = response.data
+                for bonsai in bonsais:
+                    bonsai["images"] = bonsai.get("images") or []
+                
+                return bonsais
             
-            bonsais = response.data
-            for bonsai in bonsais:
-                # Get images for each bonsai
-                images_response = self.client.table("bonsai_images").select("*").eq("bonsai_id", bonsai["id"]).execute()
-                bonsai["images"] = images_response.data
+            return await read_cache.get(await read_cache.list_key(user_id, "all"), load)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error retrieving bonsais: {str(e)}"
+            )
+    
+    async def get_bonsais_page(
+        self,
+        user_id: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        images: str = "all"
+    ) -> Dict[str, Any]:
+        """
+        Get one page of a user's bonsais, newest first.
+        
+        Pages are keyset-paginated on (created_at, id), so fetching a page costs
+        the same no matter how deep into the collection it is.
+        
+        Args:
+            user_id: The user's ID
+            limit: Maximum number of bonsais to return
+            cursor: Opaque cursor from a previous page's next_cursor
+            fields: Bonsai columns to return; id and created_at are always included
+            images: "none", "first" (cover image only) or "all"
+            
+        Returns:
+            Dictionary with the page's items and the next_cursor (None on the last page)
+            
+        Raises:
+            HTTPException: If the cursor is invalid or there's an error retrieving bonsais
+        """
+        try:
+            position = _decode_cursor(cursor) if cursor else None
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+        
+        try:
+            # updated_at isn't returned to the client, but versions the page for its ETag
+            columns = [
+                column for column in BONSAI_FIELDS
+                if not fields or column in fields or column in ("id", "created_at")
+            ] + ["updated_at"]
+            select = ",".join(columns)
+            if images != "none":
+                select += ",images:bonsai_images(*)"
+            
+            # Fetch one extra row to learn whether there is another page
+            query = (
+                self.client.table("bonsais")
+                .select(select)
+                .eq("user_id", user_id)
+                .order("created_at", desc=True)
+                .order("id", desc=True)
+                .limit(limit + 1)
+            )
+            
+            if images == "first":
+                # The embed is addressed by its alias, not its table
+                query = query.order("created_at", foreign_table="images").limit(1, foreign_table="images")
+            
+            if position:
+                created_at, last_id = position
+                query = query.or_(
+                    f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{last_id})'
+                )
+            
+            async def load() -> Dict[str, Any]:
+                response = await self._execute(query)
                 
-            return bonsais
+                bonsais = response.data[:limit]
+                if images != "none":
+                    for bonsai in bonsais:
+                        bonsai["images"] = bonsai.get("images") or []
+                
+                next_cursor = _encode_cursor(bonsais[-1]) if len(response.data) > limit else None
+                
+                return {
+                    "items": bonsais,
+                    "next_cursor": next_cursor
+                }
+            
+            return await read_cache.get(await read_cache.list_key(user_id, limit, cursor, columns, images), load)
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -101,6 +378,8 @@ class SupabaseService:
         """
         Get a specific bonsai.
         
+        The row and its images are cached separately, as images change independently.
+        
         Args:
             bonsai_id: The bonsai's ID
             user_id: The user's ID
@@ -112,19 +391,19 @@ class SupabaseService:
             HTTPException: If the bonsai is not found or doesn't belong to the user
         """
         try:
-            response = self.client.table("bonsais").select("*").eq("id", bonsai_id).eq("user_id", user_id).execute()
+            # On a miss both are loaded at once; the images are only returned to the owner
+            bonsai, images = await asyncio.gather(
+                self._get_bonsai_row(bonsai_id),
+                self._get_bonsai_images(bonsai_id)
+            )
             
-            if not response.data:
+            if not bonsai or bonsai["user_id"] != user_id:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Bonsai not found"
                 )
-                
-            bonsai = response.data[0]
             
-            # Get images for the bonsai
-            images_response = self.client.table("bonsai_images").select("*").eq("bonsai_id", bonsai_id).execute()
-            bonsai["images"] = images_response.data
+            bonsai["images"] = images
             
             return bonsai
         except HTTPException:
@@ -156,9 +435,11 @@ class SupabaseService:
                 "description": bonsai_data.get("description")
             }
             
-            response = self.client.table("bonsais").insert(new_bonsai).execute()
+            response = await self._execute(self.client.table("bonsais").insert(new_bonsai))
             
             if response.data:
+                await read_cache.invalidate_lists(user_id)
+                
                 created_bonsai = response.data[0]
                 created_bonsai["images"] = []
                 return created_bonsai
@@ -177,6 +458,9 @@ class SupabaseService:
         """
         Update a bonsai.
         
+        Ownership is enforced by the update's filter, so this is a single round trip
+        plus the bonsai's images when they aren't cached.
+        
         Args:
             bonsai_id: The bonsai's ID
             user_id: The user's ID
@@ -189,30 +473,31 @@ class SupabaseService:
             HTTPException: If the bonsai is not found or there's an error updating it
         """
         try:
-            # Check if bonsai exists and belongs to user
-            await self.get_bonsai(bonsai_id, user_id)
-            
-            # Update bonsai
             update_data = {
                 "title": bonsai_data.get("title"),
                 "description": bonsai_data.get("description")
             }
             
-            response = self.client.table("bonsais").update(update_data).eq("id", bonsai_id).execute()
+            # Only rows belonging to the user match
+            response = await self._execute(
+                self.client.table("bonsais").update(update_data).eq("id", bonsai_id).eq("user_id", user_id)
+            )
             
-            if response.data:
-                updated_bonsai = response.data[0]
-                
-                # Get images for the bonsai
-                images_response = self.client.table("bonsai_images").select("*").eq("bonsai_id", bonsai_id).execute()
-                updated_bonsai["images"] = images_response.data
-                
-                return updated_bonsai
-            else:
+            if not response.data:
                 raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to update bonsai"
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Bonsai not found"
                 )
+            
+            # Cached AI answers were based on the old title and description
+            insight_cache.invalidate_bonsai(bonsai_id)
+            await read_cache.invalidate(f"bonsai:{bonsai_id}")
+            await read_cache.invalidate_lists(user_id)
+            
+            # The images aren't changed by the update, so they usually come from the read cache
+            updated_bonsai = response.data[0]
+            updated_bonsai["images"] = await self._get_bonsai_images(bonsai_id)
+            return updated_bonsai
         except HTTPException:
             raise
         except Exception as e:
@@ -225,6 +510,8 @@ class SupabaseService:
         """
         Delete a bonsai.
         
+        Ownership is enforced by the delete's filter, so this is a single round trip.
+        
         Args:
             bonsai_id: The bonsai's ID
             user_id: The user's ID
@@ -233,11 +520,18 @@ class SupabaseService:
             HTTPException: If the bonsai is not found or there's an error deleting it
         """
         try:
-            # Check if bonsai exists and belongs to user
-            await self.get_bonsai(bonsai_id, user_id)
-            
             # Delete bonsai (cascade will handle related images and insights)
-            self.client.table("bonsais").delete().eq("id", bonsai_id).execute()
+            response = await self._execute(self.client.table("bonsais").delete().eq("id", bonsai_id).eq("user_id", user_id))
+            
+            if not response.data:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Bonsai not found"
+                )
+            
+            insight_cache.invalidate_bonsai(bonsai_id)
+            await read_cache.invalidate(f"bonsai:{bonsai_id}", f"images:{bonsai_id}", f"insights:{bonsai_id}")
+            await read_cache.invalidate_lists(user_id)
         except HTTPException:
             raise
         except Exception as e:
@@ -246,16 +540,300 @@ class SupabaseService:
                 detail=f"Error deleting bonsai: {str(e)}"
             )
     
+    async def bulk_bonsais(self, user_id: str, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Create, update and delete many bonsais at once.
+        
+        Creates run as one multi-row insert and deletes as one multi-row delete per
+        hundred bonsais. Each update is its own statement filtered by owner, as a
+        multi-row upsert could re-insert a bonsai deleted meanwhile; they run at
+        the same time, BULK_UPDATE_CONCURRENCY at once. An operation that fails
+        doesn't stop the others.
+        
+        Args:
+            user_id: The user's ID
+            operations: Dictionaries with an op ("create", "update" or "delete"),
+                the bonsai's id for updates and deletes, and title and description
+                for creates and updates
+            
+        Returns:
+            One result per operation, in order, with its HTTP status and the bonsai or an error
+        """
+        results: List[Dict[str, Any]] = [
+            {"index": index, "op": operation["op"], "status": None, "bonsai": None, "error": None}
+            for index, operation in enumerate(operations)
+        ]
+        
+        def fail(indexes: List[int], code: int, error: str) -> None:
+            for index in indexes:
+                results[index].update(status=code, error=error)
+        
+        # Validated together: a bonsai can only be the subject of one operation per request
+        by_id: Dict[str, List[int]] = {}
+        for index, operation in enumerate(operations):
+            if operation["op"] != "create":
+                by_id.setdefault(str(operation["id"]), []).append(index)
+        for indexes in by_id.values():
+            if len(indexes) > 1:
+                fail(indexes, status.HTTP_409_CONFLICT, "Bonsai appears in more than one operation")
+        
+        def pending(op: str) -> List[int]:
+            return [
+                index for index, operation in enumerate(operations)
+                if operation["op"] == op and results[index]["status"] is None
+            ]
+        
+        creates, updates, deletes = pending("create"), pending("update"), pending("delete")
+        
+        async def create() -> None:
+            rows = [
+                {
+                    "user_id": user_id,
+                    "title": operations[index].get("title"),
+                    "description": operations[index].get("description")
+                }
+                for index in creates
+            ]
+            try:
+                response = await self._execute(self.client.table("bonsais").insert(rows))
+            except Exception as e:
+                fail(creates, status.HTTP_500_INTERNAL_SERVER_ERROR, f"Error creating bonsai: {str(e)}")
+                return
+            
+            # Rows come back in the order they were sent
+            for index, bonsai in zip(creates, response.data):
+                bonsai["images"] = []
+                results[index].update(status=status.HTTP_201_CREATED, bonsai=bonsai)
+        
+        async def update() -> None:
+            slots = asyncio.Semaphore(bulk_update_concurrency)
+            
+            async def update_one(index: int) -> None:
+                operation = operations[index]
+                try:
+                    # Only rows belonging to the user match
+                    async with slots:
+                        response = await self._execute(
+                            self.client.table("bonsais")
+                            .update({"title": operation.get("title"), "description": operation.get("description")})
+                            .eq("id", str(operation["id"]))
+                            .eq("user_id", user_id)
+                        )
+                except Exception as e:
+                    fail([index], status.HTTP_500_INTERNAL_SERVER_ERROR, f"Error updating bonsai: {str(e)}")
+                    return
+                
+                if not response.data:
+                    fail([index], status.HTTP_404_NOT_FOUND, "Bonsai not found")
+                    return
+                results[index].update(status=status.HTTP_200_OK, bonsai=response.data[0])
+            
+            await asyncio.gather(*(update_one(index) for index in updates))
+            
+            updated = {
+                results[index]["bonsai"]["id"]: results[index]["bonsai"]
+                for index in updates if results[index]["status"] == status.HTTP_200_OK
+            }
+            if not updated:
+                return
+            
+            for bonsai_id, bonsai in updated.items():
+                bonsai["images"] = []
+                insight_cache.invalidate_bonsai(bonsai_id)
+            await read_cache.invalidate(*(f"bonsai:{bonsai_id}" for bonsai_id in updated))
+            
+            # The updates don't change images, so they are loaded for every updated bonsai at once
+            try:
+                responses = await asyncio.gather(*(
+                    self._execute(self.client.table("bonsai_images").select("*").in_("bonsai_id", chunk))
+                    for chunk in _chunks(list(updated))
+                ))
+            except Exception as e:
+                # As with a single update, the bonsai was updated but can't be returned
+                for index in updates:
+                    if results[index]["status"] == status.HTTP_200_OK:
+                        results[index].update(
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            bonsai=None,
+                            error=f"Error updating bonsai: {str(e)}"
+                        )
+                return
+            for response in responses:
+                for image in response.data:
+                    updated[image["bonsai_id"]]["images"].append(image)
+        
+        async def delete() -> None:
+            ids = [str(operations[index]["id"]) for index in deletes]
+            deleted = set()
+            
+            async def delete_chunk(chunk: List[str]) -> None:
+                try:
+                    response = await self._execute(
+                        self.client.table("bonsais").delete().in_("id", chunk).eq("user_id", user_id)
+                    )
+                except Exception as e:
+                    fail(
+                        [index for index in deletes if str(operations[index]["id"]) in chunk],
+                        status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        f"Error deleting bonsai: {str(e)}"
+                    )
+                    return
+                deleted.update(row["id"] for row in response.data)
+            
+            await asyncio.gather(*(delete_chunk(chunk) for chunk in _chunks(ids)))
+            
+            for index in deletes:
+                if str(operations[index]["id"]) in deleted:
+                    results[index]["status"] = status.HTTP_204_NO_CONTENT
+                elif results[index]["status"] is None:
+                    fail([index], status.HTTP_404_NOT_FOUND, "Bonsai not found")
+            
+            for bonsai_id in deleted:
+                insight_cache.invalidate_bonsai(bonsai_id)
+            await read_cache.invalidate(*(
+                f"{kind}:{bonsai_id}" for bonsai_id in deleted for kind in ("bonsai", "images", "insights")
+            ))
+        
+        # Each group touches different bonsais, so they run at the same time
+        groups = [run() for run, indexes in ((create, creates), (update, updates), (delete, deletes)) if indexes]
+        await asyncio.gather(*groups)
+        
+        await read_cache.invalidate_lists(user_id)
+        return results
+    
+    async def create_bonsai_with_image(
+        self,
+        user_id: str,
+        bonsai_data: Dict[str, Any],
+        upload: SpooledUpload
+    ) -> Dict[str, Any]:
+        """
+        Create a bonsai together with its first image.
+        
+        The bonsai's ID and the image's URL are known up front, so the storage
+        upload runs at the same time as a single RPC that inserts both rows in
+        one transaction. As with upload_bonsai_image, a photo the user has
+        already stored for another bonsai is not uploaded again. If either
+        fails the other is undone: the rows are deleted, or an object this
+        request uploaded is removed by a background job (unless another image
+        references it), so a failed request leaves nothing behind.
+        
+        Args:
+            user_id: The user's ID
+            bonsai_data: Dictionary with bonsai details
+            upload: The image, spooled to disk by spool_upload
+            
+        Returns:
+            Created bonsai object, with its image
+            
+        Raises:
+            HTTPException: If the bonsai or the image couldn't be saved
+        """
+        bonsai_id = str(uuid.uuid4())
+        storage_path = _upload_path(user_id, upload)
+        bucket = self.client.storage.from_("bonsai-images")
+        
+        async def store() -> bool:
+            # Paths are addressed by content hash under the user's folder, so another
+            # image at this path means the object is already stored. The new bonsai's
+            # own row may be inserted meanwhile, and doesn't count
+            existing_response = await self._execute(
+                self.client.table("bonsai_images")
+                .select("id")
+                .eq("storage_path", storage_path)
+                .neq("bonsai_id", bonsai_id)
+                .limit(1)
+            )
+            if existing_response.data:
+                return False
+            
+            # Overwriting is harmless: an existing object at this path has the same content
+            file_options = {"upsert": "true"}
+            if upload.content_type:
+                file_options["content-type"] = upload.content_type
+            
+            with upload.open() as stream:
+                await self._run(bucket.upload, storage_path, stream, file_options)
+            return True
+        
+        async def insert() -> Dict[str, Any]:
+            response = await self._run(
+                self.client.rpc(
+                    "create_bonsai_with_image",
+                    {
+                        "p_id": bonsai_id,
+                        "p_user_id": user_id,
+                        "p_title": bonsai_data.get("title"),
+                        "p_description": bonsai_data.get("description"),
+                        "p_image_url": bucket.get_public_url(storage_path),
+                        "p_content_hash": upload.sha256,
+                        "p_storage_path": storage_path
+                    }
+                ).execute
+            )
+            return response.data
+        
+        stored, bonsai = await asyncio.gather(store(), insert(), return_exceptions=True)
+        
+        if isinstance(bonsai, BaseException):
+            if stored is True:
+                await job_queue.enqueue(
+                    "storage.remove_image",
+                    {"storage_path": storage_path, "paths": [storage_path]},
+                    user_id=user_id
+                )
+            print(f"Error in create_bonsai_with_image: {str(bonsai)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error creating bonsai: {str(bonsai)}"
+            )
+        
+        if isinstance(stored, BaseException):
+            try:
+                # Deleting the bonsai cascades to its image row
+                await self._execute(self.client.table("bonsais").delete().eq("id", bonsai_id))
+            except Exception as e:
+                print(f"Error removing bonsai {bonsai_id} after a failed upload: {str(e)}")
+            print(f"Error in create_bonsai_with_image: {str(stored)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error uploading image: {str(stored)}"
+            )
+        
+        await read_cache.invalidate_lists(user_id)
+        
+        # An object another image already has variants for shares them; otherwise they are generated
+        if not bonsai["images"][0].get("variants") and variants_enabled:
+            await job_queue.enqueue(
+                "image.variants",
+                {"storage_path": storage_path, "prefix": f"{user_id}/{upload.sha256}", "user_id": user_id},
+                user_id=user_id
+            )
+        
+        return bonsai
+    
     # Bonsai image methods
-    async def upload_bonsai_image(self, bonsai_id: str, user_id: str, file_content: bytes, file_name: str) -> Dict[str, Any]:
+    async def upload_bonsai_image(
+        self,
+        bonsai_id: str,
+        user_id: str,
+        upload: SpooledUpload,
+        bonsai: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """
         Upload an image for a bonsai.
         
+        Objects are stored under the content's SHA-256, so a photo the user has
+        already uploaded is not stored again, and uploading the same photo to the
+        same bonsai again returns the existing image. Resized variants are
+        generated by a background job, so a new image has no variants until it
+        finishes.
+        
         Args:
             bonsai_id: The bonsai's ID
             user_id: The user's ID
-            file_content: The image file content
-            file_name: Original file name
+            upload: The image, spooled to disk by spool_upload
+            bonsai: The bonsai, if already loaded for this user; skips the ownership check
             
         Returns:
             Created image object
@@ -265,38 +843,77 @@ class SupabaseService:
         """
         try:
             # Check if bonsai exists and belongs to user
-            await self.get_bonsai(bonsai_id, user_id)
+            if bonsai is None:
+                await self._check_bonsai_owner(bonsai_id, user_id)
             
-            # For development/demo purposes, if we can't access storage, create a mock image URL
-            # This allows the app to function without proper Supabase storage setup
-            try:
-                # Generate unique filename
-                file_extension = os.path.splitext(file_name)[1]
-                unique_filename = f"{uuid.uuid4()}{file_extension}"
-                storage_path = f"{user_id}/{bonsai_id}/{unique_filename}"
-                
-                # Upload file to Supabase Storage
-                storage_response = self.client.storage.from_("bonsai-images").upload(
-                    storage_path,
-                    file_content
-                )
+            # Objects are addressed by content hash, so identical uploads share one object
+            storage_path = _upload_path(user_id, upload)
+            
+            existing_response = await self._execute(
+                self.client.table("bonsai_images").select("*").eq("storage_path", storage_path)
+            )
+            existing = existing_response.data
+            
+            # A retry of an upload that already succeeded returns the saved image
+            for image in existing:
+                if image["bonsai_id"] == bonsai_id:
+                    return image
+            
+            if existing:
+                # Reuse the stored object and its variants without touching storage
+                public_url = existing[0]["image_url"]
+                variants = existing[0].get("variants")
+            else:
+                variants = None
                 
-                # Get public URL
-                public_url = self.client.storage.from_("bonsai-images").get_public_url(storage_path)
-            except Exception as storage_error:
-                print(f"Storage error: {str(storage_error)}")
-                # Use a placeholder image URL for development
-                public_url = f"https://picsum.photos/seed/{uuid.uuid4()}/800/800"
+                # For development/demo purposes, if we can't access storage, create a mock image URL
+                # This allows the app to function without proper Supabase storage setup
+                try:
+                    # Stream file to Supabase Storage, overwriting any object left by a failed attempt
+                    file_options = {"upsert": "true"}
+                    if upload.content_type:
+                        file_options["content-type"] = upload.content_type
+                    
+                    with upload.open() as stream:
+                        storage_response = await self._run(
+                            self.client.storage.from_("bonsai-images").upload,
+                            storage_path,
+                            stream,
+                            file_options
+                        )
+                    
+                    # Get public URL
+                    public_url = self.client.storage.from_("bonsai-images").get_public_url(storage_path)
+                except Exception as storage_error:
+                    print(f"Storage error: {str(storage_error)}")
+                    # Use a placeholder image URL for development
+                    public_url = f"https://picsum.photos/seed/{uuid.uuid4()}/800/800"
+                    storage_path = None
             
             # Save image reference in database
             image_data = {
                 "bonsai_id": bonsai_id,
-                "image_url": public_url
+                "image_url": public_url,
+                "variants": variants,
+                "content_hash": upload.sha256,
+                "storage_path": storage_path
             }
             
-            image_response = self.client.table("bonsai_images").insert(image_data).execute()
+            image_response = await self._execute(self.client.table("bonsai_images").insert(image_data))
             
             if image_response.data:
+                # Cached AI answers were based on the old set of images
+                insight_cache.invalidate_bonsai(bonsai_id)
+                await read_cache.invalidate(f"images:{bonsai_id}")
+                await read_cache.invalidate_lists(user_id)
+                
+                # The job saves the variants to every image sharing this object
+                if storage_path and not existing and variants_enabled:
+                    await job_queue.enqueue(
+                        "image.variants",
+                        {"storage_path": storage_path, "prefix": f"{user_id}/{upload.sha256}", "user_id": user_id},
+                        user_id=user_id
+                    )
                 return image_response.data[0]
             else:
                 raise HTTPException(
@@ -311,11 +928,263 @@ class SupabaseService:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error uploading image: {str(e)}"
             )
-
+    
+    async def upload_bonsai_images(
+        self,
+        bonsai_id: str,
+        user_id: str,
+        uploads: List[SpooledUpload]
+    ) -> List[Dict[str, Any]]:
+        """
+        Upload several images for a bonsai at once.
+        
+        Ownership is checked once, objects already stored are found with one
+        query and not uploaded again, new objects are streamed to storage
+        UPLOAD_CONCURRENCY at a time, and every new image row is saved with one
+        multi-row insert. As with a single upload, a file that can't be stored
+        is saved with a placeholder image URL instead. A file that fails doesn't
+        stop the others.
+        
+        Args:
+            bonsai_id: The bonsai's ID
+            user_id: The user's ID
+            uploads: The images, spooled to disk by spool_upload
+            
+        Returns:
+            One result per upload, in order, with its HTTP status and the image or an error
+            
+        Raises:
+            HTTPException: If the bonsai is not found or the images can't be looked up
+        """
+        await self._check_bonsai_owner(bonsai_id, user_id)
+        
+        results: List[Dict[str, Any]] = [
+            {"index": index, "file_name": upload.file_name, "status": None, "image": None, "error": None}
+            for index, upload in enumerate(uploads)
+        ]
+        paths = [_upload_path(user_id, upload) for upload in uploads]
+        
+        try:
+            existing_response = await self._execute(
+                self.client.table("bonsai_images").select("*").in_("storage_path", sorted(set(paths)))
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error uploading images: {str(e)}"
+            )
+        
+        # Images of this bonsai, and objects stored for other images, by storage path
+        own: Dict[str, Dict[str, Any]] = {}
+        stored: Dict[str, Dict[str, Any]] = {}
+        for image in existing_response.data:
+            if image["bonsai_id"] == bonsai_id:
+                own[image["storage_path"]] = image
+            stored.setdefault(image["storage_path"], image)
+        
+        # The first file with each new path is saved; repeats of a photo return the same image
+        first: Dict[str, int] = {}
+        for index, path in enumerate(paths):
+            if path in own:
+                results[index].update(status=status.HTTP_200_OK, image=own[path])
+            else:
+                first.setdefault(path, index)
+        
+        bucket = self.client.storage.from_("bonsai-images")
+        slots = asyncio.Semaphore(upload_concurrency)
+        
+        async def store(index: int) -> bool:
+            upload = uploads[index]
+            file_options = {"upsert": "true"}
+            if upload.content_type:
+                file_options["content-type"] = upload.content_type
+            try:
+                async with slots:
+                    with upload.open() as stream:
+                        await self._run(bucket.upload, paths[index], stream, file_options)
+                return True
+            except Exception as e:
+                print(f"Storage error: {str(e)}")
+                return False
+        
+        new_objects = [index for path, index in first.items() if path not in stored]
+        uploaded = await asyncio.gather(*(store(index) for index in new_objects))
+        failed = {index for index, ok in zip(new_objects, uploaded) if not ok}
+        
+        def image_row(index: int) -> Dict[str, Any]:
+            path = paths[index]
+            row = {"bonsai_id": bonsai_id, "content_hash": uploads[index].sha256}
+            if index in failed:
+                # Use a placeholder image URL for development, as a single upload does
+                return {**row, "image_url": f"https://picsum.photos/seed/{uuid.uuid4()}/800/800", "variants": None, "storage_path": None}
+            if path in stored:
+                # Objects stored before keep their URL and variants
+                return {**row, "image_url": stored[path]["image_url"], "variants": stored[path].get("variants"), "storage_path": path}
+            return {**row, "image_url": bucket.get_public_url(path), "variants": None, "storage_path": path}
+        
+        saving = list(first.values())
+        if saving:
+            rows = [image_row(index) for index in saving]
+            
+            try:
+                image_response = await self._execute(self.client.table("bonsai_images").insert(rows))
+            except Exception as e:
+                for index in saving:
+                    results[index].update(
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        error=f"Error saving image: {str(e)}"
+                    )
+                # Objects only this request uploaded are removed, unless another image references them by then
+                for index in new_objects:
+                    if index not in failed:
+                        await job_queue.enqueue(
+                            "storage.remove_image",
+                            {"storage_path": paths[index], "paths": [paths[index]]},
+                            user_id=user_id
+                        )
+            else:
+                # Rows come back in the order they were sent
+                for index, image in zip(saving, image_response.data):
+                    results[index].update(status=status.HTTP_201_CREATED, image=image)
+                
+                # Cached AI answers were based on the old set of images
+                insight_cache.invalidate_bonsai(bonsai_id)
+                await read_cache.invalidate(f"images:{bonsai_id}")
+                await read_cache.invalidate_lists(user_id)
+                
+                if variants_enabled:
+                    for index in new_objects:
+                        if index not in failed:
+                            await job_queue.enqueue(
+                                "image.variants",
+                                {"storage_path": paths[index], "prefix": f"{user_id}/{uploads[index].sha256}", "user_id": user_id},
+                                user_id=user_id
+                            )
+        
+        # Repeats of a photo in the same request share its outcome
+        for index, path in enumerate(paths):
+            if results[index]["status"] is None:
+                source = results[first[path]]
+                results[index].update(status=source["status"], image=source["image"], error=source["error"])
+        
+        return results
+    
+    async def _store_variants(self, source_path: str, prefix: str) -> Optional[Dict[str, Dict[str, str]]]:
+        """
+        Generate an image's resized variants and upload them next to the original.
+        
+        Args:
+            source_path: Path to the original image on disk
+            prefix: Storage path prefix for the variants
+            
+        Returns:
+            Public URLs keyed by variant name, then by format, or None if the image couldn't be decoded
+            
+        Raises:
+            Exception: If a variant can't be uploaded, after removing the ones that were
+        """
+        rendered = await generate_variants(source_path)
+        if not rendered:
+            return None
+        
+        bucket = self.client.storage.from_("bonsai-images")
+        paths = []
+        uploads = []
+        urls: Dict[str, Dict[str, str]] = {}
+        
+        for name, encodings in rendered.items():
+            urls[name] = {}
+            for key, data in encodings.items():
+                _, extension, content_type, _ = VARIANT_FORMATS[key]
+                path = f"{prefix}/{name}.{extension}"
+                paths.append(path)
+                uploads.append(self._run(bucket.upload, path, data, {"content-type": content_type, "upsert": "true"}))
+                urls[name][key] = bucket.get_public_url(path)
+        
+        results = await asyncio.gather(*uploads, return_exceptions=True)
+        failures = [result for result in results if isinstance(result, Exception)]
+        if failures:
+            # Don't leave a partial set behind; the job uploads them all again when it's retried
+            stored = [path for path, result in zip(paths, results) if not isinstance(result, Exception)]
+            if stored:
+                try:
+                    await self._run(bucket.remove, stored)
+                except Exception as e:
+                    print(f"Error removing partially stored variants: {str(e)}")
+            raise failures[0]
+        
+        return urls
+    
+    async def _generate_variants_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Background job: generate an uploaded image's variants from the stored original.
+        
+        Args:
+            payload: The original's storage_path and the prefix to store the variants under
+            
+        Returns:
+            Number of images the variants were saved to
+        """
+        storage_path = payload["storage_path"]
+        
+        # Nothing to do if every image using the object was deleted in the meantime
+        references = await self._execute(
+            self.client.table("bonsai_images").select("id").eq("storage_path", storage_path).limit(1)
+        )
+        if not references.data:
+            return {"images_updated": 0}
+        
+        data = await self._run(self.client.storage.from_("bonsai-images").download, storage_path)
+        
+        with tempfile.NamedTemporaryFile(prefix="bonsai-variants-", suffix=os.path.splitext(storage_path)[1]) as source:
+            await self._run(source.write, data)
+            source.flush()
+            variants = await self._store_variants(source.name, payload["prefix"])
+        
+        if variants is None:
+            raise JobFailed("Image could not be decoded")
+        
+        response = await self._execute(
+            self.client.table("bonsai_images").update({"variants": variants}).eq("storage_path", storage_path)
+        )
+        
+        await read_cache.invalidate(*{f"images:{image['bonsai_id']}" for image in response.data})
+        # Jobs queued before the payload carried the user have their lists expire instead
+        if payload.get("user_id"):
+            await read_cache.invalidate_lists(payload["user_id"])
+        
+        return {"images_updated": len(response.data)}
+    
+    async def _remove_image_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Background job: remove a deleted image's original and variants from storage.
+        
+        Content-addressed objects may be shared, so they are kept while another
+        image still references them.
+        
+        Args:
+            payload: The image's storage_path (if content-addressed) and the object paths to remove
+            
+        Returns:
+            Number of objects removed
+        """
+        if payload.get("storage_path"):
+            references = await self._execute(
+                self.client.table("bonsai_images").select("id").eq("storage_path", payload["storage_path"]).limit(1)
+            )
+            if references.data:
+                return {"removed": 0}
+        
+        await self._run(self.client.storage.from_("bonsai-images").remove, payload["paths"])
+        return {"removed": len(payload["paths"])}
+    
     async def delete_bonsai_image(self, bonsai_id: str, image_id: str, user_id: str) -> None:
         """
         Delete a bonsai image.
         
+        The stored objects are removed by a background job, and only once no
+        other image references them.
+        
         Args:
             bonsai_id: The bonsai's ID
             image_id: The image's ID
@@ -325,11 +1194,10 @@ class SupabaseService:
             HTTPException: If the image is not found or there's an error deleting it
         """
         try:
-            # Check if bonsai exists and belongs to user
-            await self.get_bonsai(bonsai_id, user_id)
+            await self._check_bonsai_owner(bonsai_id, user_id)
             
-            # Get image details
-            image_response = self.client.table("bonsai_images").select("*").eq("id", image_id).eq("bonsai_id", bonsai_id).execute()
+            # Delete from database, getting the row back for its storage path
+            image_response = await self._execute(self.client.table("bonsai_images").delete().eq("id", image_id).eq("bonsai_id", bonsai_id))
             
             if not image_response.data:
                 raise HTTPException(
@@ -337,19 +1205,24 @@ class SupabaseService:
                     detail="Image not found"
                 )
             
-            # Extract storage path from URL
-            image_url = image_response.data[0]["image_url"]
-            storage_path = image_url.split("/")[-1]
+            image = image_response.data[0]
+            insight_cache.invalidate_bonsai(bonsai_id)
+            await read_cache.invalidate(f"images:{bonsai_id}")
+            await read_cache.invalidate_lists(user_id)
             
-            # Delete from storage
-            try:
-                self.client.storage.from_("bonsai-images").remove([f"{user_id}/{bonsai_id}/{storage_path}"])
-            except:
-                # Continue even if storage deletion fails
-                pass
+            # Extract storage paths of the original and its variants from their URLs
+            image_urls = [image["image_url"]]
+            for encodings in (image.get("variants") or {}).values():
+                image_urls.extend(encodings.values())
+            storage_paths = [path for path in map(_storage_path, image_urls) if path]
             
-            # Delete from database
-            self.client.table("bonsai_images").delete().eq("id", image_id).execute()
+            # Delete from storage in the background
+            if storage_paths:
+                await job_queue.enqueue(
+                    "storage.remove_image",
+                    {"storage_path": image.get("storage_path"), "paths": storage_paths},
+                    user_id=user_id
+                )
         except HTTPException:
             raise
         except Exception as e:
@@ -361,7 +1234,10 @@ class SupabaseService:
     # AI insights methods
     async def get_bonsai_insights(self, bonsai_id: str, user_id: str) -> List[Dict[str, Any]]:
         """
-        Get AI insights for a bonsai.
+        Get AI insights for a bonsai, newest first.
+        
+        The list is cached until an insight is added or deleted, and ownership is
+        checked against the cached bonsai row.
         
         Args:
             bonsai_id: The bonsai's ID
@@ -374,13 +1250,18 @@ class SupabaseService:
             HTTPException: If there's an error retrieving insights
         """
         try:
-            # Check if bonsai exists and belongs to user
-            await self.get_bonsai(bonsai_id, user_id)
+            await self._check_bonsai_owner(bonsai_id, user_id)
             
-            # Get insights for the bonsai
-            response = self.client.table("ai_insights").select("*").eq("bonsai_id", bonsai_id).order("created_at", desc=True).execute()
+            async def load() -> List[Dict[str, Any]]:
+                response = await self._execute(
+                    self.client.table("ai_insights")
+                    .select("*")
+                    .eq("bonsai_id", bonsai_id)
+                    .order("created_at", desc=True)
+                )
+                return response.data
             
-            return response.data
+            return await read_cache.get(f"insights:{bonsai_id}", load)
         except HTTPException:
             raise
         except Exception as e:
@@ -389,15 +1270,59 @@ class SupabaseService:
                 detail=f"Error retrieving insights: {str(e)}"
             )
     
-    async def create_bonsai_insight(self, bonsai_id: str, user_id: str, question: str, ai_response: str) -> Dict[str, Any]:
+    async def get_insight_by_idempotency_key(self, bonsai_id: str, idempotency_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the insight saved by an earlier request with the same Idempotency-Key.
+        
+        The caller must already have checked that the bonsai belongs to the user.
+        
+        Args:
+            bonsai_id: The bonsai's ID
+            idempotency_key: The client's Idempotency-Key header
+            
+        Returns:
+            The saved insight, or None if no request with this key has completed
+            
+        Raises:
+            HTTPException: If there's an error retrieving the insight
+        """
+        try:
+            response = await self._execute(
+                self.client.table("ai_insights")
+                .select("*")
+                .eq("bonsai_id", bonsai_id)
+                .eq("idempotency_key", idempotency_key)
+                .limit(1)
+            )
+            return response.data[0] if response.data else None
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error retrieving insight: {str(e)}"
+            )
+    
+    async def create_bonsai_insight(
+        self,
+        bonsai_id: str,
+        user_id: str,
+        question: str,
+        ai_response: str,
+        bonsai: Optional[Dict[str, Any]] = None,
+        idempotency_key: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Create an AI insight for a bonsai.
         
+        With an idempotency key, only the first insight saved with that key is
+        kept; later saves return it instead of inserting a duplicate.
+        
         Args:
             bonsai_id: The bonsai's ID
             user_id: The user's ID
             question: The user's question
             ai_response: The AI-generated response
+            bonsai: The bonsai, if already loaded for this user; skips the ownership check
+            idempotency_key: The client's Idempotency-Key header, if any
             
         Returns:
             Created insight object
@@ -407,7 +1332,8 @@ class SupabaseService:
         """
         try:
             # Check if bonsai exists and belongs to user
-            await self.get_bonsai(bonsai_id, user_id)
+            if bonsai is None:
+                await self._check_bonsai_owner(bonsai_id, user_id)
             
             # Save insight to database
             insight_data = {
@@ -416,9 +1342,25 @@ class SupabaseService:
                 "ai_response": ai_response
             }
             
-            insert_response = self.client.table("ai_insights").insert(insight_data).execute()
+            if idempotency_key:
+                # A concurrent retry may have saved first; its row wins and is returned
+                insight_data["idempotency_key"] = idempotency_key
+                insert_response = await self._execute(
+                    self.client.table("ai_insights").upsert(
+                        insight_data,
+                        on_conflict="bonsai_id,idempotency_key",
+                        ignore_duplicates=True
+                    )
+                )
+                if not insert_response.data:
+                    existing = await self.get_insight_by_idempotency_key(bonsai_id, idempotency_key)
+                    if existing:
+                        return existing
+            else:
+                insert_response = await self._execute(self.client.table("ai_insights").insert(insight_data))
             
             if insert_response.data:
+                await read_cache.invalidate(f"insights:{bonsai_id}")
                 return insert_response.data[0]
             else:
                 raise HTTPException(
@@ -446,20 +1388,18 @@ class SupabaseService:
             HTTPException: If the insight is not found or there's an error deleting it
         """
         try:
-            # Check if bonsai exists and belongs to user
-            await self.get_bonsai(bonsai_id, user_id)
+            await self._check_bonsai_owner(bonsai_id, user_id)
             
-            # Check if insight exists
-            insight_response = self.client.table("ai_insights").select("*").eq("id", insight_id).eq("bonsai_id", bonsai_id).execute()
+            # Delete insight
+            response = await self._execute(self.client.table("ai_insights").delete().eq("id", insight_id).eq("bonsai_id", bonsai_id))
             
-            if not insight_response.data:
+            if not response.data:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Insight not found"
                 )
             
-            # Delete insight
-            self.client.table("ai_insights").delete().eq("id", insight_id).execute()
+            await read_cache.invalidate(f"insights:{bonsai_id}")
         except HTTPException:
             raise
         except Exception as e:
@@ -467,3 +1407,243 @@ class SupabaseService:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error deleting insight: {str(e)}"
             )
+    
+    # Conversation history methods
+    async def get_insight_history(
+        self,
+        bonsai_id: str,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        newest_first: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the questions and answers asked about a bonsai.
+        
+        The caller must already have checked that the bonsai belongs to the user.
+        
+        Args:
+            bonsai_id: The bonsai's ID
+            after: Only insights created after this timestamp
+            limit: Maximum number of insights
+            newest_first: Order from newest to oldest, rather than oldest to newest
+            
+        Returns:
+            List of insights with their question, answer and creation time
+            
+        Raises:
+            HTTPException: If there's an error retrieving insights
+        """
+        try:
+            query = (
+                self.client.table("ai_insights")
+                .select("id, user_question, ai_response, created_at")
+                .eq("bonsai_id", bonsai_id)
+                .order("created_at", desc=newest_first)
+            )
+            if after:
+                query = query.gt("created_at", after)
+            if limit:
+                query = query.limit(limit)
+            
+            response = await self._execute(query)
+            return response.data
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error retrieving insights: {str(e)}"
+            )
+    
+    async def get_insight_summary(self, bonsai_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the rolling summary of a bonsai's older insights.
+        
+        Args:
+            bonsai_id: The bonsai's ID
+            
+        Returns:
+            The summary, or None if no insights have been summarised yet
+            
+        Raises:
+            HTTPException: If there's an error retrieving the summary
+        """
+        try:
+            response = await self._execute(
+                self.client.table("insight_summaries")
+                .select("*")
+                .eq("bonsai_id", bonsai_id)
+                .limit(1)
+            )
+            return response.data[0] if response.data else None
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error retrieving insight summary: {str(e)}"
+            )
+    
+    async def save_insight_summary(
+        self,
+        bonsai_id: str,
+        summary: str,
+        summarized_until: str,
+        insight_count: int
+    ) -> Dict[str, Any]:
+        """
+        Save a bonsai's rolling summary, replacing the previous one.
+        
+        Args:
+            bonsai_id: The bonsai's ID
+            summary: The summary text
+            summarized_until: Creation time of the newest insight in the summary
+            insight_count: Number of insights in the summary
+            
+        Returns:
+            The saved summary
+            
+        Raises:
+            HTTPException: If there's an error saving the summary
+        """
+        try:
+            response = await self._execute(
+                self.client.table("insight_summaries").upsert(
+                    {
+                        "bonsai_id": bonsai_id,
+                        "summary": summary,
+                        "summarized_until": summarized_until,
+                        "insight_count": insight_count,
+                        "updated_at": datetime.now(timezone.utc).isoformat()
+                    },
+                    on_conflict="bonsai_id"
+                )
+            )
+            return response.data[0]
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error saving insight summary: {str(e)}"
+            )
+    
+    async def delete_insight_summary(self, bonsai_id: str) -> None:
+        """
+        Delete a bonsai's rolling summary.
+        
+        Args:
+            bonsai_id: The bonsai's ID
+            
+        Raises:
+            HTTPException: If there's an error deleting the summary
+        """
+        try:
+            await self._execute(self.client.table("insight_summaries").delete().eq("bonsai_id", bonsai_id))
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error deleting insight summary: {str(e)}"
+            )
+    
+    # Care schedule methods
+    async def get_care_schedule_fingerprints(self, user_id: str) -> List[Dict[str, Any]]:
+        """
+        Get a user's bonsais with the fingerprint of their current care schedule.
+        
+        Args:
+            user_id: The user's ID
+            
+        Returns:
+            List of bonsai objects with the "schedule_fingerprint" and "schedule_updated_at"
+            of their schedule (both None if there is no schedule)
+            
+        Raises:
+            HTTPException: If there's an error retrieving bonsais
+        """
+        try:
+            response = await self._execute(
+                self.client.table("bonsais")
+                .select("id, title, description, care_schedules(fingerprint, updated_at)")
+                .eq("user_id", user_id)
+            )
+            
+            bonsais = response.data
+            for bonsai in bonsais:
+                # One-to-one embeds come back as an object, or as a list on older PostgREST
+                schedule = bonsai.pop("care_schedules", None)
+                if isinstance(schedule, list):
+                    schedule = schedule[0] if schedule else None
+                bonsai["schedule_fingerprint"] = schedule["fingerprint"] if schedule else None
+                bonsai["schedule_updated_at"] = schedule["updated_at"] if schedule else None
+            
+            return bonsais
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error retrieving bonsais: {str(e)}"
+            )
+    
+    async def save_care_schedules(self, schedules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Save generated care schedules, replacing each bonsai's previous one, in one request.
+        
+        The caller must already have checked that the bonsais belong to the user.
+        
+        Args:
+            schedules: Dictionaries with bonsai_id, care_schedule and fingerprint
+            
+        Returns:
+            The saved care schedules
+            
+        Raises:
+            HTTPException: If there's an error saving the schedules
+        """
+        try:
+            updated_at = datetime.now(timezone.utc).isoformat()
+            rows = [{**schedule, "updated_at": updated_at} for schedule in schedules]
+            
+            response = await self._execute(
+                self.client.table("care_schedules").upsert(rows, on_conflict="bonsai_id")
+            )
+            return response.data
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error saving care schedules: {str(e)}"
+            )
+    
+    async def get_care_schedule(self, bonsai_id: str, user_id: str) -> Dict[str, Any]:
+        """
+        Get a bonsai's care schedule.
+        
+        Ownership is enforced by filtering on the embedded bonsai, so this is a single round trip.
+        
+        Args:
+            bonsai_id: The bonsai's ID
+            user_id: The user's ID
+            
+        Returns:
+            Care schedule object
+            
+        Raises:
+            HTTPException: If there is no schedule or the bonsai doesn't belong to the user
+        """
+        try:
+            response = await self._execute(
+                self.client.table("care_schedules")
+                .select("*, bonsais!inner(user_id)")
+                .eq("bonsai_id", bonsai_id)
+                .eq("bonsais.user_id", user_id)
+            )
+            
+            if not response.data:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Care schedule not found"
+                )
+            
+            schedule = response.data[0]
+            schedule.pop("bonsais", None)
+            return schedule
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error retrieving care schedule: {str(e)}"
+            )
@@ -0,0 +1,181 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import httpx
+from jose import jwt
+
+# Algorithms Supabase signs access tokens with: HS256 for the legacy shared
+# secret, RS256/ES256 for asymmetric signing keys published as a JWKS.
+SYMMETRIC_ALGORITHMS = {"HS256"}
+ASYMMETRIC_ALGORITHMS = {"RS256", "ES256"}
+
+
+class TokenVerifier:
+    """Verifies Supabase access tokens locally and caches the resulting user IDs."""
+
+    def __init__(
+        self,
+        jwt_secret: Optional[str] = None,
+        jwks_url: Optional[str] = None,
+        audience: str = "authenticated",
+        cache_ttl: float = 300.0,
+        cache_size: int = 10000,
+        jwks_refresh_interval: float = 600.0,
+        jwks_retry_interval: float = 30.0
+    ):
+        """
+        Initialize the token verifier.
+
+        Args:
+            jwt_secret: The project's JWT secret, used for HS256 tokens
+            jwks_url: URL of the project's JWKS, used for RS256/ES256 tokens
+            audience: Expected "aud" claim
+            cache_ttl: Maximum seconds a verified token stays cached
+            cache_size: Maximum number of cached tokens
+            jwks_refresh_interval: Seconds the JWKS is used before it is downloaded again
+            jwks_retry_interval: Minimum seconds between downloads for a key ID the JWKS doesn't have
+        """
+        self.jwt_secret = jwt_secret
+        self.jwks_url = jwks_url
+        self.audience = audience
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.jwks_refresh_interval = jwks_refresh_interval
+        self.jwks_retry_interval = jwks_retry_interval
+
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._jwks: Optional[Dict[str, Any]] = None
+        self._jwks_fetched_at = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.local_verifications = 0
+        self.remote_verifications = 0
+
+    @staticmethod
+    def _cache_key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def cached_user_id(self, token: str) -> Optional[str]:
+        """
+        Look up a previously verified token.
+
+        Args:
+            token: The raw JWT
+
+        Returns:
+            The cached user ID, or None if the token is not cached or has expired
+        """
+        key = self._cache_key(token)
+        entry = self._cache.get(key)
+
+        if entry and entry[1] > time.time():
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        if entry:
+            del self._cache[key]
+        self.misses += 1
+        return None
+
+    def remember(self, token: str, user_id: str, expires_at: Optional[float] = None) -> None:
+        """
+        Cache a verified token until its "exp" claim or the cache TTL, whichever comes first.
+
+        Args:
+            token: The raw JWT
+            user_id: The user ID the token was verified for
+            expires_at: The token's "exp" claim, if known
+        """
+        deadline = time.time() + self.cache_ttl
+        if expires_at is not None:
+            deadline = min(deadline, float(expires_at))
+
+        key = self._cache_key(token)
+        self._cache[key] = (user_id, deadline)
+        self._cache.move_to_end(key)
+
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def verify(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Verify a token's signature, expiry and audience without calling GoTrue.
+
+        This may download the JWKS, so it should not run on the event loop.
+
+        Args:
+            token: The raw JWT
+
+        Returns:
+            The verified claims, or None if the token cannot be verified locally
+            (no secret configured, unknown algorithm or JWKS unavailable)
+
+        Raises:
+            JWTError: If the token is malformed, expired or has a bad signature
+        """
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get("alg")
+
+        if algorithm in SYMMETRIC_ALGORITHMS and self.jwt_secret:
+            key: Any = self.jwt_secret
+        elif algorithm in ASYMMETRIC_ALGORITHMS and self.jwks_url:
+            key = self._get_jwks(header.get("kid"))
+            if not key:
+                return None
+        else:
+            return None
+
+        claims = jwt.decode(token, key, algorithms=[algorithm], audience=self.audience)
+        if not claims.get("sub"):
+            raise ValueError("Token has no subject")
+
+        self.local_verifications += 1
+        return claims
+
+    def _get_jwks(self, kid: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Return the project's JWKS, downloading it at most once per refresh interval.
+
+        A token signed with a key ID the JWKS doesn't have, e.g. after a key
+        rotation, downloads it again early, at most once per retry interval so
+        tokens with made-up key IDs can't make every request download it.
+        """
+        since_fetch = time.time() - self._jwks_fetched_at
+        expired = self._jwks is None or since_fetch > self.jwks_refresh_interval
+        unknown_kid = kid is not None and not self._has_key(kid) and since_fetch > self.jwks_retry_interval
+
+        if expired or unknown_kid:
+            self._jwks_fetched_at = time.time()
+            try:
+                response = httpx.get(self.jwks_url, timeout=5.0)
+                response.raise_for_status()
+                self._jwks = response.json()
+            except Exception as e:
+                print(f"Error fetching JWKS: {str(e)}")
+
+        if self._jwks and self._jwks.get("keys"):
+            return self._jwks
+        return None
+
+    def _has_key(self, kid: str) -> bool:
+        return any(key.get("kid") == kid for key in (self._jwks or {}).get("keys") or [])
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache and verification counters.
+
+        Returns:
+            Dictionary with hit/miss counts, hit rate and verification counts
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "cached_tokens": len(self._cache),
+            "local_verifications": self.local_verifications,
+            "remote_verifications": self.remote_verifications
+        }
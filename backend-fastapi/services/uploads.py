@@ -0,0 +1,98 @@
+import os
+import hashlib
+import tempfile
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from io import BufferedReader
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Largest accepted image upload, in bytes
+max_upload_bytes = int(os.environ.get("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+
+# Most images accepted in one multi-file upload
+max_upload_files = int(os.environ.get("MAX_UPLOAD_FILES", "30"))
+
+# Uploads are copied and hashed this many bytes at a time
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class SpooledUpload:
+    """An uploaded file spooled to a temporary file on disk."""
+    path: str
+    file_name: str
+    content_type: Optional[str]
+    size: int
+    sha256: str
+
+    def open(self) -> BufferedReader:
+        """Open the spooled file for streaming to storage."""
+        return open(self.path, "rb")
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File too large (maximum is {max_upload_bytes // (1024 * 1024)} MB)"
+    )
+
+
+@asynccontextmanager
+async def spool_upload(file: UploadFile, max_bytes: Optional[int] = None) -> AsyncIterator[SpooledUpload]:
+    """
+    Copy an upload to a temporary file in chunks, enforcing the size limit and
+    computing its SHA-256 on the way, so the whole file is never held in memory.
+
+    The temporary file is removed when the context exits.
+
+    Args:
+        file: The uploaded file
+        max_bytes: Size limit, defaults to MAX_UPLOAD_BYTES
+
+    Yields:
+        The spooled upload
+
+    Raises:
+        HTTPException: 413 as soon as the upload exceeds the size limit
+    """
+    max_bytes = max_upload_bytes if max_bytes is None else max_bytes
+
+    # Reject up front when the multipart parser already knows the size
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large()
+
+    spool = tempfile.NamedTemporaryFile(prefix="bonsai-upload-", delete=False)
+    try:
+        digest = hashlib.sha256()
+        size = 0
+
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+
+            size += len(chunk)
+            if size > max_bytes:
+                raise _too_large()
+
+            digest.update(chunk)
+            await run_in_threadpool(spool.write, chunk)
+
+        spool.close()
+
+        yield SpooledUpload(
+            path=spool.name,
+            file_name=file.filename or "upload",
+            content_type=file.content_type,
+            size=size,
+            sha256=digest.hexdigest()
+        )
+    finally:
+        spool.close()
+        os.unlink(spool.name)
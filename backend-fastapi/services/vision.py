@@ -0,0 +1,196 @@
+import os
+import asyncio
+import base64
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import httpx
+from dotenv import load_dotenv
+from .image_processing import resize_for_model, variants_enabled
+
+# Load environment variables
+load_dotenv()
+
+# Longest edge, in pixels, images are sent at for each detail level. "low" is
+# billed as a single 512px tile whatever the size; "high" is billed per 512px
+# tile, and 768px is the short side the API scales larger images down to anyway
+MODEL_IMAGE_SIZES = {
+    "low": 512,
+    "high": 768
+}
+
+# Variants preferred as the source, smallest first: big enough to downsize from,
+# much smaller to download than the original
+SOURCE_VARIANTS = ("medium", "full")
+
+# One pooled HTTP session for downloading images
+http_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(10.0, connect=5.0),
+    limits=httpx.Limits(max_connections=16, max_keepalive_connections=16)
+)
+
+
+class VisionImages:
+    """
+    Prepares a bonsai's images for the vision model.
+
+    The most recent images are downloaded from their smallest suitable variant,
+    downsized to the resolution the model bills for, and sent inline as data
+    URLs. Encoded payloads are cached by image ID, as an image never changes
+    once uploaded, so each one is downloaded and resized once.
+    """
+
+    def __init__(self, max_images: int = 3, detail: str = "low", cache_bytes: int = 32 * 1024 * 1024):
+        """
+        Initialize the image pipeline.
+
+        Args:
+            max_images: Maximum number of images attached to an insight question
+            detail: Detail level insight images are sent at, "low" or "high"
+            cache_bytes: Maximum total size of the cached data URLs
+        """
+        self.max_images = max_images
+        self.detail = detail if detail in MODEL_IMAGE_SIZES else "low"
+        self.cache_bytes = cache_bytes
+
+        self._payloads: "OrderedDict[str, str]" = OrderedDict()
+        self._size = 0
+        self._loading: Dict[str, "asyncio.Task[Optional[str]]"] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.bytes_downloaded = 0
+        self.bytes_sent = 0
+
+    def select(self, images: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Choose the images to attach: the most recent ones, newest first.
+
+        Args:
+            images: The bonsai's image rows
+
+        Returns:
+            At most max_images image rows
+        """
+        ordered = sorted(images, key=lambda image: image.get("created_at") or "", reverse=True)
+        return ordered[:self.max_images]
+
+    @staticmethod
+    def _source_url(image: Dict[str, Any]) -> str:
+        variants = image.get("variants") or {}
+        for name in SOURCE_VARIANTS:
+            encodings = variants.get(name) or {}
+            # JPEG decodes everywhere Pillow does; WebP is the fallback
+            url = encodings.get("jpeg") or encodings.get("webp")
+            if url:
+                return url
+        return image["image_url"]
+
+    async def _load(self, image: Dict[str, Any], detail: str) -> Optional[str]:
+        url = self._source_url(image)
+
+        # Without Pillow the model fetches the image itself, and downsizes it for the detail level
+        if not variants_enabled:
+            return url
+
+        try:
+            response = await http_client.get(url)
+            response.raise_for_status()
+        except Exception as e:
+            self.failures += 1
+            print(f"Error downloading image for the model: {str(e)}")
+            return None
+
+        self.bytes_downloaded += len(response.content)
+
+        data = await resize_for_model(response.content, MODEL_IMAGE_SIZES[detail])
+        if data is None:
+            return url
+
+        return "data:image/jpeg;base64," + base64.b64encode(data).decode()
+
+    def _remember(self, key: str, payload: str) -> None:
+        # Every caller waiting on the same download remembers it
+        previous = self._payloads.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+
+        self._payloads[key] = payload
+        self._size += len(payload)
+        while self._size > self.cache_bytes and self._payloads:
+            _, evicted = self._payloads.popitem(last=False)
+            self._size -= len(evicted)
+
+    async def payload(self, image: Dict[str, Any], detail: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get the chat message part for an image.
+
+        Args:
+            image: An image row, with its id, image_url and variants
+            detail: Detail level, defaults to the insight detail level
+
+        Returns:
+            An image_url content part, or None if the image couldn't be loaded
+        """
+        detail = detail if detail in MODEL_IMAGE_SIZES else self.detail
+        key = f"{image.get('id') or image['image_url']}:{detail}"
+
+        url = self._payloads.get(key)
+        if url is not None:
+            self._payloads.move_to_end(key)
+            self.hits += 1
+        else:
+            # Concurrent questions about the same tree share one download
+            loading = self._loading.get(key)
+            if loading is None:
+                self.misses += 1
+                loading = asyncio.ensure_future(self._load(image, detail))
+                self._loading[key] = loading
+                loading.add_done_callback(lambda _: self._loading.pop(key, None))
+
+            url = await asyncio.shield(loading)
+            if url is None:
+                return None
+            self._remember(key, url)
+
+        self.bytes_sent += len(url)
+        return {"type": "image_url", "image_url": {"url": url, "detail": detail}}
+
+    async def payloads(self, images: List[Dict[str, Any]], detail: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get the chat message parts for several images, loading them concurrently.
+
+        Args:
+            images: Image rows, as chosen by select
+            detail: Detail level, defaults to the insight detail level
+
+        Returns:
+            Content parts for the images that could be loaded, in order
+        """
+        parts = await asyncio.gather(*(self.payload(image, detail) for image in images))
+        return [part for part in parts if part is not None]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get pipeline counters.
+
+        Returns:
+            Dictionary with cache hits and misses, cache size and bytes downloaded and sent
+        """
+        return {
+            "cached_images": len(self._payloads),
+            "cached_bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+            "bytes_downloaded": self.bytes_downloaded,
+            "bytes_sent": self.bytes_sent,
+            "detail": self.detail
+        }
+
+
+vision_images = VisionImages(
+    max_images=int(os.environ.get("VISION_MAX_IMAGES", "3")),
+    detail=os.environ.get("VISION_IMAGE_DETAIL", "low"),
+    cache_bytes=int(os.environ.get("VISION_CACHE_BYTES", str(32 * 1024 * 1024)))
+)
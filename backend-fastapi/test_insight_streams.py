@@ -0,0 +1,86 @@
+"""
+Check that concurrent streamed insights share one model call, against local stubs.
+
+Several clients stream the same question at once, first as retries with one
+Idempotency-Key and then with no key at all. Each group must make a single
+completion call and every client must receive the whole answer; only the
+requests without a key save an insight each. Reusing a key for a different
+question must be rejected. Run from backend-fastapi:
+
+    python test_insight_streams.py
+"""
+import asyncio
+import json
+import os
+import sys
+
+SUPABASE_PORT = 54622
+OPENAI_PORT = 54623
+CLIENTS = 4
+
+
+def parse(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def main() -> int:
+    from benchmarks import harness, stub_openai, stub_supabase
+
+    stub_openai.serve(OPENAI_PORT, delay=1.0)
+    os.environ.update(
+        OPENAI_API_KEY="sk-stub",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{OPENAI_PORT}/v1",
+        AI_RATE_LIMIT_PER_MINUTE="0"
+    )
+    user_id, headers = harness.start(SUPABASE_PORT)
+    bonsai = harness.seed_bonsai(user_id)
+    url = f"/api/bonsais/{bonsai['id']}/insights?stream=true"
+
+    import httpx
+    from main import app
+
+    def completions() -> int:
+        return sum(1 for body in stub_openai.STATE["requests"] if "messages" in body)
+
+    def saved(question: str) -> int:
+        return sum(1 for row in stub_supabase.STATE["tables"]["ai_insights"] if row["user_question"] == question)
+
+    async def stream_all(client, question: str, key=None) -> list:
+        request_headers = dict(headers, **({"Idempotency-Key": key} if key else {}))
+        responses = await asyncio.gather(*(
+            client.post(url, json={"user_question": question}, headers=request_headers)
+            for _ in range(CLIENTS)
+        ))
+        return [parse(response.text) for response in responses]
+
+    checks = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", timeout=60) as client:
+        before = completions()
+        streams = await stream_all(client, "How often should I water?", key="retry-1")
+        answers = {"".join(data["text"] for event, data in events if event == "token") for events in streams}
+        done = {events[-1][1].get("id") for events in streams if events[-1][0] == "done"}
+        checks["retries share one completion"] = completions() - before == 1
+        checks["every retry got the whole answer"] = answers == {stub_openai.DEFAULT_REPLY}
+        checks["retries got the same saved insight"] = len(done) == 1 and None not in done
+        checks["retries saved one insight"] = saved("How often should I water?") == 1
+
+        before = completions()
+        streams = await stream_all(client, "When should I repot?")
+        checks["identical streams share one completion"] = completions() - before == 1
+        checks["every identical stream finished"] = all(events[-1][0] == "done" for events in streams)
+        checks["identical streams each saved an insight"] = saved("When should I repot?") == CLIENTS
+
+        response = await client.post(url, json={"user_question": "Is it healthy?"}, headers=dict(headers, **{"Idempotency-Key": "retry-1"}))
+        checks["a reused key for another question is rejected"] = response.status_code == 422
+
+    for name, ok in checks.items():
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    return 0 if all(checks.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,80 @@
+"""
+Check that slow model calls don't block the rest of the API, against local stubs.
+
+Fires several insight requests at a stub completion endpoint that takes 3
+seconds per call, and times GET /api/bonsais/ while they are in flight. It
+also checks that in-flight model calls are capped at OPENAI_MAX_CONCURRENCY.
+Run from backend-fastapi:
+
+    python test_openai_concurrency.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+SUPABASE_PORT = 54620
+OPENAI_PORT = 54621
+INSIGHTS = 5
+MAX_CONCURRENCY = 3
+
+
+async def main() -> int:
+    from benchmarks import harness, stub_openai
+
+    stub_openai.serve(OPENAI_PORT, delay=3.0)
+    os.environ.update(
+        OPENAI_API_KEY="sk-stub",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{OPENAI_PORT}/v1",
+        OPENAI_MAX_CONCURRENCY=str(MAX_CONCURRENCY),
+        AI_RATE_LIMIT_PER_MINUTE="0"
+    )
+    user_id, headers = harness.start(SUPABASE_PORT)
+    bonsai = harness.seed_bonsai(user_id)
+
+    import httpx
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+        start = time.perf_counter()
+        insights = [
+            asyncio.create_task(client.post(
+                f"/api/bonsais/{bonsai['id']}/insights",
+                json={"user_question": f"Question {i}: when should I repot?"},
+                headers=headers
+            ))
+            for i in range(INSIGHTS)
+        ]
+
+        latencies = []
+        await asyncio.sleep(0.2)
+        while not all(insight.done() for insight in insights):
+            request_start = time.perf_counter()
+            response = await client.get("/api/bonsais/", headers=headers)
+            latencies.append(time.perf_counter() - request_start)
+            assert response.status_code == 200, response.text
+            await asyncio.sleep(0.05)
+
+        responses = await asyncio.gather(*insights)
+        elapsed = time.perf_counter() - start
+
+    statuses = [response.status_code for response in responses]
+    print(f"{INSIGHTS} insights (3 s each): statuses {statuses} in {elapsed:.1f}s, "
+          f"at most {stub_openai.STATE['max_in_flight']} in flight at the stub")
+    print(f"GET /api/bonsais/ meanwhile: n={len(latencies)} "
+          f"p50 {statistics.median(latencies) * 1000:.0f} ms  max {max(latencies) * 1000:.0f} ms")
+
+    checks = {
+        "every insight succeeded": all(code == 200 for code in statuses),
+        "other requests stayed responsive": max(latencies) < 0.5,
+        "model calls were capped": stub_openai.STATE["max_in_flight"] <= MAX_CONCURRENCY
+    }
+    for name, ok in checks.items():
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    return 0 if all(checks.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,132 @@
+"""
+Check retries, fallback and the circuit breaker against a failing stub, and
+that a stream gives back its concurrency slot while it backs off.
+
+The stub answers a set number of upcoming completions with 503. Run from
+backend-fastapi:
+
+    python test_openai_resilience.py
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+SUPABASE_PORT = 54624
+OPENAI_PORT = 54625
+FALLBACK_MODEL = "gpt-4o-mini"
+
+
+async def main() -> int:
+    from benchmarks import harness, stub_openai
+
+    stub_openai.serve(OPENAI_PORT, delay=0.05)
+    os.environ.update(
+        OPENAI_API_KEY="sk-stub",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{OPENAI_PORT}/v1",
+        AI_RATE_LIMIT_PER_MINUTE="0",
+        # One slot, so a stream that kept it through its backoff would block every other call
+        OPENAI_MAX_CONCURRENCY="1",
+        OPENAI_FALLBACK_MODEL=FALLBACK_MODEL,
+        OPENAI_CIRCUIT_FAILURES="4",
+        OPENAI_CIRCUIT_RESET="5",
+        OPENAI_DEADLINE="3",
+        OPENAI_TIMEOUT="2",
+        INSIGHT_CACHE_EMBEDDING_MODEL="text-embedding-3-small"
+    )
+    user_id, headers = harness.start(SUPABASE_PORT)
+    bonsai = harness.seed_bonsai(user_id, n_images=0)
+    url = f"/api/bonsais/{bonsai['id']}/insights"
+
+    import httpx
+    from main import app
+    from routers.ai_care import openai_service
+    from services.openai_service import _call_slots
+    from services.resilience import resilient_caller
+
+    def completions() -> list:
+        return [body for body in stub_openai.STATE["requests"] if "messages" in body]
+
+    def models_since(count: int) -> list:
+        return [body["model"] for body in completions()[count:]]
+
+    checks = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", timeout=60) as client:
+        async def ask(question: str, **params) -> httpx.Response:
+            return await client.post(url, json={"user_question": question}, params=params, headers=headers)
+
+        stub_openai.STATE["fail"] = 2
+        before = len(completions())
+        response = await ask("Retried until it works?")
+        models = models_since(before)
+        print("2 failures:", response.status_code, models)
+        checks["failures are retried"] = response.status_code == 200 and len(models) == 3 and FALLBACK_MODEL not in models
+
+        stub_openai.STATE["fail"] = 3
+        before = len(completions())
+        response = await ask("Answered by the fallback?")
+        models = models_since(before)
+        print("3 failures:", response.status_code, models)
+        checks["retries fall back to the other model"] = response.status_code == 200 and models[-1] == FALLBACK_MODEL
+
+        stub_openai.STATE["fail"] = 100
+        response = await ask("Is anyone there?")
+        print("provider down:", response.status_code, response.json())
+        checks["a provider that stays down is a 503"] = response.status_code == 503
+
+        # Once both models' circuits are open, requests are turned away without a call
+        for attempt in range(4):
+            before = len(completions())
+            started = time.perf_counter()
+            response = await ask(f"Still down? ({attempt})")
+            elapsed = time.perf_counter() - started
+            if "retry-after" in response.headers:
+                break
+        print(f"circuit open: {response.status_code} Retry-After={response.headers.get('retry-after')} "
+              f"calls={len(completions()) - before} in {elapsed:.3f}s")
+        checks["an open circuit fails fast"] = (
+            response.status_code == 503 and "retry-after" in response.headers and len(completions()) == before
+        )
+
+        stub_openai.STATE["fail"] = 0
+        await asyncio.sleep(5.1)
+        response = await ask("Back again?")
+        checks["the circuit closes once the provider recovers"] = response.status_code == 200
+
+        # A stream that fails twice backs off for about a second in all; another call
+        # should get the only slot meanwhile instead of waiting for the stream to end.
+        # The stub never fails embeddings, so the other call doesn't use up a failure
+        stub_openai.STATE["fail"] = 2
+        before = len(completions())
+        streamed = asyncio.create_task(ask("Streamed after two failures?", stream="true"))
+        while len(completions()) == before:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        started = time.perf_counter()
+        probe = await openai_service._embed("probe")
+        probe_seconds = time.perf_counter() - started
+        response = await streamed
+        events = [block.split("\n")[0] for block in response.text.strip().split("\n\n")]
+        print(f"stream with 2 failures: {response.status_code} last event {events[-1]!r}, "
+              f"another call meanwhile took {probe_seconds:.2f}s")
+        checks["a failed stream attempt gives back its slot"] = probe is not None and probe_seconds < 0.3
+        checks["the stream was retried to completion"] = events[-1] == "event: done"
+
+        stub_openai.STATE["fail"] = 100
+        response = await ask("Streamed while it is down?", stream="true")
+        stub_openai.STATE["fail"] = 0
+        print(f"stream while down: {response.text.strip().splitlines()[0]!r}")
+        checks["a stream that can't start ends with an error event"] = response.text.startswith("event: error")
+
+        checks["every slot was given back"] = not _call_slots.locked()
+
+        print(json.dumps(resilient_caller.stats()))
+
+    for name, ok in checks.items():
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    return 0 if all(checks.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,144 @@
+"""
+Check that every write is visible to the next read through the read cache, against local stubs.
+
+Warms the cached views of a bonsai (detail, paged and unpaged lists, insights),
+then makes each kind of write and reads every view again. Also checks that
+cached rows are never served to another user, and that a load which was under
+way when its key was invalidated is not cached. Run from backend-fastapi:
+
+    python test_read_cache.py
+"""
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+import uuid
+
+SUPABASE_PORT = 54626
+OPENAI_PORT = 54627
+
+
+async def main() -> int:
+    from benchmarks import harness, stub_openai
+
+    stub_openai.serve(OPENAI_PORT, delay=0.01)
+    os.environ.update(
+        OPENAI_API_KEY="sk-stub",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{OPENAI_PORT}/v1",
+        AI_RATE_LIMIT_PER_MINUTE="0",
+        AI_DAILY_TOKEN_QUOTA="0"
+    )
+    user_id, headers = harness.start(SUPABASE_PORT)
+    bonsai_id = harness.seed_bonsai(user_id, n_images=1)["id"]
+
+    import httpx
+    from jose import jwt
+    from PIL import Image
+    from main import app
+    from services.read_cache import read_cache
+
+    checks = {}
+
+    def find(bonsais: list, bonsai_id: str) -> dict:
+        return next((bonsai for bonsai in bonsais if bonsai["id"] == bonsai_id), None)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", timeout=60) as client:
+        async def views(bonsai_id: str) -> tuple:
+            detail = await client.get(f"/api/bonsais/{bonsai_id}", headers=headers)
+            page = (await client.get("/api/bonsais/?paged=true&images=all", headers=headers)).json()["items"]
+            unpaged = (await client.get("/api/bonsais/", headers=headers)).json()
+            insights = await client.get(f"/api/bonsais/{bonsai_id}/insights", headers=headers)
+            return detail, page, unpaged, insights
+
+        await views(bonsai_id)
+        harness.reset(SUPABASE_PORT)
+        await views(bonsai_id)
+        warm = harness.stats(SUPABASE_PORT)["requests"]
+        print(f"warm views: {warm} database requests")
+        checks["warm views are served from the cache"] = warm == 0
+
+        await client.put(f"/api/bonsais/{bonsai_id}", json={"title": "Renamed"}, headers=headers)
+        detail, page, unpaged, insights = await views(bonsai_id)
+        checks["update -> detail"] = detail.json()["title"] == "Renamed"
+        checks["update -> page"] = find(page, bonsai_id)["title"] == "Renamed"
+        checks["update -> unpaged list"] = find(unpaged, bonsai_id)["title"] == "Renamed"
+
+        photo = io.BytesIO()
+        Image.new("RGB", (64, 64), "green").save(photo, "JPEG")
+        image = (await client.post(
+            f"/api/bonsais/{bonsai_id}/images",
+            files={"file": ("juniper.jpg", photo.getvalue(), "image/jpeg")},
+            headers=headers
+        )).json()
+        detail, page, unpaged, insights = await views(bonsai_id)
+        checks["upload -> detail"] = len(detail.json()["images"]) == 2
+        checks["upload -> page"] = len(find(page, bonsai_id)["images"]) == 2
+        checks["upload -> unpaged list"] = len(find(unpaged, bonsai_id)["images"]) == 2
+
+        await client.delete(f"/api/bonsais/{bonsai_id}/images/{image['id']}", headers=headers)
+        detail, page, unpaged, insights = await views(bonsai_id)
+        checks["image delete -> detail"] = len(detail.json()["images"]) == 1
+        checks["image delete -> page"] = len(find(page, bonsai_id)["images"]) == 1
+
+        count = len(insights.json())
+        await client.post(f"/api/bonsais/{bonsai_id}/insights", json={"user_question": "Is it thirsty?"}, headers=headers)
+        detail, page, unpaged, insights = await views(bonsai_id)
+        checks["insight create -> insights"] = len(insights.json()) == count + 1
+        await client.delete(f"/api/bonsais/{bonsai_id}/insights/{insights.json()[0]['id']}", headers=headers)
+        detail, page, unpaged, insights = await views(bonsai_id)
+        checks["insight delete -> insights"] = len(insights.json()) == count
+
+        created = (await client.post("/api/bonsais/", json={"title": "Maple"}, headers=headers)).json()
+        detail, page, unpaged, insights = await views(created["id"])
+        checks["create -> detail"] = detail.status_code == 200
+        checks["create -> page"] = find(page, created["id"]) is not None
+        checks["create -> unpaged list"] = find(unpaged, created["id"]) is not None
+
+        await client.delete(f"/api/bonsais/{created['id']}", headers=headers)
+        detail, page, unpaged, insights = await views(created["id"])
+        checks["delete -> detail"] = detail.status_code == 404
+        checks["delete -> page"] = find(page, created["id"]) is None
+        checks["delete -> unpaged list"] = find(unpaged, created["id"]) is None
+
+        # The bonsai's row is cached by now, but only for its owner
+        token = jwt.encode(
+            {"sub": str(uuid.uuid4()), "aud": "authenticated", "exp": int(time.time()) + 3600},
+            harness.JWT_SECRET,
+            algorithm="HS256"
+        )
+        other = {"Authorization": f"Bearer {token}"}
+        checks["another user -> detail 404"] = (await client.get(f"/api/bonsais/{bonsai_id}", headers=other)).status_code == 404
+        checks["another user -> insights 404"] = (
+            (await client.get(f"/api/bonsais/{bonsai_id}/insights", headers=other)).status_code == 404
+        )
+
+        # A load that read the old row before a write must not be cached after it
+        release = asyncio.Event()
+
+        async def slow_load():
+            await release.wait()
+            return {"title": "old"}
+
+        async def fresh_load():
+            return {"title": "new"}
+
+        loading = asyncio.ensure_future(read_cache.get("bonsai:race", slow_load))
+        await asyncio.sleep(0.01)
+        await read_cache.invalidate("bonsai:race")
+        release.set()
+        await loading
+        checks["a load invalidated while under way isn't cached"] = (
+            await read_cache.get("bonsai:race", fresh_load) == {"title": "new"}
+        )
+
+        print(json.dumps(read_cache.stats()))
+
+    for name, ok in checks.items():
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    return 0 if all(checks.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
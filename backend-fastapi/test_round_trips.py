@@ -0,0 +1,88 @@
+"""
+Count the Supabase round trips each bonsai endpoint makes, against the local stub.
+
+Every case uses a bonsai the read cache hasn't seen, so the counts are the
+cold-cache cost. Run from backend-fastapi:
+
+    python test_round_trips.py
+"""
+import asyncio
+import sys
+
+PORT = 54610
+
+# Most round trips each endpoint may make. Ownership is enforced in the write
+# itself or checked from the bonsai row alone, never by loading the bonsai
+# with all of its images first
+EXPECTED = {
+    "GET /api/bonsais/": 1,
+    "GET /api/bonsais/{id}": 2,
+    "PUT /api/bonsais/{id}": 2,
+    "DELETE /api/bonsais/{id}": 1,
+    "POST /api/bonsais/{id}/images": 4,
+    "DELETE /api/bonsais/{id}/images/{image_id}": 2,
+    "GET /api/bonsais/{id}/insights": 2,
+    # Also drops the bonsai's conversation summary, which included the insight
+    "DELETE /api/bonsais/{id}/insights/{insight_id}": 3,
+    "DELETE /api/bonsais/{id} (not found)": 1,
+}
+
+
+async def main() -> int:
+    from benchmarks import harness, stub_supabase
+
+    user_id, headers = harness.start(PORT)
+
+    import httpx
+    from main import app
+
+    def cases():
+        harness.seed_bonsai(user_id)
+        yield "GET /api/bonsais/", "GET", "/api/bonsais/", {}
+
+        bonsai = harness.seed_bonsai(user_id)
+        yield "GET /api/bonsais/{id}", "GET", f"/api/bonsais/{bonsai['id']}", {}
+
+        bonsai = harness.seed_bonsai(user_id)
+        yield "PUT /api/bonsais/{id}", "PUT", f"/api/bonsais/{bonsai['id']}", {"json": {"title": "Renamed"}}
+
+        bonsai = harness.seed_bonsai(user_id)
+        yield "DELETE /api/bonsais/{id}", "DELETE", f"/api/bonsais/{bonsai['id']}", {}
+
+        bonsai = harness.seed_bonsai(user_id)
+        photo = {"file": ("juniper.jpg", b"\xff\xd8\xff" + bonsai["id"].encode(), "image/jpeg")}
+        yield "POST /api/bonsais/{id}/images", "POST", f"/api/bonsais/{bonsai['id']}/images", {"files": photo}
+
+        bonsai = harness.seed_bonsai(user_id)
+        image = next(i for i in stub_supabase.STATE["tables"]["bonsai_images"] if i["bonsai_id"] == bonsai["id"])
+        yield ("DELETE /api/bonsais/{id}/images/{image_id}", "DELETE",
+               f"/api/bonsais/{bonsai['id']}/images/{image['id']}", {})
+
+        bonsai = harness.seed_bonsai(user_id)
+        yield "GET /api/bonsais/{id}/insights", "GET", f"/api/bonsais/{bonsai['id']}/insights", {}
+
+        bonsai = harness.seed_bonsai(user_id)
+        insight = next(i for i in stub_supabase.STATE["tables"]["ai_insights"] if i["bonsai_id"] == bonsai["id"])
+        yield ("DELETE /api/bonsais/{id}/insights/{insight_id}", "DELETE",
+               f"/api/bonsais/{bonsai['id']}/insights/{insight['id']}", {})
+
+        yield ("DELETE /api/bonsais/{id} (not found)", "DELETE",
+               "/api/bonsais/00000000-0000-4000-8000-000000000000", {})
+
+    failures = 0
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        for name, method, url, kwargs in cases():
+            harness.reset(PORT)
+            response = await client.request(method, url, headers=headers, **kwargs)
+            stats = harness.stats(PORT)
+
+            ok = stats["requests"] <= EXPECTED[name] and response.status_code < 500
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {name:48s} {response.status_code}  "
+                  f"round_trips={stats['requests']} (max {EXPECTED[name]})  {stats['by_kind']}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
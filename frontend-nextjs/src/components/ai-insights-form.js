@@ -1,6 +1,6 @@
 'use client';
 
-import { useState } from 'react';
+import { useRef, useState } from 'react';
 import { Button } from '@/components/ui/button';
 import { Textarea } from '@/components/ui/textarea';
 import { Label } from '@/components/ui/label';
@@ -10,6 +10,10 @@ import { toast } from 'sonner';
 export default function AIInsightsForm({ bonsaiId, onInsightCreated }) {
   const [question, setQuestion] = useState('');
   const [loading, setLoading] = useState(false);
+  const [answer, setAnswer] = useState('');
+  // Asking the same question again after a failure reuses its key, so an answer
+  // that was saved despite the error isn't generated twice
+  const attempt = useRef({ question: null, key: null });
   const [suggestions] = useState([
     'How often should I water this bonsai?',
     'What is the best soil mix for this type of bonsai?',
@@ -24,8 +28,20 @@ export default function AIInsightsForm({ bonsaiId, onInsightCreated }) {
 
     try {
       setLoading(true);
-      await aiApi.createInsight(bonsaiId, { user_question: question });
-      toast.success('AI is analyzing your question');
+      setAnswer('');
+      
+      if (attempt.current.question !== question) {
+        attempt.current = { question, key: crypto.randomUUID() };
+      }
+      
+      // Show the answer as it is written; it is saved once complete
+      await aiApi.streamInsight(
+        bonsaiId,
+        { user_question: question },
+        (text) => setAnswer((current) => current + text),
+        attempt.current.key
+      );
+      attempt.current = { question: null, key: null };
       setQuestion('');
       
       // Notify parent component to refresh insights
@@ -37,6 +53,7 @@ export default function AIInsightsForm({ bonsaiId, onInsightCreated }) {
       toast.error('Failed to process your question');
     } finally {
       setLoading(false);
+      setAnswer('');
     }
   };
 
@@ -64,6 +81,12 @@ export default function AIInsightsForm({ bonsaiId, onInsightCreated }) {
         </Button>
       </form>
       
+      {loading && answer && (
+        <div className="p-4 bg-slate-100 rounded-md">
+          <p className="text-slate-600 whitespace-pre-line">{answer}</p>
+        </div>
+      )}
+      
       <div>
         <Label className="text-sm text-slate-500">Suggested questions:</Label>
         <div className="flex flex-wrap gap-2 mt-2">
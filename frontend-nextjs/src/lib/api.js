@@ -8,28 +8,34 @@ const api = axios.create({
   },
 });
 
+// Get the Supabase access token from localStorage if we're in the browser
+const getAccessToken = () => {
+  if (typeof window === 'undefined') {
+    return null;
+  }
+  
+  // Try to get the session data from localStorage
+  const supabaseSession = localStorage.getItem('sb-rtqkglqmfnllmawduzyr-auth-token');
+  
+  if (supabaseSession) {
+    try {
+      // Parse the session data and get the access token
+      const session = JSON.parse(supabaseSession);
+      return session?.access_token || null;
+    } catch (error) {
+      console.error('Error parsing auth token:', error);
+    }
+  }
+  return null;
+};
+
 // Add a request interceptor to include the auth token in requests
 api.interceptors.request.use(
   (config) => {
-    // Get token from localStorage if we're in the browser
-    if (typeof window !== 'undefined') {
-      // Try to get the session data from localStorage
-      const supabaseSession = localStorage.getItem('sb-rtqkglqmfnllmawduzyr-auth-token');
-      
-      if (supabaseSession) {
-        try {
-          // Parse the session data
-          const session = JSON.parse(supabaseSession);
-          // Get the access token
-          const token = session?.access_token;
-          
-          if (token) {
-            config.headers.Authorization = `Bearer ${token}`;
-          }
-        } catch (error) {
-          console.error('Error parsing auth token:', error);
-        }
-      }
+    const token = getAccessToken();
+    
+    if (token) {
+      config.headers.Authorization = `Bearer ${token}`;
     }
     return config;
   },
@@ -40,8 +46,11 @@ api.interceptors.request.use(
 
 // Bonsai API endpoints
 export const bonsaiApi = {
-  // Get all bonsais for the current user
-  getAllBonsais: () => api.get('/api/bonsais'),
+  // Get all bonsais for the current user (unpaged)
+  getAllBonsais: () => api.get('/api/bonsais', { params: { paged: false } }),
+  
+  // Get one page of bonsais; pass the previous page's next_cursor to continue
+  getBonsaisPage: (params) => api.get('/api/bonsais', { params: { ...params, paged: true } }),
   
   // Get a specific bonsai by ID
   getBonsai: (id) => api.get(`/api/bonsais/${id}`),
@@ -49,6 +58,11 @@ export const bonsaiApi = {
   // Create a new bonsai
   createBonsai: (data) => api.post('/api/bonsais', data),
   
+  // Create, update and delete many bonsais in one request, e.g.
+  // [{ op: 'create', title }, { op: 'update', id, title }, { op: 'delete', id }];
+  // resolves with one result per operation, in order
+  bulkBonsais: (operations) => api.post('/api/bonsais/bulk', { operations }),
+  
   // Update a bonsai
   updateBonsai: (id, data) => api.put(`/api/bonsais/${id}`, data),
   
@@ -63,6 +77,15 @@ export const bonsaiApi = {
       },
     }),
     
+  // Upload several images for a bonsai in one request (append each as 'files');
+  // resolves with one result per file, in order
+  uploadImages: (bonsaiId, formData) => 
+    api.post(`/api/bonsais/${bonsaiId}/images/batch`, formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+    }),
+    
   // Create a new bonsai with an image in one step
   createBonsaiWithImage: (formData) => 
     api.post('/api/bonsais/with-image', formData, {
@@ -82,9 +105,58 @@ export const aiApi = {
   getBonsaiInsights: (bonsaiId) => 
     api.get(`/api/bonsais/${bonsaiId}/insights`),
   
-  // Create a new insight
-  createInsight: (bonsaiId, data) => 
-    api.post(`/api/bonsais/${bonsaiId}/insights`, data),
+  // Create a new insight; retrying with the same idempotency key returns the
+  // insight saved by the first attempt instead of asking again
+  createInsight: (bonsaiId, data, idempotencyKey) => 
+    api.post(`/api/bonsais/${bonsaiId}/insights`, data, {
+      headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {},
+    }),
+  
+  // Create a new insight, calling onToken with each piece of the answer as it
+  // streams in; resolves with the saved insight
+  streamInsight: async (bonsaiId, data, onToken, idempotencyKey) => {
+    const token = getAccessToken();
+    const response = await fetch(`${api.defaults.baseURL}/api/bonsais/${bonsaiId}/insights?stream=true`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        ...(token ? { Authorization: `Bearer ${token}` } : {}),
+        ...(idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {}),
+      },
+      body: JSON.stringify(data),
+    });
+    
+    if (!response.ok) {
+      throw new Error(`Failed to create insight (${response.status})`);
+    }
+    
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) {
+        throw new Error('Insight stream ended unexpectedly');
+      }
+      
+      buffer += value;
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      
+      for (const event of events) {
+        const type = event.match(/^event: (.*)$/m)?.[1];
+        const payload = JSON.parse(event.match(/^data: (.*)$/m)?.[1] || 'null');
+        
+        if (type === 'token') {
+          onToken?.(payload.text);
+        } else if (type === 'done') {
+          return payload;
+        } else if (type === 'error') {
+          throw new Error(payload.detail);
+        }
+      }
+    }
+  },
   
   // Delete an insight
   deleteInsight: (bonsaiId, insightId) => 